@@ -130,6 +130,10 @@ if  [ -n "$gff" ]; then
     echo '1 准备genemaster'
     echo "Rscript $Script_path/genemaster.R "$name" "$gff_file""
 #    Rscript $Script_path/genemaster.R "$name" "$gff_file"
+    # 通知后端重建该基因组的基因ID索引及区间查询跨度缓存
+    python3 $workdir/backend/manage.py refresh_gene_index "$name"
+    # 预计算基因分布摘要
+    python3 $workdir/backend/manage.py build_gene_distribution "$name"
     
     echo '1 genemaster准备完成'
 fi
@@ -139,6 +143,10 @@ if  [ -n "$annoation" ]; then
     echo '1.2 添加注释'
     echo "$Script_path/add_annoation.R "$name" "$annoation_file""
  #   Rscript $Script_path/add_annoation.R "$name" "$annoation_file"
+    # 回填 gene_go/gene_kegg 的 genome_id，再生成GO/KEGG富集背景（term -> 基因集合）
+    python3 $workdir/backend/manage.py backfill_annotation_genome
+    python3 $workdir/backend/manage.py build_go_background "$name"
+    python3 $workdir/backend/manage.py build_kegg_background "$name"
 fi
 #add jbrowes
 if [ -n "$genome" ] && [ -n "$gff" ]; then
@@ -187,7 +195,12 @@ if [ -n "$protein_file" ] && [ -f "$protein_file" ]; then
 fi
 
 echo "$extract_cmd"
-#eval $extract_cmd
+seq_imported=0
+#eval $extract_cmd && seq_imported=1
+# 将序列外置到 mmap 序列文件，gene_seq 只保留偏移量；仅在上面的导入成功执行后运行
+if [ "$seq_imported" = "1" ]; then
+    python3 $workdir/backend/manage.py build_seq_store "$name" --drop-text
+fi
 echo '3 gene_seq数据库准备完成'
 
 #prepare longest protein sequence
@@ -1,6 +1,7 @@
 import pymysql
 import os
 import sys,subprocess
+from datetime import datetime
 
 def parse_obo(file_path):
     """解析GO OBO文件，返回术语列表和关系列表"""
@@ -32,37 +33,22 @@ def parse_obo(file_path):
                 current_term['definition'] = def_str
             elif line.startswith('is_obsolete:'):
                 current_term['is_obsolete'] = True
-            # 处理关系（扩展更多类型）
+            # 处理关系（扩展更多类型），目标 ID 后的 "! 名称" 注释需要去掉
             elif line.startswith('is_a:'):
                 relationships.append({
                     'subject_id': current_term['id'],
-                    'object_id': line.split(':', 1)[1].strip(),
+                    'object_id': line.split(':', 1)[1].split('!', 1)[0].strip(),
                     'relationship_type': 'is_a'
                 })
-            elif line.startswith('part_of:'):
-                relationships.append({
-                    'subject_id': current_term['id'],
-                    'object_id': line.split(':', 1)[1].strip(),
-                    'relationship_type': 'part_of'
-                })
-            elif line.startswith('regulates:'):
-                relationships.append({
-                    'subject_id': current_term['id'],
-                    'object_id': line.split(':', 1)[1].strip(),
-                    'relationship_type': 'regulates'
-                })
-            elif line.startswith('negatively_regulates:'):
-                relationships.append({
-                    'subject_id': current_term['id'],
-                    'object_id': line.split(':', 1)[1].strip(),
-                    'relationship_type': 'negatively_regulates'
-                })
-            elif line.startswith('positively_regulates:'):
-                relationships.append({
-                    'subject_id': current_term['id'],
-                    'object_id': line.split(':', 1)[1].strip(),
-                    'relationship_type': 'positively_regulates'
-                })
+            elif line.startswith('relationship:'):
+                # relationship: part_of GO:0005737 ! cytoplasm
+                fields = line.split(':', 1)[1].split('!', 1)[0].split()
+                if len(fields) == 2 and fields[0] in ('part_of', 'regulates', 'negatively_regulates', 'positively_regulates'):
+                    relationships.append({
+                        'subject_id': current_term['id'],
+                        'object_id': fields[1],
+                        'relationship_type': fields[0]
+                    })
             elif line.startswith('replaced_by:'):  # 新增：处理replaced_by
                 relationships.append({
                     'subject_id': current_term['id'],
@@ -87,6 +73,10 @@ if __name__ == '__main__':
         sys.exit(1)
 
     file_path = '../../backend/data/go_ontology/go-basic.obo'
+    # 先备份并下载新的 OBO，再解析导入
+    if os.path.exists(file_path):
+        subprocess.run(f'mv {file_path} {file_path}_{datetime.now().strftime("%Y%m%d%H%M%S")}.backup', shell=True)
+    subprocess.run(f'wget https://purl.obolibrary.org/obo/go/go-basic.obo -O {file_path}', shell=True)
     if not os.path.exists(file_path):
         print(f"Error: File {file_path} not found")
         sys.exit(1)
@@ -109,9 +99,8 @@ if __name__ == '__main__':
 
     cursor = conn.cursor()
 
+    try:
         # 获取现有术语ID
-        subprocess.run(f'mv {file_path} {file_path}_{datetime.now().strftime("%Y%m%d%H%M%S")}.backup', shell=True)
-        subprocess.run(f'wget https://purl.obolibrary.org/obo/go/go-basic.obo -o {file_path}', shell=True)
         cursor.execute("SELECT id FROM go_term")
         existing_ids = {row['id'] for row in cursor.fetchall()}
 
@@ -176,3 +165,5 @@ if __name__ == '__main__':
         conn.close()
 
     print("Import completed!")
+    # 按新的 OBO 版本重新计算 GO DAG 祖先闭包（富集分析的 propagate / elim / parent_child 使用）
+    subprocess.run('python ../../backend/manage.py build_go_dag', shell=True)
@@ -1,5 +1,8 @@
+import hashlib
 import json
+import os
 import re
+import time
 import pymysql
 
 def import_kegg_ko_data(json_file_path):
@@ -169,9 +172,24 @@ def import_kegg_ko_data(json_file_path):
 
     cursor.close()
     conn.close()
+    write_version_stamp(json_file_path)
     print("KEGG KO数据导入完成！")
     print(f"导入统计：分类 {len(categories)} 条，通路 {len(pathways)} 条，KO术语 {len(ko_set)} 条，EC编号 {len(ec_set)} 条，关联 {len(ko_enzymes)} 条")
 
+def write_version_stamp(json_file_path):
+    """
+    在 ko00001.json 同目录写入 kegg.version（settings.KEGG_VERSION_FILE），
+    后端 KeggHierarchyStore 据此重新加载内存中的分类/通路/KO/EC 层级
+    """
+    with open(json_file_path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    stamp_path = os.path.join(os.path.dirname(json_file_path), 'kegg.version')
+    with open(stamp_path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(f"{digest}-{time.strftime('%Y%m%d%H%M%S')}\n")
+    os.replace(stamp_path + '.tmp', stamp_path)
+    print(f"版本戳已写入 {stamp_path}")
+
+
 if __name__ == '__main__':
     json_file = '/data/web/CottonOGD/OGD/backend/data/go_ontology/ko00001.json'
     import_kegg_ko_data(json_file)
\ No newline at end of file
@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+TABLES = ('gene_go', 'gene_kegg')
+
+
+class Command(BaseCommand):
+    help = '按 genemaster 回填 gene_go / gene_kegg 的 genome_id（按主键分批，只更新为空的行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000, help='每批主键范围')
+        parser.add_argument('--tables', nargs='*', default=list(TABLES), choices=TABLES)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for table in options['tables']:
+            start = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table} WHERE genome_id IS NULL")
+                low, high = cursor.fetchone()
+            if low is None:
+                self.stdout.write(f'{table}: nothing to backfill')
+                continue
+            updated = 0
+            for batch_start in range(low, high + 1, batch_size):
+                with connection.cursor() as cursor:
+                    cursor.execute(f"""
+                        UPDATE {table}
+                        SET genome_id = (SELECT gm.genome_id FROM genemaster gm WHERE gm.id = {table}.id_id)
+                        WHERE id BETWEEN %s AND %s
+                          AND genome_id IS NULL
+                    """, [batch_start, batch_start + batch_size - 1])
+                    updated += cursor.rowcount
+                self.stdout.write(f'{table}: {min(batch_start + batch_size - 1, high)}/{high}, {updated} rows updated')
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE genome_id IS NULL")
+                missing = cursor.fetchone()[0]
+            self.stdout.write(f'{table}: {updated} rows backfilled in {time.perf_counter() - start:.1f}s, '
+                              f'{missing} rows without a matching genemaster')
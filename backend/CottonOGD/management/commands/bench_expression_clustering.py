@@ -0,0 +1,35 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from CottonOGD.server import expression_clustering, heatmap_cache
+from CottonOGD.server.expression_clustering import METRICS, METHODS
+
+
+class Command(BaseCommand):
+    help = '用随机表达矩阵测量层次聚类（pdist + linkage）的耗时及缓存命中耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--genes', type=int, default=2000)
+        parser.add_argument('--samples', type=int, default=60)
+        parser.add_argument('--metric', default='correlation', choices=METRICS)
+        parser.add_argument('--method', default='average', choices=METHODS)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        matrix = rng.gamma(2.0, 20.0, size=(options['genes'], options['samples']))
+        genes = [f'GhA01G{i:05d}' for i in range(options['genes'])]
+        samples = [f'S{i}' for i in range(options['samples'])]
+        matrix_id = heatmap_cache.matrix_digest(matrix, genes, samples)
+
+        timings = []
+        for _ in range(2):
+            start = time.perf_counter()
+            order = expression_clustering.leaf_order(
+                matrix_id, matrix, options['metric'], options['method'], use_log2=True)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        backend = 'fastcluster' if expression_clustering.FASTCLUSTER_AVAILABLE else 'scipy'
+        self.stdout.write(f"{options['genes']} genes x {options['samples']} samples, "
+                          f"{order['metric']}/{order['method']} ({backend})")
+        self.stdout.write(f"linkage     : {timings[0]:9.1f} ms")
+        self.stdout.write(f"cached order: {timings[1]:9.1f} ms")
@@ -0,0 +1,107 @@
+import random
+import re
+import time
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from CottonOGD.server.expression_matrix import TISSUE_ORDER, STAGE_ORDER_MAP, EXPRESSION_FIELDS, build_expression_matrix
+
+GENOME = 'G.hirsutumAD1_TM-1_HAU_v1.1'
+TISSUE = '新疆'
+
+
+def build_synthetic_records(genes, extra_tissues):
+    """构造与 gene_expression.values_list(*EXPRESSION_FIELDS) 一致的模拟长表：新疆全部时期 + 若干普通组织"""
+    stages = STAGE_ORDER_MAP[(GENOME, TISSUE)]
+    samples = [(stage, TISSUE) for stage in stages]
+    samples += [(f'{i}DPA', tissue) for tissue in TISSUE_ORDER[:extra_tissues] for i in (0, 5, 10)]
+    samples += [('', 'Root')]
+    records = [
+        (gene, f'GhA01G{gene:05d}', stage, tissue, random.random() * 100)
+        for gene in range(1, genes + 1)
+        for stage, tissue in samples
+    ]
+    random.shuffle(records)
+    return records
+
+
+def legacy_pipeline(records, genome_id):
+    """旧版 extract_expression 的逐行实现，仅用于对比"""
+    df = pd.DataFrame(list(records), columns=EXPRESSION_FIELDS)
+    df['stage'] = df['stage'].fillna('')
+    df['tissue'] = df['tissue'].fillna('Unknown')
+    df['sample'] = df.apply(lambda row:
+        re.sub(r'^X(\d+)', r'\1', row['stage']) + row['tissue'] if row['stage'] else row['tissue'],
+        axis=1
+    )
+    df['tissue_idx'] = df['tissue'].apply(lambda x: TISSUE_ORDER.index(x) if x in TISSUE_ORDER else len(TISSUE_ORDER))
+
+    def get_stage_order(row):
+        key = (genome_id, row['tissue'])
+        if key in STAGE_ORDER_MAP:
+            order_list = STAGE_ORDER_MAP[key]
+            order_dict = {stage: i for i, stage in enumerate(order_list)}
+            return order_dict.get(row['stage'], len(order_list))
+        match = re.search(r'(\d+)', str(row['stage']))
+        return int(match.group(1)) if match else 9999
+
+    df['stage_order'] = df.apply(get_stage_order, axis=1)
+    df = df.sort_values(by=['tissue_idx', 'stage_order'], ascending=[True, True])
+    result = df.pivot_table(index=['id_id', 'geneid'], columns='sample', values='value', aggfunc='mean').reset_index()
+    result.columns.name = None
+    sample_order = df['sample'].unique()
+    existing_columns = [col for col in sample_order if col in result.columns]
+    result = result[['id_id', 'geneid'] + existing_columns]
+    genes_data = []
+    for _, row in result.iterrows():
+        genes_data.append({'gene_id': row['geneid'],
+                           'expression': {t: float(row[t]) if pd.notna(row[t]) else 0 for t in existing_columns}})
+    return existing_columns, result.drop(columns=['id_id', 'geneid']).values, genes_data
+
+
+def vectorized_pipeline(records, genome_id):
+    rows, samples, matrix = build_expression_matrix(records, genome_id)
+    filled = np.nan_to_num(matrix, nan=0.0)
+    genes_data = [{'gene_id': geneid, 'expression': dict(zip(samples, values))}
+                  for (_, geneid), values in zip(rows, filled.tolist())]
+    return samples, matrix, genes_data
+
+
+def same_genes_data(left, right, samples):
+    """两种实现的 genes_data 基因顺序相同且各样本表达值一致"""
+    if [g['gene_id'] for g in left] != [g['gene_id'] for g in right]:
+        return False
+    values = lambda data: np.array([[g['expression'][s] for s in samples] for g in data], dtype=float)
+    return np.allclose(values(left), values(right))
+
+
+def _timeit(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        output = func()
+    return (time.perf_counter() - start) / rounds * 1000, output
+
+
+class Command(BaseCommand):
+    help = '用模拟表达长表对比 extract_expression 旧版逐行实现与向量化实现的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--genes', type=int, default=500)
+        parser.add_argument('--extra-tissues', type=int, default=5, help='除新疆时期外附加的普通组织数')
+        parser.add_argument('--rounds', type=int, default=3)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        records = build_synthetic_records(options['genes'], options['extra_tissues'])
+
+        legacy_ms, (legacy_samples, legacy_matrix, legacy_genes) = _timeit(
+            lambda: legacy_pipeline(records, GENOME), options['rounds'])
+        fast_ms, (samples, matrix, genes_data) = _timeit(
+            lambda: vectorized_pipeline(records, GENOME), options['rounds'])
+
+        same = (legacy_samples == samples and np.allclose(legacy_matrix, matrix, equal_nan=True)
+                and same_genes_data(legacy_genes, genes_data, samples))
+        self.stdout.write(f"{options['genes']} genes x {len(samples)} samples ({len(records)} rows)")
+        self.stdout.write(f"legacy     (apply/iterrows): {legacy_ms:9.1f} ms")
+        self.stdout.write(f"vectorized (bincount)      : {fast_ms:9.1f} ms")
+        self.stdout.write(f"speedup: {legacy_ms / max(fast_ms, 1e-9):.1f}x, identical output: {same}")
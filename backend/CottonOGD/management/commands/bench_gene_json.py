@@ -0,0 +1,64 @@
+import random
+import json
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from CottonOGD.server import fast_json
+
+
+def _random_seq(length, alphabet='ACGT'):
+    return ''.join(random.choices(alphabet, k=length))
+
+
+def build_synthetic_result(genome_len, isoforms):
+    """构造与 geneid_result 结构一致的模拟数据包"""
+    gff = [{'id': i, 'id_id': 1, 'geneid_id': 'GhA01G0001', 'genome_id': 'G1', 'seqid': 'A01',
+            'source': 'maker', 'type': 'exon', 'start': 1000 + i * 100, 'end': 1080 + i * 100,
+            'strand': '+', 'phase': '.', 'value': '.', 'attributes': f'ID=GhA01G0001.{i}.exon;Parent=GhA01G0001.{i}'}
+           for i in range(isoforms * 8)]
+    transcripts = [{'id': f'GhA01G0001.{i}',
+                    'cdna_seq': _random_seq(2500), 'cds_seq': _random_seq(1500),
+                    'downstream_seq': _random_seq(2000), 'mrna_seq': _random_seq(2500),
+                    'protein_seq': _random_seq(500, 'ACDEFGHIKLMNPQRSTVWY'), 'upstream_seq': _random_seq(2000)}
+                   for i in range(isoforms)]
+    return {
+        'seqid': 'A01', 'start': 1000, 'end': 1000 + genome_len, 'genome_id': 'G1', 'IDs': 'GhA01G0001', 'db_id': 1,
+        'gene_seq': _random_seq(genome_len),
+        'geneid_result': [{'id': i, 'id_id': 1, 'annoation_source': 'Pfam', 'annotation': '注释 ' * 20} for i in range(8)],
+        'gff_data': gff,
+        'gene_go_result': [{'id': i, 'id_id': 1, 'go_id': f'GO:{i:07d}'} for i in range(10)],
+        'gene_kegg_result': [{'id': 1, 'id_id': 1, 'kegg_id': 'K00001'}],
+        'mrna_transcripts': transcripts,
+        'jbrowse_url': '/assets/jbrowse/index.html',
+    }
+
+
+def _timeit(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        output = func()
+    return (time.perf_counter() - start) / rounds * 1000, len(output)
+
+
+class Command(BaseCommand):
+    help = '对比 geneid_result 旧版二次编码与新版 orjson 原生响应的序列化开销'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--genome-len', type=int, default=50000, help='基因组区段长度(bp)')
+        parser.add_argument('--isoforms', type=int, default=10, help='转录本数量')
+        parser.add_argument('--rounds', type=int, default=50)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        results = build_synthetic_result(options['genome_len'], options['isoforms'])
+        renderer = JSONRenderer()
+
+        legacy_ms, legacy_bytes = _timeit(
+            lambda: renderer.render({'results': json.dumps(results)}), options['rounds'])
+        native_ms, native_bytes = _timeit(
+            lambda: fast_json.dumps({'results': results}), options['rounds'])
+
+        self.stdout.write(f"orjson available: {fast_json.ORJSON_AVAILABLE}")
+        self.stdout.write(f"legacy  (json.dumps + DRF): {legacy_ms:8.3f} ms/request, {legacy_bytes} bytes")
+        self.stdout.write(f"native  (X-Api-Version: 2): {native_ms:8.3f} ms/request, {native_bytes} bytes")
+        self.stdout.write(f"saved: {legacy_ms - native_ms:.3f} ms/request ({legacy_ms / max(native_ms, 1e-9):.1f}x)")
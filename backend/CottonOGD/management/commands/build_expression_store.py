@@ -0,0 +1,82 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from CottonOGD.models import gene_expression, GenomeTissue
+from CottonOGD.server.expression_matrix import TISSUE_CODES, TISSUE_ORDER, stage_order
+from CottonOGD.server.expression_store import ExpressionStore
+
+CHUNK_SIZE = 200000
+
+
+class Command(BaseCommand):
+    help = '将 gene_expression 中某基因组的表达量生成 float32 稠密矩阵文件（基因 × 样本，规范样本顺序）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('genomes', nargs='*', help='基因组名称，留空表示所有有表达数据的基因组')
+
+    def handle(self, *args, **options):
+        genomes = options['genomes'] or list(GenomeTissue.objects.values_list('genome', flat=True).distinct())
+        for genome in genomes:
+            shape = self.build(genome)
+            self.stdout.write(f'{genome}: {shape[0]} genes x {shape[1]} samples -> {ExpressionStore.paths(genome)[0]}')
+
+    def build(self, genome):
+        queryset = gene_expression.objects.filter(genome_id=genome)
+
+        # 行：按 db_id 升序；列：按组织、时期的规范顺序
+        genes = dict(queryset.order_by('id_id').values_list('id_id', 'geneid').distinct())
+        db_ids = np.fromiter(genes.keys(), dtype=np.int64, count=len(genes))
+        pairs = sorted({(stage or '', tissue or 'Unknown')
+                        for stage, tissue in queryset.values_list('stage', 'tissue').distinct()})
+        stages = pd.Series([stage for stage, _ in pairs], dtype=object)
+        tissues = pd.Series([tissue for _, tissue in pairs], dtype=object)
+        order = np.lexsort((
+            stage_order(genome, stages, tissues),
+            tissues.map(TISSUE_CODES).fillna(len(TISSUE_ORDER)).to_numpy(),
+        ))
+        pairs = [pairs[i] for i in order]
+        column_of = {pair: i for i, pair in enumerate(pairs)}
+
+        # 分块累加，重复值取平均
+        n_rows, n_cols = len(db_ids), len(pairs)
+        sums = np.zeros(n_rows * n_cols)
+        counts = np.zeros(n_rows * n_cols)
+        chunk = []
+        rows = queryset.values_list('id_id', 'stage', 'tissue', 'value').iterator(chunk_size=CHUNK_SIZE)
+        for record in rows:
+            chunk.append(record)
+            if len(chunk) >= CHUNK_SIZE:
+                self._accumulate(chunk, db_ids, column_of, n_cols, sums, counts)
+                chunk = []
+        if chunk:
+            self._accumulate(chunk, db_ids, column_of, n_cols, sums, counts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            matrix = (sums / counts).reshape(n_rows, n_cols).astype(np.float32)
+
+        matrix_path, ids_path, meta_path = ExpressionStore.paths(genome)
+        os.makedirs(os.path.dirname(matrix_path), exist_ok=True)
+        # 矩阵文件最后替换，读取端以它的 mtime 判断是否需要重新加载
+        for path, write in (
+            (ids_path, lambda f: np.save(f, db_ids)),
+            (meta_path, lambda f: f.write(json.dumps({
+                'geneids': list(genes.values()),
+                'stages': [stage for stage, _ in pairs],
+                'tissues': [tissue for _, tissue in pairs],
+            }, ensure_ascii=False).encode('utf-8'))),
+            (matrix_path, lambda f: np.save(f, matrix)),
+        ):
+            with open(f'{path}.tmp', 'wb') as f:
+                write(f)
+            os.replace(f'{path}.tmp', path)
+        return matrix.shape
+
+    @staticmethod
+    def _accumulate(chunk, db_ids, column_of, n_cols, sums, counts):
+        df = pd.DataFrame.from_records(chunk, columns=['id_id', 'stage', 'tissue', 'value'])
+        df = df[df['value'].notna()]
+        pair = pd.Series(list(zip(df['stage'].fillna(''), df['tissue'].fillna('Unknown'))), index=df.index)
+        flat = np.searchsorted(db_ids, df['id_id'].to_numpy()) * n_cols + pair.map(column_of).to_numpy(dtype=np.int64)
+        sums += np.bincount(flat, weights=df['value'].to_numpy(dtype=float), minlength=len(sums))
+        counts += np.bincount(flat, minlength=len(counts))
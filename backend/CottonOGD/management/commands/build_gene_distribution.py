@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from CottonOGD.models import Species_info
+from CottonOGD.server.gene_distribution import build_summary
+
+
+class Command(BaseCommand):
+    help = '预计算基因组的染色体基因分布与密度窗口，供 gene_genomic_distribution 直接读取'
+
+    def add_arguments(self, parser):
+        parser.add_argument('genomes', nargs='*', help='基因组名称，留空表示全部基因组')
+
+    def handle(self, *args, **options):
+        genomes = options['genomes'] or list(Species_info.objects.values_list('name', flat=True))
+        for genome in genomes:
+            summary = build_summary(genome)
+            self.stdout.write(f"{genome}: {summary['total_genes']} genes on {len(summary['chr_distribution'])} seqids")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from CottonOGD.models import Species_info
+from CottonOGD.server.annotation_sets import GoBackgroundStore
+
+
+class Command(BaseCommand):
+    help = '从 GeneGo 生成基因组的 GO 富集背景（term -> 基因下标 CSR 及 term 类型/描述）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('genomes', nargs='*', help='基因组名称，留空表示全部基因组')
+
+    def handle(self, *args, **options):
+        genomes = options['genomes'] or list(Species_info.objects.values_list('name', flat=True))
+        for genome in genomes:
+            sets = GoBackgroundStore.build(genome)
+            if not sets.terms:
+                self.stdout.write(f'{genome}: no GO annotation, skipped')
+                continue
+            GoBackgroundStore.save(genome, sets)
+            self.stdout.write(f'{genome}: {len(sets.terms)} terms, {len(sets.genes)} genes, '
+                              f'{len(sets.indices)} annotations -> {GoBackgroundStore.paths(genome)[0]}')
@@ -0,0 +1,20 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from CottonOGD.server.go_dag import GoDagStore
+
+
+class Command(BaseCommand):
+    help = '从 go_term / go_relationship 计算 GO DAG（is_a/part_of）的祖先闭包并按 OBO 版本与 go_relationship 指纹缓存'
+
+    def handle(self, *args, **options):
+        version = GoDagStore.version()
+        start = time.perf_counter()
+        dag = GoDagStore.build(version)
+        GoDagStore.save(dag)
+        counts = dag.ancestor_counts()
+        self.stdout.write(
+            f'{version}: {len(dag)} terms, {len(dag.parent_indices)} edges, '
+            f'{len(dag.ancestor_indices)} ancestor links (max {counts.max() if len(counts) else 0}, '
+            f'mean {np.mean(counts) if len(counts) else 0:.1f}), max height {dag.height.max(initial=0)}, '
+            f'{time.perf_counter() - start:.1f}s -> {GoDagStore.paths(version)[0]}')
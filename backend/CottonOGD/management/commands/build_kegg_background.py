@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from CottonOGD.models import Species_info
+from CottonOGD.server.annotation_sets import KeggBackgroundStore
+
+
+class Command(BaseCommand):
+    help = '从 gene_kegg 生成基因组的 KEGG 富集背景（KO/通路 -> genemaster.id 下标 CSR）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('genomes', nargs='*', help='基因组名称，留空表示全部基因组')
+
+    def handle(self, *args, **options):
+        genomes = options['genomes'] or list(Species_info.objects.values_list('name', flat=True))
+        for genome in genomes:
+            sets = KeggBackgroundStore.build(genome)
+            if not sets.terms:
+                self.stdout.write(f'{genome}: no KEGG annotation, skipped')
+                continue
+            KeggBackgroundStore.save(genome, sets)
+            self.stdout.write(f'{genome}: {len(sets.terms)} terms, {len(sets.genes)} genes, '
+                              f'{len(sets.indices)} annotations -> {KeggBackgroundStore.paths(genome)[0]}')
@@ -0,0 +1,77 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from CottonOGD.models import gene_seq, Species_info
+from CottonOGD.server.seq_store import SeqStore, INLINE_SEQUENCE
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = '将 gene_seq 中某基因组的序列写入新版本的 mmap 序列文件，并在表中记录版本与偏移量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('genomes', nargs='*', help='基因组名称，留空表示全部基因组')
+        parser.add_argument('--drop-text', action='store_true',
+                            help='写入成功后清空 gene_seq.sequence，释放数据库空间')
+
+    def handle(self, *args, **options):
+        genomes = options['genomes'] or list(Species_info.objects.values_list('name', flat=True))
+        for genome in genomes:
+            count, size, path = self.build(genome, options['drop_text'])
+            self.stdout.write(f'{genome}: {count} sequences, {size} bytes -> {path}')
+
+    def build(self, genome, drop_text):
+        # 新版本写入新文件；正在服务的 worker 仍按旧 (版本, 偏移) 读旧文件，直到偏移量事务提交
+        versions = SeqStore.versions(genome)
+        version = (versions[-1] + 1) if versions else 1
+        path = SeqStore.path(genome, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+
+        rows = (gene_seq.objects.filter(genome_id=genome).order_by('id')
+                .values('id', 'seq_offset', 'seq_length', 'seq_version', 'genome_id', inline=INLINE_SEQUENCE)
+                .iterator(chunk_size=BATCH_SIZE))
+        positions = []
+        previous = set()
+        offset = 0
+        # 已外置的行从其所在版本的文件拷贝，未外置的行取数据库 TEXT
+        try:
+            with open(tmp_path, 'wb') as out:
+                for row in rows:
+                    if row['seq_offset'] is not None:
+                        data = SeqStore.read(genome, row['seq_offset'], row['seq_length'], row['seq_version'])
+                        if data is None:
+                            raise CommandError(f'{genome}: row {row["id"]} points to a missing seqstore file')
+                        previous.add(row['seq_version'])
+                    else:
+                        # 按字节偏移读取并以 ASCII 解码，非 ASCII 序列不能写入
+                        try:
+                            data = (row['inline'] or '').encode('ascii')
+                        except UnicodeEncodeError as e:
+                            raise CommandError(f'{genome}: row {row["id"]} has a non-ASCII sequence '
+                                               f'at position {e.start}') from e
+                    out.write(data)
+                    positions.append((row['id'], offset, len(data)))
+                    offset += len(data)
+            os.replace(tmp_path, path)
+
+            with transaction.atomic():
+                for i in range(0, len(positions), BATCH_SIZE):
+                    batch = [gene_seq(id=pk, seq_offset=seq_offset, seq_length=seq_length, seq_version=version)
+                             for pk, seq_offset, seq_length in positions[i:i + BATCH_SIZE]]
+                    gene_seq.objects.bulk_update(batch, ['seq_offset', 'seq_length', 'seq_version'])
+                if drop_text:
+                    gene_seq.objects.filter(genome_id=genome, seq_offset__isnull=False).update(sequence=None)
+        except BaseException:
+            # 失败时没有行引用新版本，删除临时文件与新版本文件
+            for leftover in (tmp_path, path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+
+        # 提交前引用的版本保留给尚在处理中的请求，下一次重建时删除；更早的版本已无行引用
+        for old in set(versions) | {None}:
+            if old not in previous and os.path.exists(SeqStore.path(genome, old)):
+                os.remove(SeqStore.path(genome, old))
+        return len(positions), offset, path
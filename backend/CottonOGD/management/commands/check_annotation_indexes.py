@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from CottonOGD.models import Species_info, gene_go, gene_kegg
+from CottonOGD.server.annotation_sets import KeggBackgroundStore
+
+# (查询名称, 模型, 索引字段, SQL)；每个查询都应只读对应的覆盖索引
+QUERIES = (
+    ('gene_go by genome', gene_go, ['genome', 'go_id', 'id_id'], """
+        SELECT id_id, go_id
+        FROM gene_go
+        WHERE genome_id = %s
+          AND go_id IS NOT NULL
+    """),
+    ('gene_kegg background', gene_kegg, ['genome', 'kegg_id', 'id_id'], KeggBackgroundStore.background_sql),
+)
+
+
+def index_name(model, fields):
+    for index in model._meta.indexes:
+        if list(index.fields) == fields:
+            return index.name
+    raise CommandError(f'{model._meta.db_table}: no index on {fields}')
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN 检查按基因组读取 gene_go / gene_kegg 的查询是否命中 (genome, term, id_id) 覆盖索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--genome', help='用于 EXPLAIN 的基因组，默认取第一个基因组')
+
+    def explain(self, sql, params):
+        """返回 (使用的索引名, 是否只读索引)"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(f'EXPLAIN {sql}', params)
+                columns = [col[0].lower() for col in cursor.description]
+                row = dict(zip(columns, cursor.fetchone()))
+                return row.get('key'), 'Using index' in (row.get('extra') or '')
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                detail = ' '.join(str(row[-1]) for row in cursor.fetchall())
+                for marker, covering in (('USING COVERING INDEX ', True), ('USING INDEX ', False)):
+                    if marker in detail:
+                        return detail.split(marker, 1)[1].split()[0], covering
+                return None, False
+        raise CommandError(f'EXPLAIN check not supported on {connection.vendor}')
+
+    def handle(self, *args, **options):
+        genome = options['genome'] or Species_info.objects.values_list('name', flat=True).first() or ''
+        failures = []
+        for label, model, fields, sql in QUERIES:
+            expected = index_name(model, fields)
+            key, covering = self.explain(sql, [genome])
+            ok = key == expected and covering
+            self.stdout.write(f"{'OK  ' if ok else 'FAIL'} {label}: key={key} covering={covering} (expected {expected})")
+            if not ok:
+                failures.append(label)
+        if failures:
+            raise CommandError(f"covering index not used: {', '.join(failures)}")
@@ -0,0 +1,45 @@
+import os
+import time
+import urllib.request
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from CottonOGD.models import MetabolicPathway
+from CottonOGD.server.kegg_maps import KeggMapStore, normalize_map_id
+
+KEGG_REST = 'https://rest.kegg.jp/get/{map_id}/{option}'
+
+
+class Command(BaseCommand):
+    help = '从 KEGG REST 下载通路底图与 KGML 到 settings.KEGG_MAP_DIR（供 kegg_pathway_map 着色）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pathways', nargs='*', help='通路编号（ko00010 / 00010），留空表示 metabolic_pathway 中的全部通路')
+        parser.add_argument('--force', action='store_true', help='重新下载已存在的文件')
+        parser.add_argument('--delay', type=float, default=0.5, help='两次请求的间隔(秒)')
+
+    def handle(self, *args, **options):
+        pathways = options['pathways'] or list(
+            MetabolicPathway.objects.exclude(ko_id='').values_list('ko_id', flat=True).distinct())
+        map_ids = list(dict.fromkeys(filter(None, (normalize_map_id(p) for p in pathways))))
+        if not map_ids:
+            raise CommandError('没有可下载的通路')
+        os.makedirs(settings.KEGG_MAP_DIR, exist_ok=True)
+        failed = []
+        for map_id in map_ids:
+            png_path, xml_path = KeggMapStore.paths(map_id)
+            if not options['force'] and os.path.exists(png_path) and os.path.exists(xml_path):
+                continue
+            try:
+                for path, option in ((xml_path, 'kgml'), (png_path, 'image')):
+                    with urllib.request.urlopen(KEGG_REST.format(map_id=map_id, option=option), timeout=60) as response:
+                        content = response.read()
+                    with open(f'{path}.tmp', 'wb') as f:
+                        f.write(content)
+                    os.replace(f'{path}.tmp', path)
+                    time.sleep(options['delay'])
+            except OSError as e:
+                failed.append(map_id)
+                self.stderr.write(f'{map_id}: {e}')
+                continue
+            self.stdout.write(f'{map_id} -> {png_path}')
+        self.stdout.write(f'{len(map_ids) - len(failed)}/{len(map_ids)} pathway maps available in {settings.KEGG_MAP_DIR}')
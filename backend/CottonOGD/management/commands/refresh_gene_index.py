@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from CottonOGD.models import Species_info
+from CottonOGD.server.gene_index import GeneIndex
+from CottonOGD.server.gene_interval import invalidate_spans
+
+
+class Command(BaseCommand):
+    help = '基因组(重新)导入后刷新基因ID解析索引的版本号及区间查询的跨度缓存'
+
+    def add_arguments(self, parser):
+        parser.add_argument('genomes', nargs='*', help='基因组名称，留空表示全部基因组')
+
+    def handle(self, *args, **options):
+        genomes = options['genomes'] or list(Species_info.objects.values_list('name', flat=True))
+        for genome in genomes:
+            GeneIndex.invalidate(genome)
+            invalidate_spans(genome)
+            self.stdout.write(f'gene index invalidated: {genome}')
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("CottonOGD", "0039_alter_category_name_alter_ecnumber_name_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gene_seq",
+            name="seq_offset",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="gene_seq",
+            name="seq_length",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
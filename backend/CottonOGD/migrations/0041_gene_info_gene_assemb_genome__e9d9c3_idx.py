@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("CottonOGD", "0040_gene_seq_seq_offset_gene_seq_seq_length"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="gene_info",
+            index=models.Index(
+                fields=["genome", "seqid", "type", "start"],
+                name="gene_assemb_genome__e9d9c3_idx",
+            ),
+        ),
+    ]
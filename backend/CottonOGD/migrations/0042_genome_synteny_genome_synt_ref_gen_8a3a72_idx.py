@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("CottonOGD", "0041_gene_info_gene_assemb_genome__e9d9c3_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="genome_synteny",
+            index=models.Index(
+                fields=["Ref_genome", "Query_genome", "Ref_genome_chr", "son_type", "Ref_genome_start"],
+                name="genome_synt_Ref_gen_8a3a72_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("CottonOGD", "0042_genome_synteny_genome_synt_ref_gen_8a3a72_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="gene_expression",
+            index=models.Index(
+                fields=["genome", "geneid"],
+                name="expression_genome__18deba_idx",
+            ),
+        ),
+    ]
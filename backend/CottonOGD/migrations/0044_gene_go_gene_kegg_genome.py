@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("CottonOGD", "0043_gene_expression_expression_genome__18deba_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gene_go",
+            name="genome",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="CottonOGD.species_info",
+                to_field="name",
+            ),
+        ),
+        migrations.AddField(
+            model_name="gene_kegg",
+            name="genome",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="CottonOGD.species_info",
+                to_field="name",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="gene_go",
+            index=models.Index(
+                fields=["genome", "go_id", "id_id"],
+                name="gene_go_genome__998b17_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="gene_kegg",
+            index=models.Index(
+                fields=["genome", "kegg_id", "id_id"],
+                name="gene_kegg_genome__5cd3ae_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("CottonOGD", "0044_gene_go_gene_kegg_genome"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gene_seq",
+            name="seq_version",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
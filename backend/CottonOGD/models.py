@@ -91,6 +91,7 @@ class gene_expression(models.Model):
         indexes = [
             models.Index(fields=['geneid','genome']),
             models.Index(fields=['id_id']),
+            models.Index(fields=['genome','geneid']),
         ]
         db_table = 'expression'
 
@@ -150,6 +151,8 @@ class gene_info(models.Model):
             models.Index(fields=['seqid']),
             models.Index(fields=['start']),
             models.Index(fields=['end']),
+            # 区间查询：按 (genome, seqid, type) 定位后在 start 上做有界范围扫描
+            models.Index(fields=['genome', 'seqid', 'type', 'start']),
         ]
     def __str__(self):
         return self.geneid.geneid
@@ -185,6 +188,11 @@ class gene_seq(models.Model):
     mrna_id = models.CharField(max_length=100, blank=True, null=True)
     gene_type = models.CharField(max_length=100, blank=True, null=True)
     sequence = models.TextField(blank=True, null=True)
+    # 外置到 data/genome/<genome>/<genome>.<seq_version>.seqstore 后的位置，sequence 可置空；
+    # seq_version 为空表示旧的无版本文件 <genome>.seqstore
+    seq_offset = models.BigIntegerField(blank=True, null=True)
+    seq_length = models.IntegerField(blank=True, null=True)
+    seq_version = models.IntegerField(blank=True, null=True)
     def __str__(self):
         return str(self.geneid)
     class Meta:
@@ -200,6 +208,10 @@ class gene_go(models.Model):
     #geneid = models.CharField(max_length=100, blank=True, null=True)
     #genome = models.IntegerField(default='0') 
     go_id = models.CharField(max_length=100, blank=True, null=True)
+    # 冗余的基因组名称（与 genemaster.genome_id 一致），按基因组读取富集背景时不必再关联 genemaster；
+    # 已有数据用 manage.py backfill_annotation_genome 回填
+    genome = models.ForeignKey(Species_info, on_delete=models.CASCADE, to_field='name',
+                               null=True, blank=True, db_index=False)
     #go_description = models.CharField(max_length=100, blank=True, null=True)
     #go_type = models.CharField(max_length=100, blank=True, null=True)
     def __str__(self):
@@ -208,6 +220,8 @@ class gene_go(models.Model):
         db_table = 'gene_go'
         indexes = [
             models.Index(fields=['id_id']),
+            # 覆盖索引：按基因组取 (term, 基因) 对只读索引
+            models.Index(fields=['genome', 'go_id', 'id_id']),
         ]
 
 class gene_kegg(models.Model):
@@ -217,6 +231,9 @@ class gene_kegg(models.Model):
     #geneid = models.CharField(max_length=100, blank=True, null=True)
     #genome = models.IntegerField(default='0') 
     kegg_id = models.CharField(max_length=100, blank=True, null=True)
+    # 同 gene_go.genome
+    genome = models.ForeignKey(Species_info, on_delete=models.CASCADE, to_field='name',
+                               null=True, blank=True, db_index=False)
     #kegg_description = models.CharField(max_length=100, blank=True, null=True)
     #kegg_type = models.CharField(max_length=100, blank=True, null=True)
     def __str__(self):
@@ -225,6 +242,7 @@ class gene_kegg(models.Model):
         db_table = 'gene_kegg'
         indexes = [
             models.Index(fields=['id_id']),
+            models.Index(fields=['genome', 'kegg_id', 'id_id']),
         ]
 
 
@@ -263,6 +281,8 @@ class  Genome_Synteny(models.Model):
         db_table = 'genome_synteny'
         indexes = [
             models.Index(fields=['id']),
+            # 按参考染色体分页/分窗口查询
+            models.Index(fields=['Ref_genome', 'Query_genome', 'Ref_genome_chr', 'son_type', 'Ref_genome_start']),
         ]
 
 
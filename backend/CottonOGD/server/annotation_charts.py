@@ -0,0 +1,79 @@
+"""
+GO / KEGG 注释图表缓存
+
+注释接口默认只返回 chart_data（纯 SQL + 计数），不再每次调用 matplotlib；
+图表由单独的 annotation_chart 接口按需绘制，键为 (图表类型, 基因组, 排序去重后基因集的摘要)：
+    annotation_chart_data:<type>:<genome>:<gene_set>        绘图数据（注释接口顺带写入）
+    annotation_chart:<type>:<genome>:<gene_set>:<fmt>       PNG / SVG 字节
+同一基因集重复查看或切换格式时不再查询数据库、不再重绘。缓存时间为 settings.ANNOTATION_CHART_TTL。
+"""
+import base64
+import hashlib
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from CottonOGD.server.render_service import RenderService, RenderError
+
+logger = logging.getLogger(__name__)
+
+CHART_TYPES = ('go', 'kegg')
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+DATA_KEY = 'annotation_chart_data:{chart_type}:{genome}:{gene_set}'
+IMAGE_KEY = 'annotation_chart:{chart_type}:{genome}:{gene_set}:{fmt}'
+RENDER_JOBS = {'go': 'go_annotation_chart', 'kegg': 'kegg_annotation_chart'}
+
+
+def gene_set_digest(gene_list):
+    """基因集摘要（与输入顺序、重复无关）"""
+    canonical = '\x1f'.join(sorted(set(gene_list)))
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def ttl():
+    return getattr(settings, 'ANNOTATION_CHART_TTL', 3600)
+
+
+def put_data(chart_type, genome, gene_set, payload):
+    cache.set(DATA_KEY.format(chart_type=chart_type, genome=genome, gene_set=gene_set), payload, ttl())
+
+
+def get_data(chart_type, genome, gene_set):
+    return cache.get(DATA_KEY.format(chart_type=chart_type, genome=genome, gene_set=gene_set))
+
+
+def has_chart(chart_type, payload):
+    if not payload:
+        return False
+    if chart_type == 'go':
+        return bool(payload['categories']) and any(any(values) for values in payload['data'].values())
+    return bool(payload['labels'])
+
+
+def render(chart_type, genome, gene_set, payload, fmt='png'):
+    """返回图表字节（优先取缓存），绘图失败时抛出 RenderError"""
+    key = IMAGE_KEY.format(chart_type=chart_type, genome=genome, gene_set=gene_set, fmt=fmt)
+    image = cache.get(key)
+    if image is not None:
+        return image
+    if chart_type == 'go':
+        image = RenderService.render(RENDER_JOBS[chart_type], payload['categories'], payload['data'], fmt=fmt)
+    else:
+        image = RenderService.render(RENDER_JOBS[chart_type], payload['labels'], payload['values'],
+                                     payload['types'], fmt=fmt)
+    cache.set(key, image, ttl())
+    return image
+
+
+def inline(chart_type, genome, gene_set, payload, include_chart):
+    """
+    注释接口的 include_chart 参数：png/true 返回 base64 PNG，svg 返回 SVG 文本，其余不绘图。
+    """
+    if include_chart not in ('true', 'png', 'svg') or not has_chart(chart_type, payload):
+        return None
+    fmt = 'svg' if include_chart == 'svg' else 'png'
+    try:
+        image = render(chart_type, genome, gene_set, payload, fmt)
+    except RenderError as e:
+        logger.error(f"{chart_type} annotation chart error: {e}")
+        return None
+    return image.decode('utf-8') if fmt == 'svg' else base64.b64encode(image).decode('utf-8')
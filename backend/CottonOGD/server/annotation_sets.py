@@ -0,0 +1,325 @@
+"""
+按基因组预计算的注释集合（富集分析背景）
+
+富集分析每次都把整个基因组的 GeneGo / gene_kegg 读出来再构建 term -> 基因集合。
+这里在导入时由 `manage.py build_go_background <genome>` / `build_kegg_background <genome>` 一次性生成：
+    data/genome/<genome>/<genome>.go_sets.npz    CSR：indptr（term 数 + 1）与 indices（基因下标，term 内升序）
+    data/genome/<genome>/<genome>.go_sets.json   基因列表、term 列表及每个 term 的类型/描述
+    data/genome/<genome>/<genome>.kegg_sets.*    同上，KO/通路 -> genemaster.id
+请求时按需加载到进程内 LRU，总大小超过 settings.ANNOTATION_STORE_MAX_BYTES 时淘汰最久未使用的基因组；
+文件未生成时直接从数据库构建（只保存在内存中）。富集分析只需把输入基因映射为下标后与 CSR 求交。
+按 GO DAG 传递到祖先后的集合（get_propagated）同样缓存在 LRU 中，随背景文件与 DAG 版本失效。
+"""
+import json
+import os
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from django.conf import settings
+from django.db import connection
+from CottonOGD.server.go_dag import GoDagStore
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_go_type(go_type):
+    if not go_type:
+        return 'Unknown'
+    go_type_upper = str(go_type).upper().strip()
+    if go_type_upper in ['BP', 'BIOLOGICAL_PROCESS', 'BIOLOGICAL PROCESS']:
+        return 'BP'
+    elif go_type_upper in ['MF', 'MOLECULAR_FUNCTION', 'MOLECULAR FUNCTION']:
+        return 'MF'
+    elif go_type_upper in ['CC', 'CELLULAR_COMPONENT', 'CELLULAR COMPONENT']:
+        return 'CC'
+    return go_type_upper
+
+
+class AnnotationSets:
+    """某个基因组的 term -> 基因下标 CSR 及 term 元数据"""
+
+    def __init__(self, genes, terms, term_types, term_names, indptr, indices, meta=None):
+        # pandas/numpy 索引转为 Python 标量，保证可 JSON 序列化、字典查找与输入类型一致
+        self.genes = genes.tolist() if hasattr(genes, 'tolist') else list(genes)
+        self.terms = terms.tolist() if hasattr(terms, 'tolist') else list(terms)
+        self.term_types = list(term_types)
+        self.term_names = list(term_names)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.meta = meta or {}
+        self.gene_index = {gene: i for i, gene in enumerate(self.genes)}
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+        # term × 基因 的 0/1 稀疏矩阵，与输入指示向量相乘即得每个 term 的交集大小
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(self.indices)), self.indices, self.indptr),
+            shape=(len(self.terms), len(self.genes)),
+        )
+
+    @classmethod
+    def from_pairs(cls, frame, meta=None):
+        """
+        frame 列：gene, term, term_type, term_name（一行一个 基因-term 对，可重复）。
+        term 的类型/描述取第一次出现的值。
+        """
+        gene_codes, genes = pd.factorize(frame['gene'], sort=True)
+        term_codes, terms = pd.factorize(frame['term'], sort=True)
+        first = pd.Series(np.arange(len(frame))).groupby(term_codes).first().to_numpy()
+        pairs = np.unique(term_codes.astype(np.int64) * len(genes) + gene_codes)
+        indices = pairs % max(len(genes), 1)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // max(len(genes), 1), minlength=len(terms)), out=indptr[1:])
+        return cls(
+            genes, terms,
+            frame['term_type'].to_numpy()[first], frame['term_name'].to_numpy()[first],
+            indptr, indices, meta,
+        )
+
+    @property
+    def nbytes(self):
+        # 粗略估计：数组 + 字符串列表/字典
+        strings = sum(len(str(s)) + 60 for s in self.genes) * 2 + sum(len(str(s)) + 60 for s in self.terms) * 2
+        return self.indptr.nbytes + self.indices.nbytes * 3 + strings
+
+    def term_sizes(self):
+        return np.diff(self.indptr)
+
+    def term_genes(self, term):
+        return self.indices[self.indptr[term]:self.indptr[term + 1]]
+
+    def propagate(self, dag):
+        """
+        按 GO DAG 把每条注释传递到 term 的所有祖先（true path rule），返回新的 AnnotationSets。
+        DAG 中没有的 term 原样保留；新增祖先 term 的类型/描述取自 DAG。
+        """
+        n_dag = len(dag.terms)
+        local = np.fromiter((dag.term_index.get(t, -1) for t in self.terms), dtype=np.int64, count=len(self.terms))
+        # 统一编码：DAG 中的 term 用 DAG 下标，其余排在 DAG 之后
+        codes = np.where(local >= 0, local, n_dag + np.arange(len(self.terms)))
+        in_dag = local >= 0
+        ancestor_counts = np.zeros(len(self.terms), dtype=np.int64)
+        ancestor_counts[in_dag] = dag.ancestor_counts()[local[in_dag]]
+
+        # 每个 term 展开为 [自身, 祖先...]，再按注释数重复
+        expanded_sizes = ancestor_counts + 1
+        expanded_indptr = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        np.cumsum(expanded_sizes, out=expanded_indptr[1:])
+        expanded = np.empty(expanded_indptr[-1], dtype=np.int64)
+        expanded[expanded_indptr[:-1]] = codes
+        rest = np.flatnonzero(ancestor_counts)
+        if len(rest):
+            lengths = ancestor_counts[rest]
+            offsets = np.repeat(expanded_indptr[rest] + 1, lengths)
+            within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            source = np.repeat(dag.ancestor_indptr[local[rest]], lengths) + within
+            expanded[offsets + within] = dag.ancestor_indices[source]
+
+        annotation_terms = np.repeat(np.arange(len(self.terms)), self.term_sizes())
+        repeats = expanded_sizes[annotation_terms]
+        positions = (np.repeat(expanded_indptr[annotation_terms], repeats)
+                     + np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats))
+        n_genes = max(len(self.genes), 1)
+        pairs = np.unique(expanded[positions] * n_genes + np.repeat(self.indices.astype(np.int64), repeats))
+        pair_codes, pair_genes = pairs // n_genes, pairs % n_genes
+
+        # 新 term 列表按 ID 排序
+        unique_codes, pair_terms = np.unique(pair_codes, return_inverse=True)
+        originals = dict(zip(codes.tolist(), range(len(self.terms))))
+        ids, types, names = [], [], []
+        for code in unique_codes.tolist():
+            original = originals.get(code)
+            if original is not None:
+                ids.append(self.terms[original])
+                types.append(self.term_types[original])
+                names.append(self.term_names[original])
+            else:
+                ids.append(dag.terms[code])
+                types.append(normalize_go_type(dag.namespaces[code]))
+                names.append(dag.names[code])
+        order = np.argsort(np.array(ids, dtype=object), kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        pair_terms = rank[pair_terms]
+        sort = np.lexsort((pair_genes, pair_terms))
+        indptr = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_terms, minlength=len(order)), out=indptr[1:])
+        return AnnotationSets(
+            self.genes, [ids[i] for i in order], [types[i] for i in order], [names[i] for i in order],
+            indptr, pair_genes[sort], dict(self.meta, propagated=dag.version),
+        )
+
+    def gene_indices(self, genes):
+        """背景中存在的输入基因下标（升序、去重）"""
+        return np.unique(np.fromiter(
+            (self.gene_index[g] for g in genes if g in self.gene_index), dtype=np.int64))
+
+
+class AnnotationSetStore:
+    """注释集合文件的加载、构建与进程内 LRU；子类提供 suffix 与 build_frame"""
+    suffix = None
+    # (kind, genome) -> (version, AnnotationSets)，按最近使用排序；各子类共享容量
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def paths(cls, genome):
+        base = os.path.join(settings.BASE_DIR, 'data', 'genome', genome, genome)
+        return f'{base}.{cls.suffix}.npz', f'{base}.{cls.suffix}.json'
+
+    @classmethod
+    def build_frame(cls, genome):
+        """返回 (frame, meta)，frame 列见 AnnotationSets.from_pairs"""
+        raise NotImplementedError
+
+    @classmethod
+    def build(cls, genome):
+        frame, meta = cls.build_frame(genome)
+        return AnnotationSets.from_pairs(frame, meta)
+
+    @classmethod
+    def save(cls, genome, sets):
+        npz_path, json_path = cls.paths(genome)
+        os.makedirs(os.path.dirname(npz_path), exist_ok=True)
+        # npz 最后替换，读取端以它的 mtime 判断是否需要重新加载
+        with open(f'{json_path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump({
+                'genes': sets.genes,
+                'terms': sets.terms,
+                'term_types': sets.term_types,
+                'term_names': sets.term_names,
+                'meta': sets.meta,
+            }, f, ensure_ascii=False)
+        os.replace(f'{json_path}.tmp', json_path)
+        with open(f'{npz_path}.tmp', 'wb') as f:
+            np.savez(f, indptr=sets.indptr, indices=sets.indices)
+        os.replace(f'{npz_path}.tmp', npz_path)
+
+    @classmethod
+    def _load(cls, genome):
+        npz_path, json_path = cls.paths(genome)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with np.load(npz_path) as arrays:
+            return AnnotationSets(
+                meta['genes'], meta['terms'], meta['term_types'], meta['term_names'],
+                arrays['indptr'], arrays['indices'], meta.get('meta'),
+            )
+
+    @classmethod
+    def _version(cls, genome):
+        try:
+            return os.stat(cls.paths(genome)[0]).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def _cached(cls, key, version, load):
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry and entry[0] == version:
+                cls._entries.move_to_end(key)
+                return entry[1]
+        # 加载/构建在锁外进行，同一基因组并发首次请求时可能重复构建一次
+        sets = load()
+        with cls._lock:
+            cls._entries[key] = (version, sets)
+            cls._entries.move_to_end(key)
+            cls._evict()
+        logger.info(f"{cls.__name__} loaded {key}: {len(sets.terms)} terms, {len(sets.genes)} genes")
+        return sets
+
+    @classmethod
+    def get(cls, genome):
+        """返回该基因组的 AnnotationSets；文件不存在时从数据库构建"""
+        version = cls._version(genome)
+
+        def load():
+            if version is None:
+                logger.warning(f"{cls.__name__}: {cls.paths(genome)[0]} not built, building from database")
+                return cls.build(genome)
+            return cls._load(genome)
+
+        return cls._cached((cls.suffix, genome), version, load)
+
+    @classmethod
+    def _evict(cls):
+        limit = getattr(settings, 'ANNOTATION_STORE_MAX_BYTES', 512 * 1024 * 1024)
+        total = sum(sets.nbytes for _, sets in cls._entries.values())
+        # 至少保留最近使用的一个
+        while total > limit and len(cls._entries) > 1:
+            evicted, (_, sets) = cls._entries.popitem(last=False)
+            total -= sets.nbytes
+            logger.info(f"AnnotationSetStore evicted {evicted}")
+
+
+class GoBackgroundStore(AnnotationSetStore):
+    """GeneGo 中 go_type、go_id 非空的记录，go_id 为逗号分隔"""
+    suffix = 'go_sets'
+
+    @classmethod
+    def get_propagated(cls, genome):
+        """注释传递到 GO DAG 所有祖先后的集合，随背景文件与 DAG 版本失效"""
+        dag = GoDagStore.get()
+        version = (cls._version(genome), dag.version)
+        return cls._cached((f'{cls.suffix}:propagated', genome), version,
+                           lambda: cls.get(genome).propagate(dag))
+
+    @classmethod
+    def build_frame(cls, genome):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT `go_type`, `go_description`, `go_id`, `geneid`
+                FROM `GeneGo`
+                WHERE genome_id = %s AND `go_type` IS NOT NULL
+                AND `go_id` IS NOT NULL
+            """, [genome])
+            rows = cursor.fetchall()
+
+        frame = pd.DataFrame(rows, columns=['term_type', 'term_name', 'term', 'gene'])
+        types = frame['term_type'].unique()
+        frame['term_type'] = frame['term_type'].map(dict(zip(types, map(normalize_go_type, types))))
+        frame['term'] = frame['term'].str.split(',')
+        frame = frame.explode('term')
+        frame['term'] = frame['term'].str.strip()
+        frame = frame[frame['term'].notna() & (frame['term'] != '') & (frame['term'] != '-')]
+        return frame.reset_index(drop=True), {}
+
+
+class KeggBackgroundStore(AnnotationSetStore):
+    """
+    gene_kegg 中该基因组 kegg_id 非空的记录；基因为 genemaster.id（整数），
+    通路名称不预先保存，富集结果从 KeggHierarchyStore 取通路名称/分类
+    """
+    suffix = 'kegg_sets'
+    # 只读覆盖索引 (genome_id, kegg_id, id_id)，不关联 genemaster
+    background_sql = """
+        SELECT id_id, kegg_id
+        FROM gene_kegg
+        WHERE genome_id = %s
+          AND kegg_id IS NOT NULL
+    """
+    # genome_id 仍为空的行（未执行 backfill_annotation_genome）回退到关联 genemaster，
+    # 全部回填后走 genome_id IS NULL 的空索引区间
+    unfilled_sql = """
+        SELECT gk.id_id, gk.kegg_id
+        FROM gene_kegg gk
+        JOIN genemaster gm ON gk.id_id = gm.id
+        WHERE gk.genome_id IS NULL
+          AND gm.genome_id = %s
+          AND gk.kegg_id IS NOT NULL
+    """
+
+    @classmethod
+    def build_frame(cls, genome):
+        with connection.cursor() as cursor:
+            cursor.execute(f'{cls.background_sql} UNION ALL {cls.unfilled_sql}', [genome, genome])
+            rows = cursor.fetchall()
+
+        frame = pd.DataFrame(rows, columns=['gene', 'term'])
+        frame['term'] = frame['term'].str.strip()
+        frame = frame[frame['term'] != '']
+        frame['term_type'] = ''
+        frame['term_name'] = None
+        return frame.reset_index(drop=True), {}
@@ -0,0 +1,90 @@
+"""
+多基因组 BLAST 的有界并发
+
+所有请求共用一个进程级线程池（线程只等待 blast 子进程），同时运行的 blast 进程数为
+settings.BLAST_MAX_CONCURRENT_JOBS，每个进程 -num_threads 为 settings.BLAST_THREADS_PER_JOB，
+两者之积不超过可用核数；多个请求的基因组排队共用同一组名额，不会因并发请求而超额占用 CPU。
+注意该上限按 Django 工作进程计算，多工作进程部署时需相应调小。
+"""
+import os
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BlastPool:
+    _executor = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def threads_per_job(cls):
+        return max(1, int(getattr(settings, 'BLAST_THREADS_PER_JOB', 2)))
+
+    @classmethod
+    def max_workers(cls):
+        workers = getattr(settings, 'BLAST_MAX_CONCURRENT_JOBS', None)
+        if not workers:
+            workers = (os.cpu_count() or 2) // cls.threads_per_job()
+        return max(1, int(workers))
+
+    @classmethod
+    def executor(cls):
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(max_workers=cls.max_workers(), thread_name_prefix='blast')
+                    logger.info(f"BlastPool started: {cls.max_workers()} jobs x {cls.threads_per_job()} threads")
+        return cls._executor
+
+    @classmethod
+    def run(cls, func, keys, **kwargs):
+        """
+        对每个 key 调用 func(key, num_threads=..., **kwargs)，按完成顺序逐个产出 (key, 结果, 异常)；
+        最慢的一个基因组决定总耗时。
+        """
+        futures = cls._submit(func, keys, **kwargs)
+        try:
+            for future in as_completed(futures):
+                yield cls._outcome(futures, future)
+        finally:
+            # 调用方提前结束（如流式响应中断）时，取消尚未开始的任务
+            cls._cancel(futures)
+
+    @classmethod
+    async def arun(cls, func, keys, **kwargs):
+        """
+        run 的异步版本，供 ASGI 下的流式响应使用：在事件循环中等待线程池任务，
+        每完成一个基因组即产出，不会像同步生成器那样被整体读完后才发送
+        """
+        futures = cls._submit(func, keys, **kwargs)
+        waiting = {asyncio.wrap_future(future): future for future in futures}
+        try:
+            while waiting:
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                for wrapped in done:
+                    yield cls._outcome(futures, waiting.pop(wrapped))
+        finally:
+            cls._cancel(futures)
+
+    @classmethod
+    def _submit(cls, func, keys, **kwargs):
+        executor = cls.executor()
+        threads = cls.threads_per_job()
+        return {executor.submit(func, key, num_threads=threads, **kwargs): key for key in keys}
+
+    @staticmethod
+    def _outcome(futures, future):
+        key = futures[future]
+        try:
+            return key, future.result(), None
+        except Exception as e:
+            return key, None, e
+
+    @staticmethod
+    def _cancel(futures):
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,124 @@
+"""
+EFP 底图与区域标签图
+
+static/ccc.json 中的区域多边形与 static/images/egg.jpg 底图在每个工作进程中只加载一次：
+多边形预先栅格化为两张标签图（像素值为区域序号 + 1，0 为背景），
+    fill_labels     多边形内部，后绘制的区域覆盖先绘制的区域
+    outline_labels  宽 2 像素的边框
+并记录有标签像素的平铺下标。着色时先按区域算出 RGBA 查找表，再用 lut[labels] 一次性写入所有区域像素，
+不再逐个绘制多边形。与原先 ImageDraw 在 RGBA 图上的行为一致，填充色（含 alpha）直接覆盖底图像素。
+配置或底图文件被替换后按 mtime 自动重新加载。
+"""
+import json
+import os
+import threading
+import logging
+import numpy as np
+from PIL import Image, ImageDraw
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FILL_ALPHA = 100
+OUTLINE_WIDTH = 2
+OUTLINE_DATA = (0, 0, 0, 255)
+OUTLINE_NA = (128, 128, 128, 255)
+
+
+def log_aware_colors(normalized, low_rgb, mid_rgb, high_rgb, alpha=100):
+    """
+    对数感知的颜色映射（向量化版本），normalized 为 [0, 1] 数组，返回 (..., 4) uint8。
+    低半段按平方根、高半段按平方插值，使颜色过渡更符合对数感知。
+    """
+    normalized = np.asarray(normalized, dtype=np.float64)[..., None]
+    low, mid, high = (np.asarray(c, dtype=np.float64) for c in (low_rgb, mid_rgb, high_rgb))
+    lower = low + (mid - low) * np.sqrt(np.clip(normalized * 2, 0, None))
+    upper = mid + (high - mid) * ((normalized - 0.5) * 2) ** 2
+    rgb = np.where(normalized < 0.5, lower, upper).astype(np.int64)
+    rgba = np.empty(normalized.shape[:-1] + (4,), dtype=np.uint8)
+    rgba[..., :3] = np.clip(rgb, 0, 255)
+    rgba[..., 3] = max(0, min(255, alpha))
+    return rgba
+
+
+class EFPCanvasEntry:
+    def __init__(self, regions_config, base_image):
+        self.regions_config = regions_config
+        self.base = np.asarray(base_image.convert('RGBA'), dtype=np.uint8)
+        self.height, self.width = self.base.shape[:2]
+        # 每个区域的整数多边形，缺失或格式错误时为 None
+        self.polygons = []
+        fill = Image.new('I', (self.width, self.height), 0)
+        outline = Image.new('I', (self.width, self.height), 0)
+        fill_draw, outline_draw = ImageDraw.Draw(fill), ImageDraw.Draw(outline)
+        for i, region in enumerate(regions_config['regions'], start=1):
+            try:
+                polygon = [(int(x), int(y)) for x, y in region.get('polygon', [])] or None
+            except (ValueError, TypeError) as e:
+                logger.error(f"Invalid polygon for {region.get('name')}: {e}")
+                polygon = None
+            self.polygons.append(polygon)
+            if not polygon:
+                continue
+            fill_draw.polygon(polygon, fill=i)
+            if len(polygon) > 1:
+                outline_draw.line(polygon + [polygon[0]], fill=i, width=OUTLINE_WIDTH, joint='curve')
+        self.fill_labels = np.asarray(fill, dtype=np.int32)
+        self.outline_labels = np.asarray(outline, dtype=np.int32)
+        # 只有区域内的像素需要着色
+        self.fill_index = np.flatnonzero(self.fill_labels)
+        self.fill_region = self.fill_labels.ravel()[self.fill_index]
+        self.outline_index = np.flatnonzero(self.outline_labels)
+        self.outline_region = self.outline_labels.ravel()[self.outline_index]
+
+    def render(self, fill_lut, outline_lut):
+        """
+        fill_lut / outline_lut: (区域数 + 1, 4) uint8，第 0 行为背景；alpha 为 0 的行不绘制。
+        先写填充色，再写边框。
+        """
+        image = self.base.copy()
+        pixels = image.reshape(-1, 4)
+        for index, region, lut in ((self.fill_index, self.fill_region, fill_lut),
+                                   (self.outline_index, self.outline_region, outline_lut)):
+            drawn = lut[region, 3] > 0
+            pixels[index[drawn]] = lut[region[drawn]]
+        return Image.fromarray(image, 'RGBA')
+
+
+class EFPCanvas:
+    # ((config mtime, image mtime), EFPCanvasEntry)
+    _entry = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def paths(cls):
+        return (os.path.join(settings.BASE_DIR, 'static', 'ccc.json'),
+                os.path.join(settings.BASE_DIR, 'static', 'images', 'egg.jpg'))
+
+    @classmethod
+    def version(cls):
+        config_path, image_path = cls.paths()
+        if not os.path.exists(config_path):
+            raise FileNotFoundError('区域配置文件不存在')
+        if not os.path.exists(image_path):
+            raise FileNotFoundError('基础图像文件不存在')
+        return os.stat(config_path).st_mtime_ns, os.stat(image_path).st_mtime_ns
+
+    @classmethod
+    def get(cls):
+        version = cls.version()
+        entry = cls._entry
+        if entry and entry[0] == version:
+            return entry[1]
+        with cls._lock:
+            entry = cls._entry
+            if entry and entry[0] == version:
+                return entry[1]
+            config_path, image_path = cls.paths()
+            with open(config_path, 'r', encoding='utf-8') as f:
+                regions_config = json.load(f)
+            with Image.open(image_path) as base_image:
+                loaded = EFPCanvasEntry(regions_config, base_image)
+            cls._entry = (version, loaded)
+            logger.info(f"EFPCanvas loaded {len(loaded.polygons)} regions on {loaded.width}x{loaded.height}")
+            return loaded
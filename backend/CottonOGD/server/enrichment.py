@@ -0,0 +1,259 @@
+"""
+超几何分布富集分析（GO / KEGG 共用）
+
+输入为 AnnotationSets（term × 基因 稀疏矩阵）与输入基因在背景中的下标：
+    k  每个 term 与输入的交集      = 稀疏矩阵 × 输入指示向量
+    n  term 大小，N 输入基因数，M 背景基因数
+    p  = P(X >= k)，在对数空间对尾部概率逐项求和（log 阶乘查表，所有 term 拼成一个平铺数组一次计算）
+scipy 的 hypergeom.sf 逐元素调用 boost，几千个 term 就要近一秒；这里的结果与其相对误差在 1e-9 以内。
+与 gseapy.enrich 的口径一致：只检验 k >= 1 的 term，多重检验校正也只在这些 term 上进行。
+GO 另提供 elim / parent-child 两种按 DAG 去相关的检验（见 go_dag）。
+"""
+from collections import defaultdict
+import numpy as np
+from scipy import sparse, special
+
+CORRECTIONS = ('bh', 'bonferroni')
+# classic：每个 term 独立检验；elim / parent_child：按 GO DAG 去相关（需传递到祖先的注释集合）
+ALGORITHMS = ('classic', 'elim', 'parent_child')
+ELIM_CUTOFF = 0.01
+
+
+def bh_adjust(p_values):
+    """Benjamini-Hochberg 校正"""
+    p_values = np.asarray(p_values, dtype=np.float64)
+    m = len(p_values)
+    if m == 0:
+        return p_values
+    order = np.argsort(p_values)
+    ranked = p_values[order] * m / np.arange(1, m + 1)
+    # 从后往前取累计最小值保证单调
+    ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+    adjusted = np.empty(m)
+    adjusted[order] = np.minimum(ranked, 1.0)
+    return adjusted
+
+
+def bonferroni_adjust(p_values):
+    p_values = np.asarray(p_values, dtype=np.float64)
+    return np.minimum(p_values * len(p_values), 1.0)
+
+
+def _log_factorial(limit):
+    """log(i!)，i = 0..limit"""
+    return special.gammaln(np.arange(limit + 1, dtype=np.float64) + 1)
+
+
+def hypergeom_sf(k, M, n, N):
+    """
+    P(X >= k)，X ~ Hypergeom(总数 M, 成功数 n, 抽样数 N)；k、n 为等长整数数组，
+    M、N 为整数或与 k 等长的数组（parent-child 检验中每个 term 的总体不同）。
+    每个 term 的尾部 x ∈ [max(k, N + n - M), min(n, N)]，总长度不超过所有 term 大小之和。
+    """
+    k = np.asarray(k, dtype=np.int64)
+    n = np.asarray(n, dtype=np.int64)
+    M = np.broadcast_to(np.asarray(M, dtype=np.int64), k.shape)
+    N = np.broadcast_to(np.asarray(N, dtype=np.int64), k.shape)
+    start = np.maximum(k, np.maximum(N + n - M, 0))
+    lengths = np.maximum(np.minimum(n, N) - start + 1, 0)
+    p_values = np.zeros(len(k))
+    tested = np.flatnonzero(lengths)
+    if not len(tested):
+        return p_values
+    lengths = lengths[tested]
+    offsets = np.zeros(len(tested), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    x = np.repeat(start[tested] - offsets, lengths) + np.arange(lengths.sum())
+    size = np.repeat(n[tested], lengths)
+    total = np.repeat(M[tested], lengths)
+    drawn = np.repeat(N[tested], lengths)
+    log_factorial = _log_factorial(int(M[tested].max()))
+    log_pmf = (log_factorial[size] - log_factorial[x] - log_factorial[size - x]
+               + log_factorial[total - size] - log_factorial[drawn - x]
+               - log_factorial[total - size - drawn + x]
+               - (log_factorial[total] - log_factorial[drawn] - log_factorial[total - drawn]))
+    peak = np.maximum.reduceat(log_pmf, offsets)
+    tail = np.add.reduceat(np.exp(log_pmf - np.repeat(peak, lengths)), offsets)
+    p_values[tested] = np.minimum(np.exp(peak + np.log(tail)), 1.0)
+    return p_values
+
+
+class EnrichmentResult:
+    """被检验 term（k >= 1）的统计量，数组按 term 下标对齐"""
+
+    def __init__(self, sets, input_idx, terms, overlap, term_size, p_values, adjusted, hits):
+        self.sets = sets
+        self.input_idx = input_idx
+        self.terms = terms
+        self.overlap = overlap
+        self.term_size = term_size
+        self.p_values = p_values
+        self.adjusted = adjusted
+        self.background_size = len(sets.genes)
+        self.input_size = len(input_idx)
+        self._hits = hits
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # GeneRatio / BgRatio
+            self.fold_enrichment = (overlap / self.input_size) / (term_size / self.background_size)
+            self.rich_factor = overlap / term_size
+
+    def __len__(self):
+        return len(self.terms)
+
+    def order(self):
+        """按 p 值升序的位置"""
+        return np.argsort(self.p_values, kind='stable')
+
+    def records(self, p_value_threshold=1.0):
+        """
+        按 p 值升序返回 p <= 阈值的 (term 下标, 统计量, 命中基因下标)，
+        gene_ratio 与 gseapy 的 Overlap 相同（k/n），bg_ratio 为 n/M。
+        """
+        for position in self.order():
+            p_value = float(self.p_values[position])
+            if p_value > p_value_threshold:
+                break
+            k, n = int(self.overlap[position]), int(self.term_size[position])
+            yield int(self.terms[position]), {
+                'gene_ratio': f'{k}/{n}',
+                'bg_ratio': f'{n}/{self.background_size}',
+                'rich_factor': float(self.rich_factor[position]),
+                'fold_enrichment': float(self.fold_enrichment[position]),
+                'p_value': p_value,
+                'corrected_p_value': float(self.adjusted[position]),
+                'gene_count': k,
+            }, self.hit_genes(position)
+
+    def hit_genes(self, position):
+        """第 position 个被检验 term 中命中的输入基因下标"""
+        term = self.terms[position]
+        start, end = self.sets.indptr[term], self.sets.indptr[term + 1]
+        return self.sets.indices[start:end][self._hits[start:end]]
+
+
+def _check_correction(correction):
+    if correction not in CORRECTIONS:
+        raise ValueError(f'Unsupported correction: {correction}, expected one of {", ".join(CORRECTIONS)}')
+
+
+def _adjust(p_values, correction):
+    return bh_adjust(p_values) if correction == 'bh' else bonferroni_adjust(p_values)
+
+
+def _overlaps(sets, input_idx):
+    """输入指示向量、每个 term 的交集、注释是否命中，以及被检验 term（k >= 1）的下标/交集/大小"""
+    indicator = np.zeros(len(sets.genes))
+    indicator[input_idx] = 1.0
+    counts = sets.matrix @ indicator
+    hits = indicator[sets.indices] > 0
+    terms = np.flatnonzero(counts)
+    overlap = np.rint(counts[terms]).astype(np.int64)
+    return indicator, counts, hits, terms, overlap, sets.term_sizes()[terms]
+
+
+def _dag_positions(sets, dag, terms):
+    """被检验 term 在 DAG 中的下标，不在 DAG 中为 -1"""
+    return np.fromiter((dag.term_index.get(sets.terms[t], -1) for t in terms), dtype=np.int64, count=len(terms))
+
+
+def hypergeometric_test(sets, input_idx, correction='bh'):
+    """对所有 term 做单侧超几何检验，返回 EnrichmentResult"""
+    _check_correction(correction)
+    indicator, counts, hits, terms, overlap, term_size = _overlaps(sets, input_idx)
+    p_values = hypergeom_sf(overlap, len(sets.genes), term_size, len(input_idx))
+    return EnrichmentResult(sets, input_idx, terms, overlap, term_size, p_values,
+                            _adjust(p_values, correction), hits)
+
+
+def parent_child_test(sets, input_idx, dag, correction='bh'):
+    """
+    Parent-child 检验（Grossmann 2007，union 口径）：以所有父 term 注释基因的并集为总体、
+    其中的输入基因为抽样，检验 term 相对父节点是否富集；没有父节点的 term 按经典检验计算。
+    sets 需先按 DAG 传递到祖先（AnnotationSets.propagate）。
+    """
+    _check_correction(correction)
+    indicator, counts, hits, terms, overlap, term_size = _overlaps(sets, input_idx)
+    sizes = sets.term_sizes()
+    total = np.full(len(terms), len(sets.genes), dtype=np.int64)
+    drawn = np.full(len(terms), len(input_idx), dtype=np.int64)
+
+    single_positions, single_parents = [], []
+    multi_positions, multi_rows, multi_cols = [], [], []
+    for position, d in enumerate(_dag_positions(sets, dag, terms)):
+        if d < 0:
+            continue
+        parents = [sets.term_index[dag.terms[p]] for p in dag.parents(d) if dag.terms[p] in sets.term_index]
+        if len(parents) == 1:
+            single_positions.append(position)
+            single_parents.append(parents[0])
+        elif parents:
+            multi_rows.extend([len(multi_positions)] * len(parents))
+            multi_cols.extend(parents)
+            multi_positions.append(position)
+    # 单个父节点：总体就是父 term 本身
+    total[single_positions] = sizes[single_parents]
+    drawn[single_positions] = np.rint(counts[single_parents]).astype(np.int64)
+    # 多个父节点：父 term 行相加后非零的列即并集
+    if multi_positions:
+        selector = sparse.csr_matrix(
+            (np.ones(len(multi_rows)), (multi_rows, multi_cols)), shape=(len(multi_positions), len(sets.terms)))
+        union = selector @ sets.matrix
+        union.data[:] = 1.0
+        total[multi_positions] = union.getnnz(axis=1)
+        drawn[multi_positions] = np.rint(union @ indicator).astype(np.int64)
+
+    p_values = hypergeom_sf(overlap, total, term_size, drawn)
+    return EnrichmentResult(sets, input_idx, terms, overlap, term_size, p_values,
+                            _adjust(p_values, correction), hits)
+
+
+def elim_test(sets, input_idx, dag, correction='bh', cutoff=ELIM_CUTOFF):
+    """
+    elim 检验（Alexa 2006）：自底向上检验，p < cutoff 的 term 把其基因从所有祖先中移除后再检验祖先。
+    DAG 中 height 相同的 term 互不为祖先，同一层一次向量化计算。sets 需先按 DAG 传递到祖先。
+    报告的 overlap / term_size 仍为完整集合，p 值为移除后的检验结果。
+    """
+    _check_correction(correction)
+    indicator, counts, hits, terms, overlap, term_size = _overlaps(sets, input_idx)
+    dag_idx = _dag_positions(sets, dag, terms)
+    height = np.where(dag_idx >= 0, dag.height[np.maximum(dag_idx, 0)], 0)
+    position_of = {int(t): position for position, t in enumerate(terms)}
+    # 被检验 term 位置 -> 需要移除的基因下标数组列表
+    removed = defaultdict(list)
+    p_values = np.ones(len(terms))
+
+    for level in np.unique(height):
+        positions = np.flatnonzero(height == level)
+        level_genes = []
+        for position in positions:
+            genes = sets.term_genes(terms[position])
+            if position in removed:
+                genes = genes[~np.isin(genes, np.concatenate(removed.pop(position)))]
+            level_genes.append(genes)
+        effective_size = np.fromiter((len(g) for g in level_genes), dtype=np.int64, count=len(positions))
+        effective_overlap = np.fromiter((indicator[g].sum() for g in level_genes), dtype=np.int64, count=len(positions))
+        p_values[positions] = hypergeom_sf(effective_overlap, len(sets.genes), effective_size, len(input_idx))
+
+        for position, genes in zip(positions, level_genes):
+            if p_values[position] >= cutoff or dag_idx[position] < 0:
+                continue
+            for ancestor in dag.ancestors(dag_idx[position]):
+                target = position_of.get(sets.term_index.get(dag.terms[ancestor]))
+                if target is not None:
+                    removed[target].append(genes)
+
+    return EnrichmentResult(sets, input_idx, terms, overlap, term_size, p_values,
+                            _adjust(p_values, correction), hits)
+
+
+def run_test(sets, input_idx, algorithm='classic', correction='bh', dag=None):
+    """按 algorithm 选择检验方法；elim / parent_child 需要 GO DAG"""
+    if algorithm == 'classic':
+        return hypergeometric_test(sets, input_idx, correction)
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Unsupported algorithm: {algorithm}, expected one of {", ".join(ALGORITHMS)}')
+    if dag is None:
+        raise ValueError(f'{algorithm} requires the GO DAG')
+    if algorithm == 'elim':
+        return elim_test(sets, input_idx, dag, correction)
+    return parent_child_test(sets, input_idx, dag, correction)
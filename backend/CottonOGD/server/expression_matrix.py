@@ -0,0 +1,109 @@
+"""
+表达矩阵构建
+
+把 gene_expression 的长表 (id_id, geneid, stage, tissue, value) 转成 基因 × 样本 的矩阵，
+样本列按 TISSUE_ORDER 与各组织的时期顺序排列。stage/tissue 先编码为去重后的组合，
+字符串处理与排序值只按组合计算一次，透视通过 np.bincount 一次完成，不再逐行 apply / iterrows。
+"""
+import numpy as np
+import pandas as pd
+
+TISSUE_ORDER = [
+    'Root', 'Stem', 'Cotyledon', 'Leaf', 'Pholem',
+    'Sepal', 'Bract', 'Petal', 'Anther', 'Stigma',
+    'Ovules', 'Fibers', 'Seed','武汉','海南','新疆'
+]
+
+# ===== 特殊排序规则 =====
+STAGE_ORDER_MAP = {
+    ('G.hirsutumAD1_TM-1_HAU_v1.1', '新疆'): [
+        "m2_10","m2_14","m2_18","m2_22","m1_2","m1_6","m1_10","m1_14","m1_18","m1_22","0_2","0_6","0_10","0_14","0_18","0_22","1_2","1_6","1_10","1_14","1_18","1_22","2_2","2_6","2_10","2_14","2_18","2_22","3_2","3_6","3_10","3_14","3_18","3_22","4_2","4_6","4_10","4_14","4_18","4_22","5_2","5_6","5_10","5_14","5_18","5_22","6_2","6_6","6_10","6_14","6_18","6_22","7_2","7_6","7_10","7_14","7_18","7_22","8_2","8_6","8_10","8_14","8_18","8_22","9_2","9_6","9_10","9_14","9_18","9_22","10_2","10_6","10_10","10_14","10_18","10_22","11_2","11_6","11_10","11_14","11_18","11_22","12_2","12_6","12_10","12_14","12_18","12_22","13_2","13_6","13_10","13_14","13_18","13_22","14_2","14_6","14_10","14_14","14_18","14_22","15_2","15_6","15_10","15_14","15_18","15_22","16_2","16_6","16_10","16_14","16_18","16_22","17_2","17_6","17_10","17_14","17_18","17_22","18_2","18_6","18_10","18_14","18_18","18_22","19_2","19_6","19_10","19_14","19_18","19_22","20_2","20_6","20_10"
+    ],
+
+    ('G.hirsutumAD1_TM-1_HAU_v1.1', '武汉'): [
+        "m2D08","m2D12","m2D16","m2D20","Nm1D00","Nm1D04","Nm1D08","Nm1D12","Nm1D16","Nm1D20","X0D00","X0D04","X0D08","X0D12","X0D16","X0D20","X1D00","X1D04","X1D08","X1D12","X1D16","X1D20","X2D00","X2D04","X2D08","X2D12","X2D16","X2D20","X3D00","X3D04","X3D08","X3D12","X3D16","X3D20","X4D00","X4D04","X4D08","X4D12","X4D16","X4D20","X5D00","X5D04","X5D08","X5D12","X5D16","X5D20","X6D00","X6D04","X6D08","X6D12","X6D16","X6D20","X7D00","X7D04","X7D08","X7D12","X7D16","X7D20","X8D00","X8D04","X8D08","X8D12","X8D16","X8D20","X9D00","X9D04","X9D08","X9D12","X9D16","X9D20","X10D00","X10D04","X10D08","X10D12","X10D16","X10D20","X11D00","X11D04","X11D08","X11D12","X11D16","X11D20","X12D00","X12D04","X12D08","X12D12","X12D16","X12D20","X13D00","X13D04","X13D08","X13D12","X13D16","X13D20","X14D00","X14D04","X14D08","X14D12","X14D16","X14D20","X15D00","X15D04","X15D08","X15D12","X15D16","X15D20","X16D00","X16D04","X16D08","X16D12","X16D16","X16D20","X17D00","X17D04","X17D08","X17D12","X17D16","X17D20","X18D00","X18D04","X18D08","X18D12","X18D16","X18D20","X19D00","X19D04","X19D08","X19D12","X19D16","X19D20","X20D00","X20D04","X20D08"
+    ],
+
+    ('G.hirsutumAD1_TM-1_HAU_v1.1', '海南'): [
+        "m2-8","m2-12","m2-16","m2-20","m1-0","m1-4","m1-8","m1-12","m1-16","m1-20","0-0","0-4","0-8","0-12","0-16","0-20","1-0","1-4","1-8","1-12","1-16","1-20","2-0","2-4","2-8","2-12","2-16","2-20","3-0","3-4","3-8","3-12","3-16","3-20","4-0","4-4","4-8","4-12","4-16","4-20","5-0","5-4","5-8","5-12","5-16","5-20","6-0","6-4","6-8","6-12","6-16","6-20","7-0","7-4","7-8","7-12","7-16","7-20","8-0","8-4","8-8","8-12","8-16","8-20","9-0","9-4","9-8","9-12","9-16","9-20","10-0","10-4","10-8","10-12","10-16","10-20","11-0","11-4","11-8","11-12","11-16","11-20","12-0","12-4","12-8","12-12","12-16","12-20","13-0","13-4","13-8","13-12","13-16","13-20","14-0","14-4","14-8","14-12","14-16","14-20","15-0","15-4","15-8","15-12","15-16","15-20","16-0","16-4","16-8","16-12","16-16","16-20","17-0","17-4","17-8","17-12","17-16","17-20","18-0","18-4","18-8","18-12","18-16","18-20","19-0","19-4","19-8","19-12","19-16","19-20","20-0","20-4","20-8"
+    ]
+}
+
+# 预先计算的排序编码，避免每行重建
+TISSUE_CODES = {tissue: i for i, tissue in enumerate(TISSUE_ORDER)}
+STAGE_CODES = {key: {stage: i for i, stage in enumerate(order)} for key, order in STAGE_ORDER_MAP.items()}
+# build_expression_matrix 需要的列（顺序固定）
+EXPRESSION_FIELDS = ('id_id', 'geneid', 'stage', 'tissue', 'value')
+# 没有数字的时期排在最后
+DEFAULT_STAGE_ORDER = 9999
+
+
+def sample_names(stage, tissue):
+    """stage + tissue 组成样本列名（去掉时期前缀 X），stage 为空时只用 tissue"""
+    prefix = stage.str.replace(r'^X(\d+)', r'\1', regex=True)
+    return (prefix + tissue).where(stage != '', tissue)
+
+
+def stage_order(genome_id, stage, tissue):
+    """
+    每行的时期排序值：命中 STAGE_ORDER_MAP 的组织按自定义顺序，
+    其余取时期中的第一个数字
+    """
+    order = stage.str.extract(r'(\d+)', expand=False).astype(float).fillna(DEFAULT_STAGE_ORDER)
+    for (genome, special_tissue), codes in STAGE_CODES.items():
+        if genome != genome_id:
+            continue
+        mask = (tissue == special_tissue).to_numpy()
+        if mask.any():
+            order[mask] = stage[mask].map(codes).fillna(len(codes)).to_numpy()
+    return order.to_numpy()
+
+
+def build_expression_matrix(records, genome_id):
+    """
+    records: gene_expression.values_list(*EXPRESSION_FIELDS) 的结果（元组）
+    返回 (rows, samples, matrix)：
+    - rows: [(id_id, geneid), ...]，按 id_id、geneid 排序
+    - samples: 排好序的样本列名
+    - matrix: float64 矩阵，重复值取平均，缺失为 NaN
+    """
+    df = pd.DataFrame.from_records(records, columns=EXPRESSION_FIELDS)
+    df = df[df['value'].notna()]
+    if df.empty:
+        return [], [], np.empty((0, 0))
+
+    # 字符串操作只在去重后的 (stage, tissue) 组合上进行，再按编码映射回每一行
+    stage_codes, stage_uniques = pd.factorize(df['stage'].fillna(''))
+    tissue_codes, tissue_uniques = pd.factorize(df['tissue'].fillna('Unknown'))
+    pair_codes, pairs = pd.factorize(stage_codes * len(tissue_uniques) + tissue_codes)
+    stage = pd.Series(stage_uniques[pairs // len(tissue_uniques)], dtype=object).astype(str)
+    tissue = pd.Series(tissue_uniques[pairs % len(tissue_uniques)], dtype=object).astype(str)
+    pair_sample, sample_uniques = pd.factorize(sample_names(stage, tissue))
+    sample_codes = pair_sample[pair_codes]
+
+    # 组合按首次出现顺序编码，按 (组织, 时期) 稳定排序后取每个样本的第一个组合，
+    # 与逐行排序后 unique() 的结果一致
+    keys = pd.DataFrame({
+        'code': pair_sample,
+        'tissue_idx': tissue.map(TISSUE_CODES).fillna(len(TISSUE_ORDER)).to_numpy(),
+        'stage_idx': stage_order(genome_id, stage, tissue),
+    })
+    sample_rank = (keys.sort_values(['tissue_idx', 'stage_idx'], kind='stable')
+                   .drop_duplicates('code')['code'].to_numpy())
+    # 原编码 -> 排序后的列号
+    column_of = np.empty_like(sample_rank)
+    column_of[sample_rank] = np.arange(len(sample_rank))
+
+    grouped = df.groupby(['id_id', 'geneid'], sort=True)
+    row_codes = grouped.ngroup().to_numpy()
+    keep = row_codes >= 0
+    rows = grouped.size().index.tolist()
+
+    n_rows, n_cols = len(rows), len(sample_uniques)
+    flat = row_codes[keep] * n_cols + column_of[sample_codes[keep]]
+    sums = np.bincount(flat, weights=df['value'].to_numpy(dtype=float)[keep], minlength=n_rows * n_cols)
+    counts = np.bincount(flat, minlength=n_rows * n_cols)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        matrix = (sums / counts).reshape(n_rows, n_cols)
+    samples = [sample_uniques[i] for i in sample_rank]
+    return rows, samples, matrix
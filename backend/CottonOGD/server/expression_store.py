@@ -0,0 +1,136 @@
+"""
+列式表达矩阵存储
+
+gene_expression 每个 (基因, 组织, 时期) 一行，一个基因组约千万行，热图/EFP 每次都要扫描并透视。
+这里为每个基因组预先生成一个 float32 稠密矩阵（缺失为 NaN），与基因组数据放在一起：
+    data/genome/<genome>/<genome>.expr.npy       基因 × 样本 矩阵，按 mmap 方式读取
+    data/genome/<genome>/<genome>.expr_ids.npy   行对应的 db_id（升序）
+    data/genome/<genome>/<genome>.expr.json      行对应的 geneid、列对应的 (stage, tissue)
+列按 TISSUE_ORDER / STAGE_ORDER_MAP 的规范顺序排列，请求时按 db_id 二分查找切行，不再做 SQL 聚合。
+文件由 `manage.py build_expression_store <genome>` 生成，重建后按矩阵文件 mtime 自动重新加载。
+"""
+import json
+import os
+import threading
+import logging
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from CottonOGD.server.expression_matrix import sample_names
+
+logger = logging.getLogger(__name__)
+
+
+class ExpressionEntry:
+    """某个基因组已加载的矩阵及其行列索引"""
+
+    def __init__(self, matrix, db_ids, geneids, stages, tissues):
+        self.matrix = matrix
+        self.db_ids = db_ids
+        self.geneids = geneids
+        self.stages = stages
+        self.tissues = tissues
+        self.samples = list(sample_names(pd.Series(stages, dtype=object), pd.Series(tissues, dtype=object)))
+        self.row_of_gene = {geneid: i for i, geneid in enumerate(geneids)}
+
+    def rows_of(self, db_ids):
+        """返回存在于矩阵中的 db_id 对应的行号（按 db_id 升序）"""
+        wanted = np.unique(np.asarray(db_ids, dtype=np.int64))
+        pos = np.searchsorted(self.db_ids, wanted)
+        pos = pos[pos < len(self.db_ids)]
+        return pos[np.isin(self.db_ids[pos], wanted)]
+
+
+class ExpressionStore:
+    # genome -> (mtime, ExpressionEntry)
+    _entries = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def paths(cls, genome):
+        base = os.path.join(settings.BASE_DIR, 'data', 'genome', genome, genome)
+        return f'{base}.expr.npy', f'{base}.expr_ids.npy', f'{base}.expr.json'
+
+    @classmethod
+    def version(cls, genome):
+        """矩阵文件的 mtime，未生成时返回 0（供下游缓存键使用）"""
+        try:
+            return os.stat(cls.paths(genome)[0]).st_mtime_ns
+        except (FileNotFoundError, TypeError):
+            return 0
+
+    @classmethod
+    def get(cls, genome):
+        """返回已加载的 ExpressionEntry，矩阵文件不存在时返回 None"""
+        if not genome:
+            return None
+        matrix_path, ids_path, meta_path = cls.paths(genome)
+        try:
+            mtime = os.stat(matrix_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        entry = cls._entries.get(genome)
+        if entry and entry[0] == mtime:
+            return entry[1]
+        with cls._lock:
+            entry = cls._entries.get(genome)
+            if entry and entry[0] == mtime:
+                return entry[1]
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            loaded = ExpressionEntry(
+                np.load(matrix_path, mmap_mode='r'),
+                np.load(ids_path),
+                meta['geneids'], meta['stages'], meta['tissues'],
+            )
+            cls._entries[genome] = (mtime, loaded)
+            logger.info(f"ExpressionStore loaded {matrix_path}: {loaded.matrix.shape}")
+            return loaded
+
+    @classmethod
+    def matrix(cls, genome, db_ids, tissues=None):
+        """
+        按 db_id 切出表达矩阵，返回值与 build_expression_matrix 相同：(rows, samples, matrix)。
+        只保留至少有一个值的行与样本列；未生成矩阵文件时返回 None，由调用方回退到数据库。
+        """
+        entry = cls.get(genome)
+        if entry is None:
+            return None
+        row_idx = entry.rows_of(db_ids)
+        if not len(row_idx):
+            return [], [], np.empty((0, 0))
+        block = np.asarray(entry.matrix[row_idx], dtype=np.float64)
+
+        columns = np.arange(len(entry.samples))
+        if tissues:
+            columns = columns[np.isin(np.asarray(entry.tissues, dtype=object), list(tissues))]
+        present = ~np.isnan(block[:, columns])
+        columns = columns[present.any(axis=0)]
+        keep = present.any(axis=1)
+        row_idx, block = row_idx[keep], block[keep][:, columns]
+
+        # 不同 (stage, tissue) 可能得到同一个样本名，合并为平均值
+        codes, samples = pd.factorize(pd.Index([entry.samples[c] for c in columns]))
+        if len(samples) < len(columns):
+            valid = ~np.isnan(block)
+            sums = np.zeros((len(row_idx), len(samples)))
+            counts = np.zeros((len(row_idx), len(samples)))
+            np.add.at(sums.T, codes, np.where(valid, block, 0).T)
+            np.add.at(counts.T, codes, valid.T)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                block = sums / counts
+
+        rows = [(int(entry.db_ids[i]), entry.geneids[i]) for i in row_idx]
+        return rows, list(samples), block
+
+    @classmethod
+    def gene_values(cls, genome, geneid):
+        """返回某基因所有有值样本的 (stage, tissue, value)；未生成矩阵文件时返回 None"""
+        entry = cls.get(genome)
+        if entry is None:
+            return None
+        row = entry.row_of_gene.get(geneid)
+        if row is None:
+            return []
+        values = np.asarray(entry.matrix[row], dtype=np.float64)
+        return [(entry.stages[c], entry.tissues[c], float(values[c])) for c in np.flatnonzero(~np.isnan(values))]
@@ -0,0 +1,42 @@
+"""
+JSON 响应工具
+
+旧版接口把结果先 json.dumps 成字符串再交给 DRF 序列化一次（前端需要二次 JSON.parse）。
+请求头 X-Api-Version: 2（或查询参数 api_version=2）时返回原生对象，
+由 orjson 直接编码为字节；未带版本号的请求保持旧格式，兼容现有前端。
+"""
+import json
+import logging
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    logger.warning('orjson not available, falling back to json for native responses')
+
+# 返回原生对象的接口版本
+NATIVE_API_VERSION = '2'
+
+
+def wants_native(request):
+    """请求是否要求新版（非二次编码）响应"""
+    version = request.headers.get('X-Api-Version') or request.GET.get('api_version')
+    return str(version or '').strip() == NATIVE_API_VERSION
+
+
+def dumps(obj):
+    """编码为 UTF-8 字节"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def native_response(payload, status=200):
+    """直接返回编码后的字节，不再经过 DRF 渲染器"""
+    response = HttpResponse(dumps(payload), content_type='application/json', status=status)
+    response['X-Api-Version'] = NATIVE_API_VERSION
+    return response
@@ -0,0 +1,61 @@
+"""
+基因组 FASTA 句柄池
+
+pyfaidx.Fasta 打开时需要解析 .fai/.gzi 索引，多 Gb 的棉花基因组每次请求都重新打开代价很高。
+这里按基因组缓存已打开的句柄（进程内 LRU，容量由 settings.FASTA_POOL_SIZE 控制），
+文件 mtime 变化（重新导入）时自动重新打开。
+"""
+import os
+import threading
+import logging
+from collections import OrderedDict
+from django.conf import settings
+import pyfaidx
+
+logger = logging.getLogger(__name__)
+
+
+class FastaPool:
+    # genome_id -> (path, mtime, Fasta)，按最近使用排序
+    _handles = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def genome_file(cls, genome_id):
+        """按优先级查找基因组文件，返回 (path, mtime)，都不存在时返回 None"""
+        genome_dir = os.path.join(settings.BASE_DIR, 'data', 'genome', genome_id)
+        for name in (f'{genome_id}.genome.fa.gz', f'{genome_id}.fa'):
+            path = os.path.join(genome_dir, name)
+            try:
+                return path, os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+        return None
+
+    @classmethod
+    def get(cls, genome_id):
+        """返回该基因组已打开的 pyfaidx.Fasta，文件不存在或打开失败时返回 None"""
+        located = cls.genome_file(genome_id)
+        if located is None:
+            logger.warning(f"Genome file not found for genome: {genome_id}")
+            return None
+        path, mtime = located
+
+        with cls._lock:
+            entry = cls._handles.get(genome_id)
+            if entry and entry[0] == path and entry[1] == mtime:
+                cls._handles.move_to_end(genome_id)
+                return entry[2]
+
+            try:
+                fa = pyfaidx.Fasta(path)
+            except Exception as e:
+                logger.error(f"Error loading FASTA file with pyfaidx: {e}")
+                return None
+            # 被替换/淘汰的句柄可能仍在其他线程中使用，不主动 close，由 GC 释放
+            cls._handles[genome_id] = (path, mtime, fa)
+            cls._handles.move_to_end(genome_id)
+            while len(cls._handles) > getattr(settings, 'FASTA_POOL_SIZE', 8):
+                evicted, _ = cls._handles.popitem(last=False)
+                logger.info(f"FastaPool evicted {evicted}")
+            return fa
@@ -0,0 +1,62 @@
+"""
+基因详情数据包：一次性取出一组 db_id 的注释、GFF、序列、GO、KEGG
+
+查询次数固定（每张表一次），转录本/序列在 Python 中按 mrna_id、gene_type 分组，
+多转录本基因与单转录本基因的加载开销基本一致。
+"""
+from CottonOGD.models import gene_annotation, gene_info, gene_seq, gene_go, gene_kegg
+from CottonOGD.server.seq_store import SeqStore, INLINE_SEQUENCE, SEQ_FIELDS
+
+# 转录本序列类型 -> 返回字段名
+TRANSCRIPT_SEQ_TYPES = {
+    'cdna': 'cdna_seq',
+    'cds': 'cds_seq',
+    'downstream': 'downstream_seq',
+    'mrna': 'mrna_seq',
+    'pro': 'protein_seq',
+    'upstream': 'upstream_seq',
+}
+
+
+def load_gene_bundle(db_ids, include_seq=True):
+    """
+    :param db_ids: genemaster 的 id 列表
+    :param include_seq: 是否读取 gene_seq（summary 页面不需要序列）
+    :return: {'annotation', 'gff', 'go', 'kegg', 'seqs'}，seqs 为 {(mrna_id, gene_type): sequence}
+    """
+    bundle = {
+        'annotation': list(gene_annotation.objects.filter(id_id__in=db_ids).values()),
+        'gff': list(gene_info.objects.filter(id_id__in=db_ids).order_by('id').values()),
+        'go': list(gene_go.objects.filter(id_id__in=db_ids).values()),
+        'kegg': list(gene_kegg.objects.filter(id_id__in=db_ids).values()),
+        'seqs': {},
+    }
+    if include_seq:
+        rows = gene_seq.objects.filter(id_id__in=db_ids).order_by('id').values(
+            'mrna_id', 'gene_type', *SEQ_FIELDS, inline=INLINE_SEQUENCE)
+        for row in rows:
+            key = (row['mrna_id'], row['gene_type'])
+            # 与原先 .first() 一致：同一 (mrna_id, gene_type) 取最早的一条
+            if key not in bundle['seqs']:
+                bundle['seqs'][key] = SeqStore.sequence_of(row)
+    return bundle
+
+
+def first_gene_row(gff_rows):
+    """GFF 中第一条 type=gene 的记录"""
+    return next((row for row in gff_rows if row['type'] == 'gene'), None)
+
+
+def mrna_ids(gff_rows):
+    """从 mRNA 行的 attributes（ID=xxx;...）中取出转录本ID"""
+    return [(row.get('attributes') or '').split(';')[0].partition('=')[2]
+            for row in gff_rows if row['type'] == 'mRNA']
+
+
+def transcript_seqs(bundle, mrna_id):
+    """单个转录本的各类序列，缺失的置为空字符串"""
+    seqs = bundle['seqs']
+    result = {'id': mrna_id}
+    for gene_type, field in TRANSCRIPT_SEQ_TYPES.items():
+        result[field] = seqs.get((mrna_id, gene_type)) or ''
+    return result
@@ -0,0 +1,59 @@
+"""
+基因组基因分布摘要
+
+整个基因组的基因分布（每条染色体的基因数 + 固定宽度窗口的基因密度）在导入时预先计算，
+以紧凑的整数列表存入缓存，gene_genomic_distribution 的全基因组请求直接读取，
+不再逐行加载 gene_info。由 `manage.py build_gene_distribution <genome>` 生成，
+缓存丢失时首次请求会按需重建。
+"""
+import logging
+import numpy as np
+from django.core.cache import cache
+from CottonOGD.models import gene_info
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_KEY = 'gene_distribution:{genome}'
+# 密度窗口宽度(bp)
+BIN_SIZES = (100_000, 1_000_000)
+
+
+def summarize(seqids, starts):
+    """
+    按染色体统计基因数与窗口密度（以基因起点落入的窗口计数）
+    返回 {'chr_distribution': {chr: n}, 'density': {bin_size: {chr: [n, ...]}}}
+    """
+    seqids = np.asarray(seqids, dtype=object)
+    starts = np.asarray(starts, dtype=np.int64)
+    chr_names, codes = np.unique(seqids, return_inverse=True)
+    counts = np.bincount(codes, minlength=len(chr_names))
+
+    density = {}
+    for bin_size in BIN_SIZES:
+        bins = starts // bin_size
+        density[str(bin_size)] = {
+            str(name): np.bincount(bins[codes == i]).tolist()
+            for i, name in enumerate(chr_names)
+        }
+    return {
+        'chr_distribution': {str(name): int(n) for name, n in zip(chr_names, counts)},
+        'density': density,
+    }
+
+
+def build_summary(genome):
+    """从 gene_info 只取 seqid/start 两列计算并写入缓存"""
+    rows = gene_info.objects.filter(genome_id=genome, type='gene').values_list('seqid', 'start')
+    seqids, starts = zip(*rows) if rows else ((), ())
+    summary = summarize(seqids, starts)
+    summary['total_genes'] = len(starts)
+    cache.set(SUMMARY_KEY.format(genome=genome), summary, None)
+    logger.info(f"gene distribution built for {genome}: {summary['total_genes']} genes")
+    return summary
+
+
+def genome_summary(genome):
+    summary = cache.get(SUMMARY_KEY.format(genome=genome))
+    if summary is None:
+        summary = build_summary(genome)
+    return summary
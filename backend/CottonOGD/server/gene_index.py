@@ -0,0 +1,83 @@
+"""
+基因ID解析索引：(genome, 规范化geneid) -> db_id
+
+每个worker按基因组懒加载一次 genemaster，之后的批量查询均为 O(k) 的字典查找。
+基因组重新导入后通过 `manage.py refresh_gene_index <genome>` 更新版本号，
+各worker在下次查询时发现版本变化即重建该基因组的索引。
+"""
+import threading
+import time
+import logging
+from django.core.cache import cache
+from CottonOGD.models import GeneMaster
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'gene_index:version:{genome}'
+
+
+class GeneIndex:
+    # genome -> (version, {geneid: db_id})
+    _genomes = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _version_key(cls, genome):
+        return VERSION_KEY.format(genome=genome)
+
+    @classmethod
+    def _build(cls, genome):
+        """从 genemaster 读取单个基因组的 (geneid, id)，同时登记规范化后的ID"""
+        # 延迟导入，避免与 location_ID 循环引用
+        from CottonOGD.views.location_ID import clean_gene_id
+
+        index = {}
+        rows = GeneMaster.objects.filter(genome_id=genome).values_list('geneid', 'id').iterator(chunk_size=20000)
+        for geneid, db_id in rows:
+            index[geneid] = db_id
+        # 规范化ID只作为补充，不覆盖库中原样存在的ID
+        for geneid, db_id in list(index.items()):
+            index.setdefault(clean_gene_id(geneid), db_id)
+        logger.info(f"GeneIndex built for {genome}: {len(index)} keys")
+        return index
+
+    @classmethod
+    def _get(cls, genome, version):
+        entry = cls._genomes.get(genome)
+        if entry and entry[0] == version:
+            return entry[1]
+        with cls._lock:
+            entry = cls._genomes.get(genome)
+            if entry and entry[0] == version:
+                return entry[1]
+            index = cls._build(genome)
+            cls._genomes[genome] = (version, index)
+            return index
+
+    @classmethod
+    def lookup(cls, pairs):
+        """
+        批量解析基因ID
+        :param pairs: [(genome, normalized_geneid), ...]
+        :return: {(genome, normalized_geneid): db_id}，未命中的不返回
+        """
+        genomes = {genome for genome, _ in pairs}
+        if not genomes:
+            return {}
+        keys = {genome: cls._version_key(genome) for genome in genomes}
+        versions = cache.get_many(list(keys.values()))
+        indexes = {genome: cls._get(genome, versions.get(key, 0)) for genome, key in keys.items()}
+
+        found = {}
+        for genome, geneid in pairs:
+            db_id = indexes[genome].get(geneid)
+            if db_id is not None:
+                found[(genome, geneid)] = db_id
+        return found
+
+    @classmethod
+    def invalidate(cls, genome):
+        """基因组(重新)导入后调用：更新共享版本号，并丢弃本进程中的旧索引"""
+        cache.set(cls._version_key(genome), time.time_ns(), None)
+        with cls._lock:
+            cls._genomes.pop(genome, None)
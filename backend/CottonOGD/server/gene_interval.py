@@ -0,0 +1,49 @@
+"""
+基因组区间查询
+
+重叠条件 start <= region_end AND end >= region_start 只能用到单列索引，MySQL 会扫描半张表。
+这里借助每条染色体上最长特征的长度 max_span 把条件改写为
+    region_start - max_span <= start <= region_end
+配合 (genome, seqid, type, start) 复合索引即可做有界范围扫描，再用 end 过滤精确结果。
+max_span 按基因组缓存，基因组重新导入时由 refresh_gene_index 一并失效。
+"""
+import logging
+from django.core.cache import cache
+from django.db.models import F, Max
+from CottonOGD.models import gene_info
+
+logger = logging.getLogger(__name__)
+
+SPAN_KEY = 'gene_span:{genome}:{type}'
+
+
+def max_spans(genome, feature_type='gene'):
+    """{seqid: 该染色体上最长特征的长度}"""
+    key = SPAN_KEY.format(genome=genome, type=feature_type)
+    spans = cache.get(key)
+    if spans is None:
+        rows = (gene_info.objects.filter(genome_id=genome, type=feature_type)
+                .values('seqid').annotate(span=Max(F('end') - F('start'))))
+        spans = {row['seqid']: row['span'] or 0 for row in rows}
+        cache.set(key, spans, None)
+        logger.info(f"gene spans cached for {genome}/{feature_type}: {len(spans)} seqids")
+    return spans
+
+
+def invalidate_spans(genome, feature_type='gene'):
+    cache.delete(SPAN_KEY.format(genome=genome, type=feature_type))
+
+
+def features_in_region(genome, seqid, start, end, fields, feature_type='gene'):
+    """返回与 [start, end] 重叠的特征（按 start 排序）"""
+    spans = max_spans(genome, feature_type)
+    if seqid not in spans:
+        return []
+    return list(gene_info.objects.filter(
+        genome_id=genome,
+        seqid=seqid,
+        type=feature_type,
+        start__gte=start - spans[seqid],
+        start__lte=end,
+        end__gte=start,
+    ).order_by('start').values(*fields))
@@ -0,0 +1,234 @@
+"""
+GO 有向无环图（is_a / part_of）
+
+go_term / go_relationship 在每个进程中只加载一次，并预先计算传递闭包，全部保存为整数数组：
+    parents     CSR，直接父节点
+    ancestors   CSR，所有祖先（不含自身）；term 下标 i 的祖先为 indices[indptr[i]:indptr[i + 1]]，查找为 O(1) 切片
+    height      到最远后代叶节点的层数，祖先的 height 严格大于后代，用于自底向上的 elim 检验
+闭包按版本缓存到 settings.GO_OBO_FILE 同目录下的 go_dag.<版本>.npz / .json，版本由两部分组成：
+    OBO 头部的 data-version，OBO 文件替换后（mtime 变化）重新读取；
+    go_relationship 的行数与最大 id，每 settings.GO_DAG_DB_CHECK_INTERVAL 秒重新查询一次。
+闭包由数据库中的 go_term / go_relationship 计算，OBO 已替换而导入尚未完成时构建的闭包
+保存在旧的数据库指纹下，导入完成后指纹变化即重新构建。
+"""
+import json
+import os
+import re
+import threading
+import time
+import logging
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+RELATIONSHIP_TYPES = ('is_a', 'part_of')
+
+
+def read_obo_version(path):
+    """OBO 头部的 data-version（如 releases/2024-01-17），没有时返回 None"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('data-version:'):
+                return line.split(':', 1)[1].strip()
+            if line.startswith('[Term]'):
+                break
+    return None
+
+
+class GoDag:
+    def __init__(self, terms, names, namespaces, parent_indptr, parent_indices,
+                 ancestor_indptr, ancestor_indices, height, version):
+        self.terms = list(terms)
+        self.names = list(names)
+        self.namespaces = list(namespaces)
+        self.parent_indptr = np.asarray(parent_indptr, dtype=np.int64)
+        self.parent_indices = np.asarray(parent_indices, dtype=np.int32)
+        self.ancestor_indptr = np.asarray(ancestor_indptr, dtype=np.int64)
+        self.ancestor_indices = np.asarray(ancestor_indices, dtype=np.int32)
+        self.height = np.asarray(height, dtype=np.int32)
+        self.version = version
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+
+    @classmethod
+    def from_edges(cls, terms, names, namespaces, subjects, objects, version):
+        """subjects / objects 为 term 下标数组（subject is_a/part_of object）"""
+        n = len(terms)
+        # child × parent 的 0/1 矩阵，闭包 C 反复做 C + C·P 直到不再增长（迭代次数为 DAG 深度）
+        parents = sparse.csr_matrix(
+            (np.ones(len(subjects), dtype=np.int8), (subjects, objects)), shape=(n, n))
+        parents.data[:] = 1
+        parents.sort_indices()
+        closure = parents.copy()
+        while True:
+            grown = closure + closure @ parents
+            grown.data[:] = 1
+            if grown.nnz == closure.nnz:
+                break
+            closure = grown
+        closure.sort_indices()
+
+        height = np.zeros(n, dtype=np.int32)
+        for _ in range(n):
+            updated = height.copy()
+            np.maximum.at(updated, objects, height[subjects] + 1)
+            if np.array_equal(updated, height):
+                break
+            height = updated
+        return cls(terms, names, namespaces, parents.indptr, parents.indices,
+                   closure.indptr, closure.indices, height, version)
+
+    def __len__(self):
+        return len(self.terms)
+
+    @property
+    def nbytes(self):
+        return (self.parent_indices.nbytes + self.ancestor_indices.nbytes
+                + self.parent_indptr.nbytes + self.ancestor_indptr.nbytes + self.height.nbytes)
+
+    def parents(self, i):
+        return self.parent_indices[self.parent_indptr[i]:self.parent_indptr[i + 1]]
+
+    def ancestors(self, i):
+        return self.ancestor_indices[self.ancestor_indptr[i]:self.ancestor_indptr[i + 1]]
+
+    def ancestor_counts(self):
+        return np.diff(self.ancestor_indptr)
+
+    def term_ancestors(self, go_id):
+        """GO ID 的所有祖先 GO ID，不在 DAG 中时返回空列表"""
+        i = self.term_index.get(go_id)
+        if i is None:
+            return []
+        return [self.terms[a] for a in self.ancestors(i)]
+
+
+class GoDagStore:
+    # (version, GoDag)
+    _entry = None
+    # (OBO mtime, OBO 版本)，避免每次请求都读文件头
+    _obo_version = None
+    # (查询时间, go_relationship 指纹)
+    _db_fingerprint = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def paths(cls, version):
+        safe = re.sub(r'[^0-9A-Za-z._-]+', '_', version)
+        base = os.path.join(os.path.dirname(settings.GO_OBO_FILE), f'go_dag.{safe}')
+        return f'{base}.npz', f'{base}.json'
+
+    @classmethod
+    def db_fingerprint(cls):
+        """go_relationship 的行数与最大 id，导入脚本写入后随之变化"""
+        now = time.monotonic()
+        cached = cls._db_fingerprint
+        if cached and now - cached[0] < getattr(settings, 'GO_DAG_DB_CHECK_INTERVAL', 60):
+            return cached[1]
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*), MAX(id) FROM go_relationship")
+            count, max_id = cursor.fetchone()
+        fingerprint = f'db-{count}-{max_id or 0}'
+        cls._db_fingerprint = (now, fingerprint)
+        return fingerprint
+
+    @classmethod
+    def obo_version(cls):
+        """OBO 文件的 data-version，文件不存在时返回 None"""
+        try:
+            mtime = os.stat(settings.GO_OBO_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = cls._obo_version
+        if cached and cached[0] == mtime:
+            return cached[1]
+        version = read_obo_version(settings.GO_OBO_FILE) or f'mtime-{mtime}'
+        cls._obo_version = (mtime, version)
+        return version
+
+    @classmethod
+    def version(cls):
+        obo_version = cls.obo_version()
+        fingerprint = cls.db_fingerprint()
+        return f'{obo_version}.{fingerprint}' if obo_version else fingerprint
+
+    @classmethod
+    def build(cls, version):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, name, namespace FROM go_term")
+            term_rows = cursor.fetchall()
+            cursor.execute(
+                "SELECT subject_id, object_id FROM go_relationship WHERE relationship_type IN %s",
+                [RELATIONSHIP_TYPES])
+            edge_rows = cursor.fetchall()
+
+        term_rows.sort(key=lambda row: row[0])
+        terms = [row[0] for row in term_rows]
+        term_index = {term: i for i, term in enumerate(terms)}
+        subjects, objects = [], []
+        for subject, obj in edge_rows:
+            # 兼容旧导入把 "GO:xxx ! name" 整行写入的情况
+            subject, obj = str(subject).split()[0], str(obj).split()[0]
+            if subject in term_index and obj in term_index and subject != obj:
+                subjects.append(term_index[subject])
+                objects.append(term_index[obj])
+        return GoDag.from_edges(
+            terms, [row[1] for row in term_rows], [row[2] for row in term_rows],
+            np.asarray(subjects, dtype=np.int64), np.asarray(objects, dtype=np.int64), version)
+
+    @classmethod
+    def save(cls, dag):
+        npz_path, json_path = cls.paths(dag.version)
+        os.makedirs(os.path.dirname(npz_path), exist_ok=True)
+        with open(f'{json_path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': dag.version,
+                'terms': dag.terms,
+                'names': dag.names,
+                'namespaces': dag.namespaces,
+            }, f, ensure_ascii=False)
+        os.replace(f'{json_path}.tmp', json_path)
+        with open(f'{npz_path}.tmp', 'wb') as f:
+            np.savez(f, parent_indptr=dag.parent_indptr, parent_indices=dag.parent_indices,
+                     ancestor_indptr=dag.ancestor_indptr, ancestor_indices=dag.ancestor_indices,
+                     height=dag.height)
+        os.replace(f'{npz_path}.tmp', npz_path)
+
+    @classmethod
+    def _load(cls, version):
+        npz_path, json_path = cls.paths(version)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with np.load(npz_path) as arrays:
+            return GoDag(
+                meta['terms'], meta['names'], meta['namespaces'],
+                arrays['parent_indptr'], arrays['parent_indices'],
+                arrays['ancestor_indptr'], arrays['ancestor_indices'],
+                arrays['height'], meta['version'],
+            )
+
+    @classmethod
+    def get(cls):
+        version = cls.version()
+        entry = cls._entry
+        if entry and entry[0] == version:
+            return entry[1]
+        with cls._lock:
+            entry = cls._entry
+            if entry and entry[0] == version:
+                return entry[1]
+            if os.path.exists(cls.paths(version)[0]):
+                dag = cls._load(version)
+            else:
+                logger.warning(f"GoDagStore: closure for {version} not cached, building from database")
+                dag = cls.build(version)
+                try:
+                    cls.save(dag)
+                except OSError as e:
+                    logger.error(f"GoDagStore: failed to cache closure: {e}")
+            cls._entry = (version, dag)
+            logger.info(f"GoDagStore loaded {version}: {len(dag)} terms, "
+                        f"{len(dag.ancestor_indices)} ancestor links")
+            return dag
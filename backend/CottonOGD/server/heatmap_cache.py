@@ -0,0 +1,70 @@
+"""
+热图缓存（按内容寻址）
+
+键由两部分组成：表达矩阵（连续 float64 缓冲区 + 形状 + 行列标签）的 BLAKE2b 摘要，
+以及规范化后的绘图配置（解析后的颜色、排序键的 JSON）。值为 PNG 字节而不是 base64 文本。
+图片越大缓存时间越短，超过 settings.HEATMAP_CACHE_MAX_BYTES 的不缓存，避免大图挤占 Redis。
+
+extract_expression 得到的矩阵也按同一摘要缓存（matrix_id），regenerate_heatmap 只需传
+matrix_id 与新配置即可重绘，客户端不必再上传完整的 genes 数据。
+"""
+import hashlib
+import json
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+MATRIX_KEY = 'expr_matrix:{digest}'
+IMAGE_KEY = 'heatmap_png:{matrix}:{config}'
+# 不超过该大小的图片使用完整 TTL，更大的按比例缩短
+FULL_TTL_BYTES = 256 * 1024
+
+
+def matrix_digest(numeric_data, row_labels, column_labels):
+    """矩阵内容摘要：直接对连续 float64 缓冲区做哈希，不做字符串化"""
+    values = np.ascontiguousarray(numeric_data, dtype=np.float64)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(values.shape).encode())
+    h.update(values.data)
+    for labels in (row_labels, column_labels):
+        h.update('\x1f'.join(map(str, labels)).encode('utf-8'))
+        h.update(b'\x1e')
+    return h.hexdigest()
+
+
+def config_digest(config):
+    canonical = json.dumps(config, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _ttl_for(size):
+    ttl = getattr(settings, 'HEATMAP_CACHE_TTL', 3600)
+    if size <= FULL_TTL_BYTES:
+        return ttl
+    return max(60, int(ttl * FULL_TTL_BYTES / size))
+
+
+def get_image(matrix_id, config):
+    return cache.get(IMAGE_KEY.format(matrix=matrix_id, config=config_digest(config)))
+
+
+def set_image(matrix_id, config, png):
+    if len(png) > getattr(settings, 'HEATMAP_CACHE_MAX_BYTES', 2 * 1024 * 1024):
+        return
+    cache.set(IMAGE_KEY.format(matrix=matrix_id, config=config_digest(config)), png, _ttl_for(len(png)))
+
+
+def put_matrix(numeric_data, row_labels, column_labels):
+    """缓存表达矩阵并返回 matrix_id"""
+    digest = matrix_digest(numeric_data, row_labels, column_labels)
+    cache.set(MATRIX_KEY.format(digest=digest), {
+        'values': np.asarray(numeric_data, dtype=np.float64),
+        'rows': list(row_labels),
+        'columns': list(column_labels),
+    }, getattr(settings, 'EXPRESSION_MATRIX_TTL', 3600))
+    return digest
+
+
+def get_matrix(matrix_id):
+    """返回 {'values', 'rows', 'columns'}，过期或不存在时返回 None"""
+    return cache.get(MATRIX_KEY.format(digest=matrix_id))
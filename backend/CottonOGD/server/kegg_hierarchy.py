@@ -0,0 +1,131 @@
+"""
+KEGG 层级（分类 / 通路 / KO / EC）
+
+category、metabolic_pathway、ko_term、pathway_enzyme、ec_number 只在 updata_KEGG_KO.py 导入时变化，
+每个进程只加载一次，注释 / 富集接口在内存中关联，不再逐请求 JOIN：
+    pathways_by_ko   通路 ko 编号（gene_kegg.kegg_id / metabolic_pathway.ko_id）-> 通路列表
+    categories       category_id -> (名称, 父级 category_id)
+    ko_terms         KO -> (名称, EC 编号, 全称)
+    pathway_kos      pathway_id -> 通路中的 KO 元组
+导入脚本在 settings.KEGG_VERSION_FILE 写入版本戳，文件 mtime 变化时重新读取版本，版本不同则重新加载；
+版本戳不存在时用各表行数作为版本（每个进程只统计一次）。
+"""
+import os
+import threading
+import logging
+from collections import defaultdict, namedtuple
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+Pathway = namedtuple('Pathway', ['pathway_id', 'name', 'full_name', 'ko_id', 'category_id'])
+KOTerm = namedtuple('KOTerm', ['ko_id', 'name', 'ec_number', 'full_name'])
+
+
+class KeggHierarchy:
+    def __init__(self, categories, pathways, ko_terms, pathway_enzymes, ec_numbers, version):
+        self.version = version
+        # category_id -> (name, parent_id)
+        self.categories = {category_id: (name, parent_id) for category_id, name, parent_id in categories}
+        self.pathways = {row[0]: Pathway(*row) for row in pathways}
+        self.pathways_by_ko = defaultdict(list)
+        for pathway in self.pathways.values():
+            self.pathways_by_ko[pathway.ko_id].append(pathway)
+        self.pathways_by_ko = dict(self.pathways_by_ko)
+        self.ko_terms = {row[0]: KOTerm(*row) for row in ko_terms}
+        pathway_kos = defaultdict(list)
+        for pathway_id, ko_id in pathway_enzymes:
+            pathway_kos[pathway_id].append(ko_id)
+        self.pathway_kos = {pathway_id: tuple(kos) for pathway_id, kos in pathway_kos.items()}
+        self.ec_numbers = dict(ec_numbers)
+
+    def __len__(self):
+        return len(self.pathways)
+
+    def pathways_for(self, kegg_id):
+        """gene_kegg.kegg_id 对应的通路（与 LEFT JOIN metabolic_pathway ON ko_id 相同，可能为空）"""
+        return self.pathways_by_ko.get(kegg_id, [])
+
+    def pathway(self, kegg_id):
+        """第一条对应通路，没有时返回 None"""
+        pathways = self.pathways_by_ko.get(kegg_id)
+        return pathways[0] if pathways else None
+
+    def category_name(self, category_id):
+        category = self.categories.get(category_id)
+        return category[0] if category else None
+
+    def category_path(self, category_id):
+        """从顶层到 category_id 的 (category_id, 名称) 列表"""
+        path = []
+        while category_id in self.categories and len(path) < len(self.categories):
+            name, parent_id = self.categories[category_id]
+            path.append((category_id, name))
+            category_id = parent_id
+        return path[::-1]
+
+    def ko_term(self, ko_id):
+        return self.ko_terms.get(ko_id)
+
+
+class KeggHierarchyStore:
+    # (version, KeggHierarchy)
+    _entry = None
+    # (版本戳 mtime, 版本)，避免每次请求都读文件
+    _stamp = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def version(cls):
+        path = getattr(settings, 'KEGG_VERSION_FILE', None)
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except FileNotFoundError:
+            mtime = None
+        cached = cls._stamp
+        if cached and cached[0] == mtime:
+            return cached[1]
+        if mtime is not None:
+            with open(path, 'r', encoding='utf-8') as f:
+                version = f.read().strip() or f'mtime-{mtime}'
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT (SELECT COUNT(*) FROM category), (SELECT COUNT(*) FROM metabolic_pathway),
+                           (SELECT COUNT(*) FROM ko_term), (SELECT COUNT(*) FROM pathway_enzyme)
+                """)
+                version = 'db-' + '-'.join(str(count) for count in cursor.fetchone())
+        cls._stamp = (mtime, version)
+        return version
+
+    @classmethod
+    def build(cls, version):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT category_id, name, parent_id FROM category")
+            categories = cursor.fetchall()
+            cursor.execute("SELECT pathway_id, name, full_name, ko_id, category_id FROM metabolic_pathway")
+            pathways = cursor.fetchall()
+            cursor.execute("SELECT ko_id, name, ec_number, full_name FROM ko_term")
+            ko_terms = cursor.fetchall()
+            cursor.execute("SELECT pathway_id, enzyme_id FROM pathway_enzyme ORDER BY id")
+            pathway_enzymes = cursor.fetchall()
+            cursor.execute("SELECT ec_number, name FROM ec_number")
+            ec_numbers = cursor.fetchall()
+        return KeggHierarchy(categories, pathways, ko_terms, pathway_enzymes, ec_numbers, version)
+
+    @classmethod
+    def get(cls):
+        version = cls.version()
+        entry = cls._entry
+        if entry and entry[0] == version:
+            return entry[1]
+        with cls._lock:
+            entry = cls._entry
+            if entry and entry[0] == version:
+                return entry[1]
+            hierarchy = cls.build(version)
+            cls._entry = (version, hierarchy)
+            logger.info(f"KeggHierarchyStore loaded {version}: {len(hierarchy.categories)} categories, "
+                        f"{len(hierarchy)} pathways, {len(hierarchy.ko_terms)} KO terms")
+            return hierarchy
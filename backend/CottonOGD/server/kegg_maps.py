@@ -0,0 +1,215 @@
+"""
+KEGG 通路图着色
+
+通路图与坐标存放在 settings.KEGG_MAP_DIR（fetch_kegg_maps 命令下载）：
+    ko00010.png   通路底图
+    ko00010.xml   KGML，ortholog 条目的 rectangle 图形即 KO 方框（x, y 为中心）
+每张图在进程内只解析一次：
+    boxes         (方框数, 4) 的 x1, y1, x2, y2
+    labels        方框标签图（像素值为方框序号 + 1，0 为背景），即像素 -> 方框的空间索引，box_at 为 O(1)
+    box_kos       CSR，方框 -> KO 编号（K00844 -> 844），方框命中 = 方框内任一 KO 命中，用 np.isin + reduceat 一次算出
+着色与 EFP 相同：按方框算出颜色查找表，再对有标签像素一次性写入；底图乘以高亮色，方框内文字与边框保持可见。
+缩略图不缩放着色后的整图：按宽度缓存缩小的底图（LANCZOS）与标签图（最近邻），直接在缩略图分辨率上着色。
+多张图共用同一组命中 KO，各自着色。按 (png mtime, xml mtime) 失效，按总字节数 LRU 淘汰。
+"""
+import os
+import re
+import threading
+import logging
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KO_PATTERN = re.compile(r'^K\d{5}$')
+HIGHLIGHT_COLOR = (255, 99, 71)
+# 每张图缓存的缩略图宽度数
+MAX_SCALED_RASTERS = 4
+
+
+def ko_numbers(kos):
+    """KO 列表 -> 整数编号数组（K00844 -> 844），忽略非 KO 编号"""
+    return np.fromiter((int(ko[1:]) for ko in kos if KO_PATTERN.match(ko)), dtype=np.int32)
+
+
+def normalize_map_id(pathway_id):
+    """ko00010 / map00010 / 00010 -> ko00010，无法识别时返回 None"""
+    match = re.fullmatch(r'(?:ko|map|path:ko|path:map)?(\d{5})', str(pathway_id).strip())
+    return f'ko{match.group(1)}' if match else None
+
+
+def parse_kgml(path):
+    """返回 (title, [(x1, y1, x2, y2, (KO, ...))])，只保留 ortholog 的矩形方框"""
+    root = ET.parse(path).getroot()
+    boxes = []
+    for entry in root.iter('entry'):
+        if entry.get('type') != 'ortholog':
+            continue
+        kos = tuple(dict.fromkeys(
+            name.split(':', 1)[1] for name in entry.get('name', '').split() if name.startswith('ko:')))
+        if not kos:
+            continue
+        for graphics in entry.iter('graphics'):
+            if graphics.get('type') != 'rectangle':
+                continue
+            try:
+                x, y = int(graphics.get('x')), int(graphics.get('y'))
+                width, height = int(graphics.get('width')), int(graphics.get('height'))
+            except (TypeError, ValueError):
+                continue
+            x1, y1 = x - width // 2, y - height // 2
+            boxes.append((x1, y1, x1 + width, y1 + height, kos))
+    return root.get('title', ''), boxes
+
+
+class PathwayMap:
+    def __init__(self, map_id, title, base_image, boxes):
+        self.map_id = map_id
+        self.title = title
+        self.base = np.asarray(base_image.convert('RGB'), dtype=np.uint8)
+        self.height, self.width = self.base.shape[:2]
+        self.boxes = np.zeros((len(boxes), 4), dtype=np.int32)
+        labels = np.zeros((self.height, self.width), dtype=np.int32)
+        kos, ko_indptr = [], [0]
+        # box_kos 中的 KO 均来自 "ko:Kxxxxx"，但 KGML 偶有非 KO 名称，先过滤
+        boxes = [(x1, y1, x2, y2, tuple(ko for ko in box_kos if KO_PATTERN.match(ko)))
+                 for x1, y1, x2, y2, box_kos in boxes]
+        boxes = [box for box in boxes if box[4]]
+        for i, (x1, y1, x2, y2, box_kos) in enumerate(boxes):
+            x1, x2 = max(0, x1), min(self.width, x2)
+            y1, y2 = max(0, y1), min(self.height, y2)
+            self.boxes[i] = (x1, y1, x2, y2)
+            # 后出现的方框覆盖先出现的方框
+            labels[y1:y2, x1:x2] = i + 1
+            kos.extend(box_kos)
+            ko_indptr.append(len(kos))
+        self.labels = labels
+        self.box_ko_values = ko_numbers(kos)
+        self.box_ko_indptr = np.asarray(ko_indptr, dtype=np.int64)
+        self.kos = frozenset(kos)
+        # 只有方框内的像素需要着色；width -> (底图, 方框像素平铺下标, 像素所属方框序号 + 1)
+        box_index = np.flatnonzero(labels)
+        self._rasters = {self.width: (self.base, box_index, labels.ravel()[box_index])}
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @property
+    def nbytes(self):
+        return (self.labels.nbytes + self.boxes.nbytes + self.box_ko_indptr.nbytes
+                + sum(array.nbytes for raster in self._rasters.values() for array in raster))
+
+    def box_kos(self, i):
+        return tuple(f'K{ko:05d}' for ko in self.box_ko_values[self.box_ko_indptr[i]:self.box_ko_indptr[i + 1]])
+
+    def box_at(self, x, y):
+        """(x, y) 处的方框序号，不在方框内时返回 None"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            label = self.labels[y, x]
+            return int(label) - 1 if label else None
+        return None
+
+    def hit_mask(self, hit_kos):
+        """hit_kos 为 ko_numbers 返回的整数编号数组，返回每个方框是否命中的 bool 数组"""
+        if not len(self.boxes):
+            return np.zeros(0, dtype=bool)
+        # 每个方框至少有一个 KO，reduceat 的分段均非空
+        hits = np.isin(self.box_ko_values, hit_kos)
+        return np.logical_or.reduceat(hits, self.box_ko_indptr[:-1])
+
+    def scaled_size(self, width=None):
+        """缩放到 width（不超过原图宽度）后的 (宽, 高)"""
+        width = self.width if width is None else max(1, min(int(width), self.width))
+        return width, max(1, round(self.height * width / self.width))
+
+    def raster(self, width=None):
+        width, height = self.scaled_size(width)
+        raster = self._rasters.get(width)
+        if raster is None:
+            base = np.asarray(Image.fromarray(self.base, 'RGB').resize((width, height), Image.LANCZOS), dtype=np.uint8)
+            labels = np.asarray(Image.fromarray(self.labels, 'I').resize((width, height), Image.NEAREST), dtype=np.int32)
+            box_index = np.flatnonzero(labels)
+            raster = (base, box_index, labels.ravel()[box_index])
+            # 并发时可能重复计算一次，结果相同
+            if len(self._rasters) > MAX_SCALED_RASTERS:
+                self._rasters.pop(next(w for w in self._rasters if w != self.width), None)
+            self._rasters[width] = raster
+        return raster
+
+    def render(self, mask, color=HIGHLIGHT_COLOR, width=None):
+        """命中方框的像素乘以高亮色（白底变为高亮色，黑色文字/边框不变），返回 width 宽的 RGB 图像"""
+        base, box_index, box_region = self.raster(width)
+        lut = np.full((len(self.boxes) + 1, 3), 255, dtype=np.uint16)
+        lut[1:][mask] = color
+        image = base.copy()
+        pixels = image.reshape(-1, 3)
+        drawn = mask[box_region - 1]
+        index = box_index[drawn]
+        pixels[index] = (pixels[index] * lut[box_region[drawn]] // 255).astype(np.uint8)
+        return Image.fromarray(image, 'RGB')
+
+
+class KeggMapStore:
+    # map_id -> (version, PathwayMap)，按最近使用排序
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def paths(cls, map_id):
+        base = os.path.join(settings.KEGG_MAP_DIR, map_id)
+        return f'{base}.png', f'{base}.xml'
+
+    @classmethod
+    def version(cls, map_id):
+        """(png mtime, xml mtime)，任一文件不存在时返回 None"""
+        try:
+            return tuple(os.stat(path).st_mtime_ns for path in cls.paths(map_id))
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def available(cls):
+        """本地已有底图与 KGML 的通路"""
+        try:
+            names = set(os.listdir(settings.KEGG_MAP_DIR))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-4] for name in names
+                      if name.endswith('.png') and f'{name[:-4]}.xml' in names)
+
+    @classmethod
+    def get(cls, map_id):
+        """返回 PathwayMap，本地没有该通路图时返回 None"""
+        version = cls.version(map_id)
+        if version is None:
+            return None
+        with cls._lock:
+            entry = cls._entries.get(map_id)
+            if entry and entry[0] == version:
+                cls._entries.move_to_end(map_id)
+                return entry[1]
+        # 解析在锁外进行，同一通路并发首次请求时可能重复解析一次
+        png_path, xml_path = cls.paths(map_id)
+        title, boxes = parse_kgml(xml_path)
+        with Image.open(png_path) as base_image:
+            pathway_map = PathwayMap(map_id, title, base_image, boxes)
+        with cls._lock:
+            cls._entries[map_id] = (version, pathway_map)
+            cls._entries.move_to_end(map_id)
+            cls._evict()
+        logger.info(f"KeggMapStore loaded {map_id}: {len(pathway_map)} boxes on "
+                    f"{pathway_map.width}x{pathway_map.height}")
+        return pathway_map
+
+    @classmethod
+    def _evict(cls):
+        limit = getattr(settings, 'KEGG_MAP_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        total = sum(pathway_map.nbytes for _, pathway_map in cls._entries.values())
+        # 至少保留最近使用的一个
+        while total > limit and len(cls._entries) > 1:
+            evicted, (_, pathway_map) = cls._entries.popitem(last=False)
+            total -= pathway_map.nbytes
+            logger.info(f"KeggMapStore evicted {evicted}")
@@ -0,0 +1,294 @@
+"""
+绘图任务（在渲染进程池的子进程中执行）
+
+本模块只依赖 matplotlib/seaborn/numpy/pandas，不导入 Django，子进程以 spawn 方式启动时可以直接导入。
+每个任务接收矩阵/数据与配置，返回 PNG 字节（注释图表可通过 fmt='svg' 输出 SVG）；
+pyplot 的全局状态只存在于子进程中，不会被请求线程共享。
+"""
+import io
+import math
+import signal
+from textwrap import wrap
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.gridspec import GridSpec
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+def warm():
+    """进程初始化：完成字体缓存等首次绘图开销"""
+    fig, ax = plt.subplots(figsize=(1, 1))
+    sns.heatmap(np.zeros((2, 2)), ax=ax, cbar=False)
+    _to_png(fig)
+
+
+def _to_png(fig, **kwargs):
+    return _to_image(fig, 'png', **kwargs)
+
+
+def _to_image(fig, fmt='png', **kwargs):
+    """PNG 或 SVG 字节；SVG 中文字保留为 <text>，不转为路径，体积更小且可选中"""
+    with io.BytesIO() as buffer:
+        if fmt == 'svg':
+            with matplotlib.rc_context({'svg.fonttype': 'none'}):
+                fig.savefig(buffer, format='svg', bbox_inches='tight')
+        else:
+            fig.savefig(buffer, format='png', bbox_inches='tight', **kwargs)
+        plt.close(fig)
+        return buffer.getvalue()
+
+
+def heatmap(numeric_data, gene_ids_list, selected_columns, config):
+    """表达量热图，config 中的颜色已解析为十六进制"""
+    low_color = config.get('low_color', '#0000FF')
+    mid_color = config.get('mid_color', '#00FF00')
+    high_color = config.get('high_color', '#FF0000')
+    font_family = config.get('font_family', 'Arial')
+    font_size = config.get('font_size', 12)
+    use_log2 = config.get('use_log2', False)
+    show_values = config.get('show_values', False)
+    value_type = config.get('value_type', 'original')  # 'original' 或 'log2'
+    color_range = config.get('color_range', None)  # None表示使用数据的最小最大值
+
+    # 创建DataFrame
+    df = pd.DataFrame(numeric_data, index=gene_ids_list, columns=selected_columns)
+
+    # 保存原始数据用于显示
+    original_df = df.copy()
+
+    # 如果启用log2转换，进行log2(x+1)转换
+    if use_log2:
+        df = np.log2(df + 1)
+
+    # 根据value_type决定显示什么值，只有在使用log2转换且显示值时才生效
+    if use_log2 and show_values and value_type == 'log2':
+        display_df = df
+    else:
+        display_df = original_df
+
+    # 根据基因数量和组织数量动态调整图形大小
+    num_genes = len(gene_ids_list)
+    num_tissues = len(selected_columns)
+    base_width = max(12, num_tissues * 0.8)  # 每个组织至少0.8英寸
+    base_height = max(5, num_genes * 0.4)    # 每个基因至少0.4英寸
+    # 限制最大大小，避免内存问题
+    fig_width = min(base_width, 20)
+    fig_height = min(base_height, 15)
+
+    # 创建自定义颜色映射
+    cmap = LinearSegmentedColormap.from_list('custom', [low_color, mid_color, high_color], N=100)
+
+    # 设置字体
+    plt.rcParams['font.family'] = font_family
+    plt.rcParams['font.size'] = font_size
+
+    f, ax = plt.subplots(figsize=(fig_width, fig_height))
+
+    # 计算颜色范围
+    if color_range:
+        vmin, vmax = color_range
+    else:
+        vmin = np.nanmin(df.values)
+        vmax = np.nanmax(df.values)
+
+    # 如果需要显示数值，使用display_df作为annot的数据源
+    annot_data = display_df if show_values else False
+
+    ax = sns.heatmap(df,
+                    cmap=cmap,
+                    vmin=vmin,
+                    vmax=vmax,
+                    xticklabels=True,
+                    yticklabels=True,
+                    cbar_kws={'label': 'Log2(FPKM+1)' if use_log2 else 'FPKM'},
+                    annot=annot_data,
+                    fmt='.2f',  # 数值格式，保留2位小数
+                    linewidths=.5,  # 网格线宽度
+                    ax=ax)
+
+    # 设置x轴标签旋转和字体大小
+    ax.set_xticklabels(ax.get_xticklabels(), rotation=60, ha='right', fontsize=font_size)
+    ax.set_yticklabels(ax.get_yticklabels(), fontsize=font_size)
+
+    title = 'Gene Expression Heatmap'
+    if use_log2:
+        title += ' (Log2 Transformed)'
+    ax.set_title(title, fontsize=font_size + 2)
+
+    f.tight_layout()
+    return _to_png(f, dpi=100)
+
+
+def go_annotation_chart(categories, data, fmt='png'):
+    """GO 注释 BP/MF/CC 三栏柱状图"""
+    fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(15, 6), sharey=True)
+    axes = [ax1, ax2, ax3]
+
+    max_value = max(max(data['BP']), max(data['MF']), max(data['CC'])) * 1.1
+    for ax in axes:
+        ax.set_ylim(0, max_value)
+        ax.grid(False)
+
+    colors = ['#1f77b4', '#ff7f0e', '#2ca02c']
+
+    for i, (ax, (group, values), color) in enumerate(zip(axes, data.items(), colors)):
+        bars = ax.bar(categories, values, color=color)
+        ax.set_title(group, fontsize=14, pad=15)
+        ax.set_xlabel('', fontsize=12)
+
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+
+        if i > 0:
+            ax.spines['left'].set_visible(False)
+            ax.tick_params(left=False)
+
+        for bar in bars:
+            height = bar.get_height()
+            if height > 0:
+                ax.text(bar.get_x() + bar.get_width()/2., height,
+                        f'{int(height)}',
+                        ha='center', va='bottom', fontsize=10)
+
+    ax1.set_ylabel('Count', fontsize=12)
+    fig.tight_layout()
+    return _to_image(fig, fmt)
+
+
+def kegg_annotation_chart(all_labels, all_values, all_types, fmt='png'):
+    """KEGG 注释通路计数柱状图"""
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    types = list(set(all_types))
+    colors = plt.cm.Set3(np.linspace(0, 1, len(types)))
+    type_color_map = dict(zip(types, colors))
+
+    x_positions = range(len(all_labels))
+    bars = ax.bar(x_positions, all_values,
+                  color=[type_color_map[t] for t in all_types])
+
+    ax.set_xlabel('KEGG Description', fontsize=12)
+    ax.set_ylabel('Count', fontsize=12)
+    ax.set_title('KEGG Annotation Distribution', fontsize=14, pad=20)
+
+    short_labels = [label[:20] + '...' if len(label) > 20 else label
+                    for label in all_labels]
+    ax.set_xticks(x_positions)
+    ax.set_xticklabels(short_labels, rotation=45, ha='right', fontsize=8)
+
+    for bar, value in zip(bars, all_values):
+        height = bar.get_height()
+        if height > 0:
+            ax.text(bar.get_x() + bar.get_width()/2., height,
+                    f'{int(height)}',
+                    ha='center', va='bottom', fontsize=8)
+
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    legend_elements = [plt.Rectangle((0,0),1,1, facecolor=type_color_map[t],
+                                     label=t) for t in types]
+    ax.legend(handles=legend_elements, loc='upper right', fontsize=8)
+
+    fig.tight_layout()
+    return _to_image(fig, fmt, dpi=100)
+
+
+def kegg_enrichment_chart(kegg_results, max_terms=30, figsize=(15, 7)):
+    """KEGG 富集结果的柱状图 + 气泡图"""
+    df = pd.DataFrame(kegg_results)
+
+    if 'gene_count' in df.columns:
+        df['Count'] = df['gene_count']
+    else:
+        df['Count'] = df['gene_ratio'].apply(lambda x: int(x.split('/')[0]) if isinstance(x, str) else 0)
+
+    if 'GeneRatio' not in df.columns:
+        df['GeneRatio'] = df['gene_ratio'].apply(lambda x: eval(x.replace('/', '/')) if isinstance(x, str) else 0)
+
+    df = df.sort_values('p_value').head(max_terms)
+
+    fig = plt.figure(figsize=figsize)
+    gs = GridSpec(1, 2, figure=fig, width_ratios=[1, 1.5])
+
+    ax1 = fig.add_subplot(gs[0])
+    colors = plt.cm.Blues_r(np.linspace(0.3, 0.9, len(df)))
+    ax1.barh(
+        y=range(len(df)),
+        width=df['Count'],
+        color=colors
+    )
+
+    ax1.set_title('KEGG Pathway - Count', pad=20, fontsize=14, fontweight='bold')
+    ax1.set_xlabel('Gene Count', fontsize=12)
+    ax1.set_ylabel('')
+    ax1.grid(axis='x', linestyle='--', alpha=0.7)
+
+    y_labels = ['\n'.join(wrap(label, 40)) for label in df['description'].apply(lambda x: x.get('name', '') if isinstance(x, dict) else str(x))]
+    ax1.set_yticks(range(len(y_labels)))
+    ax1.set_yticklabels(y_labels, fontsize=9)
+
+    ax2 = fig.add_subplot(gs[1])
+
+    sizes = (df['Count'] / df['Count'].max() * 200 + 50) if df['Count'].max() > 0 else 50
+    colors = -np.log10(df['p_value'].replace(0, 1e-10))
+
+    scatter = ax2.scatter(
+        x=df['GeneRatio'],
+        y=range(len(df)),
+        s=sizes,
+        c=colors,
+        cmap='Blues'
+    )
+
+    ax2.set_title('KEGG Pathway - Dotplot', pad=20, fontsize=14, fontweight='bold')
+    ax2.set_xlabel('Gene Ratio', fontsize=12)
+    ax2.set_ylabel('')
+    ax2.grid(axis='x', linestyle='--', alpha=0.7)
+
+    ax2.set_yticks(range(len(y_labels)))
+    ax2.set_yticklabels(y_labels, fontsize=9)
+
+    cbar = fig.colorbar(scatter, ax=ax2, pad=0.01)
+    cbar.set_label('-log10(p-value)', fontsize=10)
+
+    fig.tight_layout()
+    fig.subplots_adjust(wspace=0.3)
+    return _to_png(fig, dpi=300)
+
+
+JOBS = {
+    'heatmap': heatmap,
+    'go_annotation_chart': go_annotation_chart,
+    'kegg_annotation_chart': kegg_annotation_chart,
+    'kegg_enrichment_chart': kegg_enrichment_chart,
+}
+
+
+def _on_alarm(signum, frame):
+    raise RenderTimeout()
+
+
+def run(job, timeout, args, kwargs):
+    """子进程入口：按名称执行任务，超时（仅支持 SIGALRM 的平台）时中断并释放图形"""
+    use_alarm = timeout and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.alarm(max(1, math.ceil(timeout)))
+    try:
+        return JOBS[job](*args, **kwargs)
+    except RenderTimeout:
+        plt.close('all')
+        raise RenderTimeout(f'render job {job} exceeded {timeout}s')
+    finally:
+        if use_alarm:
+            signal.alarm(0)
@@ -0,0 +1,108 @@
+"""
+绘图进程池
+
+matplotlib 的 pyplot 状态是全局的、非线程安全，大图在 Daphne 的请求线程中绘制会阻塞数秒。
+这里用一个有界的 ProcessPoolExecutor 执行 render_jobs 中的绘图任务：子进程以 spawn 方式启动，
+初始化时预先导入 matplotlib/seaborn 并完成一次绘图；请求线程提交 (任务名, 数据, 配置)，
+等待 PNG 字节返回。进程数与单任务超时分别由 settings.RENDER_POOL_SIZE / RENDER_JOB_TIMEOUT 控制，
+当前排队数量可通过 RenderService.stats() 查看。
+"""
+import base64
+import multiprocessing
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from CottonOGD.server import render_jobs
+
+logger = logging.getLogger(__name__)
+
+
+class RenderError(Exception):
+    pass
+
+
+class RenderService:
+    _executor = None
+    _lock = threading.Lock()
+    _pending = 0
+    _submitted = 0
+    _failed = 0
+    _timeouts = 0
+
+    @classmethod
+    def pool_size(cls):
+        return getattr(settings, 'RENDER_POOL_SIZE', 2)
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=cls.pool_size(),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=render_jobs.warm,
+                )
+                logger.info(f"RenderService started with {cls.pool_size()} workers")
+            return cls._executor
+
+    @classmethod
+    def _reset(cls, executor):
+        with cls._lock:
+            if cls._executor is executor:
+                cls._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def _count(cls, name, delta=1):
+        with cls._lock:
+            setattr(cls, name, getattr(cls, name) + delta)
+
+    @classmethod
+    def stats(cls):
+        """进程数与排队/执行中的任务数"""
+        return {
+            'workers': cls.pool_size(),
+            'queue_depth': cls._pending,
+            'submitted': cls._submitted,
+            'failed': cls._failed,
+            'timeouts': cls._timeouts,
+        }
+
+    @classmethod
+    def render(cls, job, *args, timeout=None, **kwargs):
+        """在进程池中执行绘图任务并返回 PNG 字节，超时或失败时抛出 RenderError"""
+        timeout = timeout or getattr(settings, 'RENDER_JOB_TIMEOUT', 60)
+        cls._count('_submitted')
+        cls._count('_pending')
+        if cls._pending > cls.pool_size():
+            logger.warning(f"RenderService queue depth {cls._pending} ({job})")
+        try:
+            for attempt in range(2):
+                executor = cls._get_executor()
+                future = executor.submit(render_jobs.run, job, timeout, args, kwargs)
+                try:
+                    # 排队时间也计入等待，子进程内另有 SIGALRM 限制单任务执行时间
+                    return future.result(timeout=timeout * 2)
+                except BrokenProcessPool:
+                    # 子进程异常退出（如 OOM），重建进程池后重试一次
+                    logger.error(f"RenderService pool broken while running {job}, restarting")
+                    cls._reset(executor)
+                except (FutureTimeout, render_jobs.RenderTimeout) as e:
+                    future.cancel()
+                    cls._count('_timeouts')
+                    raise RenderError(f'render job {job} timed out') from e
+            raise RenderError(f'render pool unavailable for {job}')
+        except RenderError:
+            cls._count('_failed')
+            raise
+        except Exception as e:
+            cls._count('_failed')
+            raise RenderError(f'render job {job} failed: {e}') from e
+        finally:
+            cls._count('_pending', -1)
+
+    @classmethod
+    def render_base64(cls, job, *args, **kwargs):
+        return base64.b64encode(cls.render(job, *args, **kwargs)).decode('utf-8')
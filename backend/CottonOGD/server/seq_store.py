@@ -0,0 +1,99 @@
+"""
+基因序列外置存储
+
+每个基因组按版本一个平铺字节文件 data/genome/<genome>/<genome>.<version>.seqstore，
+gene_seq 行只保存 (seq_version, seq_offset, seq_length)。worker 以 mmap 方式打开文件，
+读取时直接对映射内存切片（memoryview，不经过 MySQL TEXT 列）。
+文件由 `manage.py build_seq_store <genome>` 生成：新版本写入新文件，偏移量与版本号在同一事务中更新，
+旧文件保留到下一次重建，读取端拿到的 (版本, 偏移) 始终指向与之匹配的文件。
+seq_version 为空的行对应旧的无版本文件 <genome>.seqstore。
+"""
+import glob
+import mmap
+import os
+import re
+import threading
+import logging
+from django.conf import settings
+from django.db.models import Case, When, F, Value, TextField
+
+logger = logging.getLogger(__name__)
+
+# 只有尚未外置的行才从数据库取 TEXT，已外置的行返回 NULL，避免大字段过网
+INLINE_SEQUENCE = Case(
+    When(seq_offset__isnull=True, then=F('sequence')),
+    default=Value(None),
+    output_field=TextField(),
+)
+
+# 查询序列时需要的字段，配合 SeqStore.sequence_of 使用
+SEQ_FIELDS = ('genome_id', 'seq_offset', 'seq_length', 'seq_version')
+
+
+class SeqStore:
+    # (genome, version) -> (mtime, mmap)
+    _maps = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def path(cls, genome, version=None):
+        name = f'{genome}.seqstore' if version is None else f'{genome}.{version}.seqstore'
+        return os.path.join(settings.BASE_DIR, 'data', 'genome', genome, name)
+
+    @classmethod
+    def versions(cls, genome):
+        """磁盘上已有的版本号（不含无版本的旧文件）"""
+        pattern = re.compile(rf'^{re.escape(genome)}\.(\d+)\.seqstore$')
+        paths = glob.glob(os.path.join(glob.escape(os.path.dirname(cls.path(genome))), '*.seqstore'))
+        return sorted(int(m.group(1)) for m in (pattern.match(os.path.basename(p)) for p in paths) if m)
+
+    @classmethod
+    def _open(cls, genome, version=None):
+        path = cls.path(genome, version)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        key = (genome, version)
+        entry = cls._maps.get(key)
+        if entry and entry[0] == mtime:
+            return entry[1]
+        with cls._lock:
+            entry = cls._maps.get(key)
+            if entry and entry[0] == mtime:
+                return entry[1]
+            with open(path, 'rb') as f:
+                # 空文件无法映射
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+            # 旧映射可能仍被其他请求的 memoryview 引用，交给 GC 回收，不主动 close
+            cls._maps[key] = (mtime, mapped)
+            # 同一基因组更早的版本不会再被新查询引用
+            for stale in [k for k in cls._maps if k[0] == genome and k[1] is not None and version is not None
+                          and k[1] < version - 1]:
+                del cls._maps[stale]
+            logger.info(f"SeqStore mapped {path}")
+            return mapped
+
+    @classmethod
+    def read(cls, genome, offset, length, version=None):
+        """返回映射内存上的只读切片（memoryview），文件缺失时返回 None"""
+        mapped = cls._open(genome, version)
+        if mapped is None:
+            logger.warning(f"SeqStore file not found: {cls.path(genome, version)}")
+            return None
+        return memoryview(mapped)[offset:offset + length]
+
+    @classmethod
+    def text(cls, genome, offset, length, version=None):
+        view = cls.read(genome, offset, length, version)
+        return str(view, 'ascii') if view is not None else None
+
+    @classmethod
+    def sequence_of(cls, row):
+        """
+        解析 values(..., inline=INLINE_SEQUENCE, *SEQ_FIELDS) 得到的一行：
+        已外置的从 mmap 读取，否则使用数据库中的 TEXT
+        """
+        if row.get('seq_offset') is not None:
+            return cls.text(row['genome_id'], row['seq_offset'], row['seq_length'], row.get('seq_version'))
+        return row.get('inline')
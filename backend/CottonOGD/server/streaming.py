@@ -0,0 +1,34 @@
+"""
+流式响应在 ASGI / WSGI 下的迭代器
+
+应用运行在 Daphne（ASGI）下，StreamingHttpResponse 收到同步迭代器时会先用 sync_to_async(list)
+整体取完再发送，既不流式也会把全部内容放进内存；WSGI 下则反过来，异步迭代器会被整体取完。
+streaming_content 按请求类型返回合适的迭代器：ASGI 下把同步迭代器的每一步放到线程中执行，
+逐块交给事件循环发送。
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_DONE = object()
+
+
+async def aiter_sync(iterator):
+    """同步迭代器 -> 异步迭代器，每次 next() 在线程中执行，不阻塞事件循环"""
+    iterator = iter(iterator)
+    # next() 可能读取文件/等待子进程，不占用 thread_sensitive 的主线程
+    step = sync_to_async(lambda: next(iterator, _DONE), thread_sensitive=False)
+    while True:
+        chunk = await step()
+        if chunk is _DONE:
+            return
+        yield chunk
+
+
+def is_asgi(request):
+    # DRF 的 Request 包装了 Django 的 HttpRequest
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def streaming_content(request, iterator):
+    """ASGI 请求返回异步迭代器，WSGI 请求原样返回同步迭代器"""
+    return aiter_sync(iterator) if is_asgi(request) else iterator
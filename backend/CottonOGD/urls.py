@@ -13,6 +13,8 @@ from CottonOGD.views.expression_EFP import *
 from CottonOGD.views.DownloadGenome import download_genome_file
 from CottonOGD.views.gene_Go import go_annotation, go_enrichment
 from CottonOGD.views.gene_Kegg import kegg_annotation, kegg_enrichment
+from CottonOGD.views.annotation_chart import annotation_chart
+from CottonOGD.views.kegg_map import kegg_pathway_map, kegg_pathway_maps
 from CottonOGD.views.Meilisearch import search_genes_meilisearch, search_genes
 from CottonOGD.views.genome_api import *
 from CottonOGD.views.protein3D import *
@@ -30,8 +32,10 @@ urlpatterns = [
     path('geneid_summary/', geneid_summary, name='geneid_summary'),
     path('extract_seq/', extract_seq, name='extract_seq'),
     path('extract_seq_gff/', extract_seq_gff, name='extract_seq_gff'),
+    path('extract_seq_gff_batch/', extract_seq_gff_batch, name='extract_seq_gff_batch'),
     path('extract_expression/', extract_expression, name='extract_expression'),
     path('regenerate_heatmap/', regenerate_heatmap, name='regenerate_heatmap'),
+    path('render_service_status/', render_service_status, name='render_service_status'),
     path('extract_expression/tissues/', get_tissues, name='get_tissues'),
     path('extract_expression/genomes/', get_genomes_with_tissue, name='get_genomes_with_tissue'),
     path('search_genes/', search_genes, name='search_genes'),
@@ -39,11 +43,15 @@ urlpatterns = [
     path('primer_design/', primer_design, name='primer_design'),
     path('blast_cmd/', blast_cmd, name='blast_cmd'),
     path('expression_EFP_image/', expression_EFP_image, name='expression_EFP_image'),
+    path('expression_EFP_batch/', expression_EFP_batch, name='expression_EFP_batch'),
     path('download_genome/<str:genome_id>/<str:file_type>', download_genome_file, name='download_genome_file'),
     path('go_annotation/', go_annotation, name='go_annotation'),
     path('go_enrichment/', go_enrichment, name='go_enrichment'),
     path('kegg_annotation/', kegg_annotation, name='kegg_annotation'),
     path('kegg_enrichment/', kegg_enrichment, name='kegg_enrichment'),
+    path('annotation_chart/', annotation_chart, name='annotation_chart'),
+    path('kegg_pathway_map/', kegg_pathway_map, name='kegg_pathway_map'),
+    path('kegg_pathway_maps/', kegg_pathway_maps, name='kegg_pathway_maps'),
     
     # ========== 基因组API端点（对应Shiny应用功能） ==========
     #path('search_by_gene_ids/', search_by_gene_ids, name='search_by_gene_ids'),
@@ -51,6 +59,7 @@ urlpatterns = [
     path('gene_genomic_distribution/', gene_genomic_distribution, name='gene_genomic_distribution'),
     #path('transcription_factors/', transcription_factors, name='transcription_factors'),
     path('genome_synteny/', genome_synteny, name='genome_synteny'),
+    path('genome_synteny_seq/', genome_synteny_seq, name='genome_synteny_seq'),
     #path('structural_variations/', structural_variations, name='structural_variations'),
     
     # Protein 3D search endpoints
@@ -0,0 +1,68 @@
+import logging
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_http_methods
+from CottonOGD.server import annotation_charts
+from CottonOGD.server.render_service import RenderError
+from CottonOGD.views.gene_Go import go_annotation_results, go_chart_payload
+from CottonOGD.views.gene_Kegg import kegg_annotation_results, kegg_chart_data
+
+logger = logging.getLogger(__name__)
+
+
+def _build_payload(chart_type, genome_id, gene_list):
+    if chart_type == 'go':
+        return go_chart_payload(go_annotation_results(genome_id, gene_list))
+    return kegg_chart_data(kegg_annotation_results(genome_id, gene_list))[1]
+
+
+@require_http_methods(['GET'])
+def annotation_chart(request):
+    """
+    GO/KEGG 注释图表 - chart_type=go|kegg，format=png|svg，直接返回图片
+    基因集由 chart_id（注释接口返回）或 gene_id 指定；只有 chart_id 且绘图数据已过期时返回 404 与 chart_expired
+    """
+    chart_type = request.GET.get('chart_type', 'go').lower()
+    fmt = request.GET.get('format', 'png').lower()
+    genome_id = request.GET.get('genome_id', 'G.kirkii_ISU_ISU_v3.0')
+    gene_input = request.GET.get('gene_id', '').strip()
+    chart_id = request.GET.get('chart_id', '').strip()
+
+    if chart_type not in annotation_charts.CHART_TYPES:
+        return JsonResponse({'status': 'error', 'error': f'Unsupported chart_type: {chart_type}'}, status=400)
+    if fmt not in annotation_charts.FORMATS:
+        return JsonResponse({'status': 'error', 'error': f'Unsupported format: {fmt}'}, status=400)
+
+    gene_list = [gene.strip() for gene in gene_input.replace(',', '\n').split() if gene.strip()]
+    if gene_list:
+        chart_id = annotation_charts.gene_set_digest(gene_list)
+    if not chart_id:
+        return JsonResponse({'status': 'error', 'error': 'Missing gene_id or chart_id parameter'}, status=400)
+
+    etag = f'"{chart_type}-{chart_id}-{fmt}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponse(status=304)
+
+    payload = annotation_charts.get_data(chart_type, genome_id, chart_id)
+    if payload is None:
+        if not gene_list:
+            return JsonResponse({'status': 'error', 'error': 'Chart data expired', 'chart_expired': True}, status=404)
+        try:
+            payload = _build_payload(chart_type, genome_id, gene_list)
+        except Exception as e:
+            logger.error(f"{chart_type} annotation chart data error: {e}")
+            return JsonResponse({'status': 'error', 'error': str(e)}, status=500)
+        annotation_charts.put_data(chart_type, genome_id, chart_id, payload)
+
+    if not annotation_charts.has_chart(chart_type, payload):
+        return JsonResponse({'status': 'error', 'error': 'No annotation to plot'}, status=404)
+
+    try:
+        image = annotation_charts.render(chart_type, genome_id, chart_id, payload, fmt)
+    except RenderError as e:
+        logger.error(f"{chart_type} annotation chart error: {e}")
+        return JsonResponse({'status': 'error', 'error': str(e)}, status=503)
+
+    response = HttpResponse(image, content_type=annotation_charts.FORMATS[fmt])
+    response['Cache-Control'] = f'private, max-age={annotation_charts.ttl()}'
+    response['ETag'] = etag
+    return response
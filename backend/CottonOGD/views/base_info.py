@@ -4,6 +4,7 @@ from rest_framework import status
 from django.conf import settings
 from CottonOGD.views.base import UuidManager
 from CottonOGD.models import Species_info, Family
+from CottonOGD.server.fast_json import wants_native, native_response
 import logging
 import json
 
@@ -17,6 +18,8 @@ def get_species_info(request):
         return Response({'error': 'uuid is required'}, status=status.HTTP_400_BAD_REQUEST)
     try:
         species_info = Species_info.objects.all().values('Cotton_Species','Genome_type','name','alias','Article')
+        if wants_native(request):
+            return native_response({'species_info': list(species_info)})
         response_payload = json.dumps(list(species_info), ensure_ascii=False)
         return Response({'species_info': response_payload}, status=status.HTTP_200_OK)
     except Exception as e:
@@ -51,6 +54,8 @@ def get_family_info(request):
         # 构建家族信息列表
         family_info = [{'name': name, 'count': count} for name, count in family_counts.items()]
         #logger.info(f"family_info: {family_info}")
+        if wants_native(request):
+            return native_response({'family_info': family_info, 'family_list': family_list})
         
         info=json.dumps(family_info, ensure_ascii=False)
         family_list_json=json.dumps(family_list, ensure_ascii=False)
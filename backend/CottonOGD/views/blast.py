@@ -10,7 +10,10 @@ import json
 import logging
 from io import StringIO
 from django import forms
+from django.http import StreamingHttpResponse
 from Bio.Blast import NCBIXML
+from CottonOGD.server.blast_pool import BlastPool
+from CottonOGD.server.streaming import is_asgi
 
 #from apps.tools import blastp
 
@@ -76,8 +79,9 @@ class blast:
 
     @classmethod
     def run_blast(cls, sequence, type, genome_id, data_type='genome', evalue='1e-5', max_hits='10',
-                  word_size=None, match_score=None, gap_open=None, gap_extend=None, low_complexity_filter=True):
-        """运行BLAST搜索"""
+                  word_size=None, match_score=None, gap_open=None, gap_extend=None, low_complexity_filter=True,
+                  num_threads=None):
+        """运行BLAST搜索，num_threads 默认为 settings.BLAST_THREADS_PER_JOB"""
         cleaned_seq = cls.clean_sequence(sequence)
         system = platform.system().lower()
         
@@ -119,7 +123,7 @@ class blast:
             '-outfmt', '5',  # XML格式输出
             '-evalue', str(evalue),
             '-max_target_seqs', str(max_hits),
-            '-num_threads', '2'  # 使用2个线程加速
+            '-num_threads', str(num_threads or getattr(settings, 'BLAST_THREADS_PER_JOB', 2))
         ]
         '''
         # 添加高级参数
@@ -313,14 +317,17 @@ def blast_cmd(request):
         except forms.ValidationError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        # 确保只处理第一个基因组ID
-        genome_id = genome_list[0] if genome_list else None
-        if not genome_id:
+        genome_list = list(dict.fromkeys(genome_list))
+        if not genome_list:
             return Response({'error': '基因组ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
-
         try:
-            # 运行BLAST搜索
-            result = blast.run_blast(
+            # 序列只需校验一次，错误直接返回而不是每个基因组各报一次
+            blast.clean_sequence(sequence)
+        except forms.ValidationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        def search(genome_id, num_threads):
+            return blast.run_blast(
                 sequence=sequence,
                 type=validated_type,
                 genome_id=genome_id,
@@ -331,14 +338,67 @@ def blast_cmd(request):
                 match_score=match_score,
                 gap_open=gap_open,
                 gap_extend=gap_extend,
-                low_complexity_filter=low_complexity_filter
+                low_complexity_filter=low_complexity_filter,
+                num_threads=num_threads
             )
-            #logger.log('result',result)
-            return Response({'results': {genome_id: result}})
-        except forms.ValidationError as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        except OSError as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        except Exception as e:
-            logger.error(f"BLAST搜索失败 ({genome_id}): {str(e)}")
-            return Response({'error': f"BLAST搜索失败: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # 所有基因组在有界线程池中并行搜索，stream=true 时每个基因组完成后立即以一行 JSON 返回
+        stream = str(request.data.get('stream', '')).lower() in ('1', 'true', 'yes')
+        if stream:
+            # ASGI 下同步迭代器会被整体读完后才发送，需使用异步生成器
+            if is_asgi(request):
+                lines = _astream_results(BlastPool.arun(search, genome_list), genome_list)
+            else:
+                lines = _stream_results(BlastPool.run(search, genome_list), genome_list)
+            return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        completed = BlastPool.run(search, genome_list)
+
+        results, errors = {}, {}
+        for genome_id, result, error in completed:
+            if error is None:
+                results[genome_id] = result
+            else:
+                logger.error(f"BLAST搜索失败 ({genome_id}): {str(error)}")
+                errors[genome_id] = _error_message(error)
+        if not results:
+            # 全部失败时与单基因组时的错误响应一致
+            return Response({'error': next(iter(errors.values())), 'errors': errors},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # 按请求中的基因组顺序返回
+        response = {'results': {genome_id: results[genome_id] for genome_id in genome_list if genome_id in results}}
+        if errors:
+            response['errors'] = errors
+        return Response(response)
+
+
+def _error_message(error):
+    if isinstance(error, forms.ValidationError):
+        return ' '.join(error.messages)
+    if isinstance(error, OSError):
+        return str(error)
+    return f"BLAST搜索失败: {str(error)}"
+
+
+def _result_line(genome_id, result, error):
+    if error is None:
+        return {'genome_id': genome_id, 'result': result}
+    logger.error(f"BLAST搜索失败 ({genome_id}): {str(error)}")
+    return {'genome_id': genome_id, 'error': _error_message(error)}
+
+
+def _stream_results(completed, genome_list):
+    """NDJSON：每个基因组一行 {genome_id, result} 或 {genome_id, error}，最后一行为 {done, ...}"""
+    succeeded = 0
+    for genome_id, result, error in completed:
+        succeeded += error is None
+        yield json.dumps(_result_line(genome_id, result, error)) + '\n'
+    yield json.dumps({'done': True, 'total': len(genome_list), 'succeeded': succeeded}) + '\n'
+
+
+async def _astream_results(completed, genome_list):
+    """_stream_results 的异步版本，completed 为 BlastPool.arun"""
+    succeeded = 0
+    async for genome_id, result, error in completed:
+        succeeded += error is None
+        yield json.dumps(_result_line(genome_id, result, error)) + '\n'
+    yield json.dumps({'done': True, 'total': len(genome_list), 'succeeded': succeeded}) + '\n'
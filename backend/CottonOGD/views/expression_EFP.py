@@ -1,22 +1,31 @@
 import json
-import os
 import math
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework import status
 from django.views.decorators.csrf import csrf_exempt
 from CottonOGD.models import gene_expression
+from CottonOGD.server.expression_store import ExpressionStore
+from CottonOGD.server.efp_canvas import EFPCanvas, log_aware_colors, FILL_ALPHA, OUTLINE_DATA, OUTLINE_NA
 from io import BytesIO
 import base64
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 from django.conf import settings
 from django.http import JsonResponse
+from django.core.cache import cache
 
 
 logger = logging.getLogger(__name__)
 
+EFP_CACHE_KEY = 'efp_png:{genome}:{gene}:{colors}:{version}'
+# 批量模式单次最多基因数与默认缩略图宽度
+EFP_BATCH_MAX_GENES = 48
+EFP_BATCH_TILE_WIDTH = 600
+
 # 全局变量，标记rpy2是否可用
 
 rpy2_available = False
@@ -74,11 +83,25 @@ def expression_EFP_image(request):
         logger.info(f'Request: gene_id={gene_id}, genome={genome_id}, '
                    f'colors=({low_color}, {mid_color}, {high_color})')
 
+        # 按 (基因组, 基因, 颜色) 缓存最终结果；底图/区域配置或表达矩阵文件更新后键随之变化
+        canvas_version = EFPCanvas.version()
+        cache_key = EFP_CACHE_KEY.format(
+            genome=genome_id, gene=gene_id,
+            colors=','.join(c.lower() for c in (low_color, mid_color, high_color)),
+            version=f'{canvas_version[0]}.{canvas_version[1]}.{ExpressionStore.version(genome_id)}',
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return JsonResponse(cached)
+
         # 2. 获取基因数据
-        gene_data = list(gene_expression.objects.filter(
-            geneid=gene_id, 
-            genome=genome_id
-        ))
+        # 优先读取预生成的表达矩阵，未生成时回退到数据库
+        gene_data = ExpressionStore.gene_values(genome_id, gene_id)
+        if gene_data is None:
+            gene_data = list(gene_expression.objects.filter(
+                geneid=gene_id, 
+                genome=genome_id
+            ).values_list('stage', 'tissue', 'value'))
         
         if not gene_data:
             logger.error(f'Gene not found: {gene_id} in {genome_id}')
@@ -90,16 +113,12 @@ def expression_EFP_image(request):
         # 3. 构建表达值映射
         stage_tissue_map = _build_expression_map(gene_data)
         
-        # 4. 加载配置和图像
-        regions_config = _load_regions_config()
-        base_image = _load_base_image()
+        # 4. 底图与区域标签图（每个进程只加载一次）
+        canvas = EFPCanvas.get()
+        regions_config = canvas.regions_config
         
         # 5. 处理区域数据（单次循环）
-        regions_info, values = _process_regions(
-            regions_config, 
-            stage_tissue_map, 
-            base_image
-        )
+        regions_info, values = _process_regions(canvas, stage_tissue_map)
 
         # 6. 计算值范围（使用对数分位数，避免IQR问题）
         min_val, max_val, min_log, max_log = _calculate_value_range(values)
@@ -127,7 +146,7 @@ def expression_EFP_image(request):
             logger.info('Falling back to PIL for EFP drawing')
             # 使用PIL绘制
             image, regions_info = _draw_heatmap(
-                base_image, 
+                canvas, 
                 regions_info, 
                 values,
                 min_val, max_val, min_log, max_log,
@@ -138,7 +157,7 @@ def expression_EFP_image(request):
         # 8. 添加图例和信息（如果是PIL绘制的）
         if isinstance(image, Image.Image):
             draw = ImageDraw.Draw(image, 'RGBA')
-            add_colorbar(draw, image.width, image.height, 
+            add_colorbar(image, draw, image.width, image.height, 
                         min_val, max_val, 
                         hex_to_rgb(low_color), 
                         hex_to_rgb(mid_color), 
@@ -152,7 +171,7 @@ def expression_EFP_image(request):
             # R生成的图像已经是base64
             img_str = image
         
-        return JsonResponse({
+        payload = {
             'success': True,
             'image': f'data:image/png;base64,{img_str}',
             'regions_info': regions_info,
@@ -165,7 +184,9 @@ def expression_EFP_image(request):
             'valid_regions': len(values),
             'total_regions': len(regions_config['regions']),
             'drawing_method': 'R' if rpy2_available and not isinstance(image, Image.Image) else 'PIL'
-        })
+        }
+        cache.set(cache_key, payload, getattr(settings, 'EFP_CACHE_TTL', 3600))
+        return JsonResponse(payload)
 
     except Exception as e:
         logger.error(f'Error generating heatmap: {str(e)}', exc_info=True)
@@ -175,6 +196,158 @@ def expression_EFP_image(request):
         })
 
 
+@csrf_exempt
+def expression_EFP_batch(request):
+    """
+    多基因 EFP：一次查询取出所有基因的表达值，按统一的色阶（所有基因合并计算的对数分位数）着色，
+    layout=sprite 时拼成一张网格图并返回每个基因的位置，layout=list 时返回每个基因一张图。
+    """
+    try:
+        data = _parse_request_data(request)
+        gene_ids = data.get('gene_ids') or data.get('gene_id') or []
+        if isinstance(gene_ids, str):
+            gene_ids = [g.strip() for g in gene_ids.replace('\n', ',').split(',')]
+        gene_ids = list(dict.fromkeys(g for g in gene_ids if g))
+        if not gene_ids:
+            return JsonResponse({'success': False, 'error': '请输入基因ID'})
+        if len(gene_ids) > EFP_BATCH_MAX_GENES:
+            return JsonResponse({'success': False, 'error': f'一次最多支持 {EFP_BATCH_MAX_GENES} 个基因'})
+
+        low_color = data.get('low_color', '#0000FF')
+        mid_color = data.get('mid_color', '#00FF00')
+        high_color = data.get('high_color', '#FF0000')
+        genome_id = data.get('genome_id', 'G.hirsutumAD1_Jin668_HAU_v1T2T')
+        layout = data.get('layout', 'sprite')
+        if layout not in ('sprite', 'list'):
+            return JsonResponse({'success': False, 'error': 'layout 只能为 sprite 或 list'})
+        try:
+            tile_width = int(data.get('tile_width') or EFP_BATCH_TILE_WIDTH)
+            columns = int(data.get('columns') or math.ceil(math.sqrt(len(gene_ids))))
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'tile_width / columns 必须为整数'})
+
+        # 1. 一次取出所有基因的表达值
+        gene_data = _fetch_batch_values(genome_id, gene_ids)
+        found = [g for g in gene_ids if gene_data.get(g)]
+        missing = [g for g in gene_ids if not gene_data.get(g)]
+        if not found:
+            return JsonResponse({
+                'success': False,
+                'error': f'基因ID在基因组 "{genome_id}" 中均不存在',
+                'missing': missing
+            })
+
+        # 2. 各基因的区域值，所有基因合并计算统一色阶
+        canvas = EFPCanvas.get()
+        processed = {g: _process_regions(canvas, _build_expression_map(gene_data[g])) for g in found}
+        all_values = [v for _, values in processed.values() for v in values]
+        value_range = _calculate_value_range(all_values)
+        colors = (low_color, mid_color, high_color)
+
+        # 3. 共享区域标签图，多线程着色与编码
+        tile_width = max(100, min(tile_width, canvas.width))
+        tile_height = round(canvas.height * tile_width / canvas.width)
+
+        def render(gene_id):
+            regions_info, values = processed[gene_id]
+            image, regions_info = _render_gene_image(canvas, gene_id, regions_info, values, value_range, colors)
+            if tile_width != canvas.width:
+                image = image.resize((tile_width, tile_height), Image.LANCZOS)
+            return image, regions_info
+
+        with ThreadPoolExecutor(max_workers=min(len(found), getattr(settings, 'EFP_BATCH_WORKERS', 4))) as pool:
+            rendered = dict(zip(found, pool.map(render, found)))
+
+        genes = []
+        for gene_id in found:
+            regions_info, values = rendered[gene_id][1], processed[gene_id][1]
+            genes.append({
+                'gene_id': gene_id,
+                'valid_regions': len(values),
+                # 多边形对所有基因相同，批量结果中省略
+                'regions_info': [{k: v for k, v in region.items() if k != 'polygon'} for region in regions_info],
+            })
+
+        payload = {
+            'success': True,
+            'layout': layout,
+            'genome_id': genome_id,
+            'min_value': float(value_range[0]),
+            'max_value': float(value_range[1]),
+            'tile_width': tile_width,
+            'tile_height': tile_height,
+            'total_regions': len(canvas.regions_config['regions']),
+            'genes': genes,
+            'missing': missing,
+        }
+        if layout == 'sprite':
+            columns = max(1, min(columns, len(found)))
+            rows = math.ceil(len(found) / columns)
+            sheet = Image.new('RGBA', (columns * tile_width, rows * tile_height), (255, 255, 255, 0))
+            for i, gene in enumerate(genes):
+                x, y = (i % columns) * tile_width, (i // columns) * tile_height
+                sheet.paste(rendered[gene['gene_id']][0], (x, y))
+                gene.update(x=x, y=y)
+            payload.update(
+                image=f'data:image/png;base64,{_image_to_base64(sheet)}',
+                columns=columns,
+                rows=rows,
+            )
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(found), getattr(settings, 'EFP_BATCH_WORKERS', 4))) as pool:
+                encoded = pool.map(_image_to_base64, [rendered[gene['gene_id']][0] for gene in genes])
+            for gene, img_str in zip(genes, encoded):
+                gene['image'] = f'data:image/png;base64,{img_str}'
+        return JsonResponse(payload)
+
+    except Exception as e:
+        logger.error(f'Error generating EFP batch: {str(e)}', exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'error': f'生成热图时发生错误: {str(e)}'
+        })
+
+
+def _fetch_batch_values(genome_id, gene_ids):
+    """返回 {geneid: [(stage, tissue, value)]}，优先读取表达矩阵文件，否则单次数据库查询"""
+    gene_data = {}
+    for gene_id in gene_ids:
+        values = ExpressionStore.gene_values(genome_id, gene_id)
+        if values is None:
+            break
+        gene_data[gene_id] = values
+    else:
+        return gene_data
+
+    gene_data = defaultdict(list)
+    rows = gene_expression.objects.filter(
+        genome=genome_id,
+        geneid__in=gene_ids
+    ).values_list('geneid', 'stage', 'tissue', 'value')
+    for geneid, stage, tissue, value in rows:
+        gene_data[geneid].append((stage, tissue, value))
+    return gene_data
+
+
+def _render_gene_image(canvas, gene_id, regions_info, values, value_range, colors):
+    """用共享的区域标签图和给定色阶绘制单个基因的 EFP 图（含色条与标题）"""
+    min_val, max_val, min_log, max_log = value_range
+    low_color, mid_color, high_color = colors
+    image, regions_info = _draw_heatmap(
+        canvas, regions_info, values,
+        min_val, max_val, min_log, max_log,
+        low_color, mid_color, high_color
+    )
+    draw = ImageDraw.Draw(image, 'RGBA')
+    add_colorbar(image, draw, image.width, image.height,
+                 min_val, max_val,
+                 hex_to_rgb(low_color),
+                 hex_to_rgb(mid_color),
+                 hex_to_rgb(high_color))
+    add_gene_info(draw, image.width, gene_id, len(values), len(regions_info))
+    return image, regions_info
+
+
 def _parse_request_data(request):
     """解析请求数据"""
     if request.content_type == 'application/json':
@@ -183,12 +356,12 @@ def _parse_request_data(request):
 
 
 def _build_expression_map(gene_data):
-    """构建阶段-组织到表达值的映射"""
+    """构建阶段-组织到表达值的映射，gene_data 为 (stage, tissue, value) 序列"""
     stage_tissue_map = {}
     
-    for item in gene_data:
-        stage = (item.stage or '').strip()
-        tissue = (item.tissue or '').strip()
+    for stage, tissue, value in gene_data:
+        stage = (stage or '').strip()
+        tissue = (tissue or '').strip()
         
         if not stage and not tissue:
             continue
@@ -203,31 +376,13 @@ def _build_expression_map(gene_data):
             keys.add(f'{stage}{tissue}'.lower())
             
         for key in keys:
-            stage_tissue_map.setdefault(key, []).append(item.value)
+            stage_tissue_map.setdefault(key, []).append(value)
             
     return stage_tissue_map
 
 
-def _load_regions_config():
-    """加载区域配置"""
-    config_path = os.path.join(settings.BASE_DIR, 'static', 'ccc.json')
-    if not os.path.exists(config_path):
-        raise FileNotFoundError('区域配置文件不存在')
-    
-    with open(config_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-
-def _load_base_image():
-    """加载基础图像"""
-    image_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'egg.jpg')
-    if not os.path.exists(image_path):
-        raise FileNotFoundError('基础图像文件不存在')
-    return Image.open(image_path).convert('RGBA')
-
-
-def _process_regions(regions_config, stage_tissue_map, base_image):
-    """预处理所有区域，收集值和信息"""
+def _process_regions(canvas, stage_tissue_map):
+    """预处理所有区域，收集值和信息；多边形已在 EFPCanvas 中解析"""
     regions_info = []
     values = []
     
@@ -238,26 +393,14 @@ def _process_regions(regions_config, stage_tissue_map, base_image):
         'Phloem': 'phloem', 'Ovules': 'ovule', 'Seed': 'seed', 'Fiber': 'fiber'
     }
     
-    for region in regions_config['regions']:
+    for region, polygon in zip(canvas.regions_config['regions'], canvas.polygons):
         region_name = region['name']
-        polygon = region.get('polygon', [])
         
         # 验证多边形
         if not polygon:
             regions_info.append({
                 'name': region_name,
-                'value': 'No Polygon',
-                'polygon': []
-            })
-            continue
-            
-        try:
-            polygon = [(int(x), int(y)) for x, y in polygon]
-        except (ValueError, TypeError) as e:
-            logger.error(f'Invalid polygon for {region_name}: {e}')
-            regions_info.append({
-                'name': region_name,
-                'value': 'Invalid Polygon',
+                'value': 'Invalid Polygon' if region.get('polygon') else 'No Polygon',
                 'polygon': []
             })
             continue
@@ -312,6 +455,7 @@ def _calculate_value_range(values):
     """计算对数缩放的值范围（修复IQR问题）"""
     if not values:
         min_val, max_val = 0, 10
+        min_log, max_log = math.log10(min_val + 1), math.log10(max_val + 1)
     else:
         # 使用对数分位数，但确保范围有效
         log_values = np.log10(np.array(values) + 1)
@@ -332,72 +476,37 @@ def _calculate_value_range(values):
     return min_val, max_val, min_log, max_log
 
 
-def _draw_heatmap(base_image, regions_info, values, min_val, max_val, 
+def _draw_heatmap(canvas, regions_info, values, min_val, max_val, 
                   min_log, max_log, low_color, mid_color, high_color):
-    """绘制热图"""
-    image = base_image.copy()
-    draw = ImageDraw.Draw(image, 'RGBA')
+    """绘制热图：按区域计算颜色查找表，再对标签图一次性着色"""
+    n = len(regions_info)
+    has_data = np.array([bool(region.get('has_data')) for region in regions_info], dtype=bool)
+    region_values = np.array([region['value'] if has_data[i] else 0.0 for i, region in enumerate(regions_info)],
+                             dtype=np.float64)
     
-    low_rgb = hex_to_rgb(low_color)
-    mid_rgb = hex_to_rgb(mid_color)
-    high_rgb = hex_to_rgb(high_color)
+    # 对数归一化
+    if max_log > min_log:
+        normalized = np.clip((np.log10(region_values + 1) - min_log) / (max_log - min_log), 0, 1)
+    else:
+        normalized = np.full(n, 0.5)
     
-    for region in regions_info:
-        polygon = region['polygon']
-        if not polygon or not region.get('has_data'):
-            # 绘制灰色边框表示无数据
-            if len(polygon) > 1:
-                closed = polygon + [polygon[0]]
-                draw.line(closed, fill='gray', width=2, joint='curve')
-            continue
-        
-        # 计算颜色
-        value = region['value']
-        log_value = math.log10(value + 1)
-        
-        # 对数归一化
-        if max_log > min_log:
-            normalized = (log_value - min_log) / (max_log - min_log)
-            normalized = max(0, min(1, normalized))
-        else:
-            normalized = 0.5
-        
-        # 使用对数感知的颜色映射
-        color = _log_aware_color_map(normalized, low_rgb, mid_rgb, high_rgb)
-        
-        # 绘制
-        draw.polygon(polygon, fill=color)
-        if len(polygon) > 1:
-            closed = polygon + [polygon[0]]
-            draw.line(closed, fill='black', width=2, joint='curve')
-        
-        # 更新区域信息
-        region['color'] = color
-        region['normalized'] = normalized
+    # 使用对数感知的颜色映射；第 0 行为背景
+    colors = log_aware_colors(normalized, hex_to_rgb(low_color), hex_to_rgb(mid_color), hex_to_rgb(high_color),
+                              alpha=FILL_ALPHA)
+    fill_lut = np.zeros((n + 1, 4), dtype=np.uint8)
+    fill_lut[1:][has_data] = colors[has_data]
+    # 有数据的区域黑色边框，无数据的灰色边框
+    outline_lut = np.zeros((n + 1, 4), dtype=np.uint8)
+    outline_lut[1:] = np.where(has_data[:, None], OUTLINE_DATA, OUTLINE_NA)
+    image = canvas.render(fill_lut, outline_lut)
     
-    return image, regions_info
-
-
-def _log_aware_color_map(normalized, low_rgb, mid_rgb, high_rgb, alpha=100):
-    """对数感知的颜色映射（保持视觉线性）"""
-    # 使用指数插值使颜色过渡更符合对数感知
-    if normalized < 0.5:
-        t = (normalized * 2) ** 0.5  # 指数调整
-        r = int(low_rgb[0] + (mid_rgb[0] - low_rgb[0]) * t)
-        g = int(low_rgb[1] + (mid_rgb[1] - low_rgb[1]) * t)
-        b = int(low_rgb[2] + (mid_rgb[2] - low_rgb[2]) * t)
-    else:
-        t = ((normalized - 0.5) * 2) ** 2  # 平方调整
-        r = int(mid_rgb[0] + (high_rgb[0] - mid_rgb[0]) * t)
-        g = int(mid_rgb[1] + (high_rgb[1] - mid_rgb[1]) * t)
-        b = int(mid_rgb[2] + (high_rgb[2] - mid_rgb[2]) * t)
+    # 更新区域信息
+    for i, region in enumerate(regions_info):
+        if has_data[i]:
+            region['color'] = tuple(int(c) for c in colors[i])
+            region['normalized'] = float(normalized[i])
     
-    return (
-        max(0, min(255, r)),
-        max(0, min(255, g)),
-        max(0, min(255, b)),
-        max(0, min(255, alpha))
-    )
+    return image, regions_info
 
 
 def _draw_heatmap_with_r(regions_info, values, min_val, max_val, min_log, max_log, low_color, mid_color, high_color):
@@ -576,7 +685,7 @@ def hex_to_rgb(hex_color):
     )
 
 
-def add_colorbar(draw, image_width, image_height, min_val, max_val, 
+def add_colorbar(image, draw, image_width, image_height, min_val, max_val, 
                  low_rgb, mid_rgb, high_rgb):
     """添加颜色条图例（修复字体问题）"""
     colorbar_width = 25
@@ -585,13 +694,11 @@ def add_colorbar(draw, image_width, image_height, min_val, max_val,
     colorbar_x = int(image_width - margin - colorbar_width - 50)
     colorbar_y = int(margin + 50)
 
-    # 绘制渐变色条
-    for i in range(colorbar_height):
-        normalized = i / colorbar_height
-        color = _log_aware_color_map(normalized, low_rgb, mid_rgb, high_rgb, alpha=255)
-        y_pos = colorbar_y + colorbar_height - i  # 反转：高值在上
-        draw.line([(colorbar_x, y_pos), (colorbar_x + colorbar_width, y_pos)], 
-                 fill=color, width=1)
+    # 绘制渐变色条：反转，高值在上
+    normalized = np.arange(colorbar_height) / colorbar_height
+    gradient = log_aware_colors(normalized[::-1], low_rgb, mid_rgb, high_rgb, alpha=255)
+    gradient = np.repeat(gradient[:, None, :], colorbar_width + 1, axis=1)
+    image.paste(Image.fromarray(gradient, 'RGBA'), (colorbar_x, colorbar_y + 1))
 
     # 边框
     draw.rectangle([
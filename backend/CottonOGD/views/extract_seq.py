@@ -4,10 +4,24 @@ from rest_framework import status
 from CottonOGD.views.base import UuidManager
 from CottonOGD.views.location_ID import Id_map
 from CottonOGD.models import gene_seq
+from CottonOGD.server.seq_store import SeqStore, INLINE_SEQUENCE, SEQ_FIELDS
 import json
 import logging
 logger = logging.getLogger(__name__)
 
+# gene_type -> 返回字段名
+SEQ_TYPE_KEYS = {
+    'genome': 'genome_seq',
+    'mRNA': 'mrna_seq',
+    'upstream': 'upstream_seq',
+    'downstream': 'downstream_seq',
+    'cdna': 'cdna_seq',
+    'cds': 'cds_seq',
+    'pro': 'protein_seq',
+}
+# MySQL 默认排序规则不区分大小写（gene_type='mRNA' 同样命中 'mrna'），分组时保持一致
+_SEQ_TYPE_KEYS_CI = {gene_type.lower(): key for gene_type, key in SEQ_TYPE_KEYS.items()}
+
 
 @api_view(['POST'])
 def extract_seq(request):
@@ -72,16 +86,20 @@ def extract_seq(request):
         if not db_id:
             return Response({'error': 'db_id must contain valid integers'}, status=status.HTTP_400_BAD_REQUEST)
         
-        gene_seqs=gene_seq.objects.filter(id_id__in=db_id)
-        seq_data={
-            'genome_seq': [{'db_id': item.id_id, 'seq': item.sequence,'gene_type':item.gene_type,'mrna_id':item.mrna_id} for item in gene_seqs.filter(gene_type='genome')],
-            'mrna_seq': [{'db_id': item.id_id, 'seq': item.sequence,'gene_type':item.gene_type,'mrna_id':item.mrna_id} for item in gene_seqs.filter(gene_type='mRNA')],
-            'upstream_seq': [{'db_id': item.id_id, 'seq': item.sequence,'gene_type':item.gene_type,'mrna_id':item.mrna_id} for item in gene_seqs.filter(gene_type='upstream')],
-            'downstream_seq': [{'db_id': item.id_id, 'seq': item.sequence,'gene_type':item.gene_type,'mrna_id':item.mrna_id} for item in gene_seqs.filter(gene_type='downstream')],
-            'cdna_seq': [{'db_id': item.id_id, 'seq': item.sequence,'gene_type':item.gene_type,'mrna_id':item.mrna_id} for item in gene_seqs.filter(gene_type='cdna')],
-            'cds_seq': [{'db_id': item.id_id, 'seq': item.sequence,'gene_type':item.gene_type,'mrna_id':item.mrna_id} for item in gene_seqs.filter(gene_type='cds')],
-            'protein_seq': [{'db_id': item.id_id, 'seq': item.sequence,'gene_type':item.gene_type,'mrna_id':item.mrna_id} for item in gene_seqs.filter(gene_type='pro')]
-        }
+        # 单次查询后按 gene_type 分组；已外置的序列从 mmap 文件切片读取
+        gene_seqs = gene_seq.objects.filter(id_id__in=db_id, gene_type__in=list(SEQ_TYPE_KEYS)).values(
+            'id_id', 'gene_type', 'mrna_id', *SEQ_FIELDS, inline=INLINE_SEQUENCE)
+        seq_data = {key: [] for key in SEQ_TYPE_KEYS.values()}
+        for item in gene_seqs:
+            key = _SEQ_TYPE_KEYS_CI.get((item['gene_type'] or '').lower())
+            if key is None:
+                continue
+            seq_data[key].append({
+                'db_id': item['id_id'],
+                'seq': SeqStore.sequence_of(item),
+                'gene_type': item['gene_type'],
+                'mrna_id': item['mrna_id'],
+            })
         
         return Response({'seq': seq_data}, status=status.HTTP_200_OK)
         
@@ -1,15 +1,93 @@
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework import status
+from django.http import StreamingHttpResponse
 from CottonOGD.views.base import UuidManager
-from django.conf import settings
+from CottonOGD.views.location_ID import Id_map
+from CottonOGD.models import gene_info
 import logging
-import os
-# 使用 pyfastx 提取序列
-import pyfaidx
+from CottonOGD.server.fasta_pool import FastaPool
+from CottonOGD.server.streaming import streaming_content
+import re
+import zlib
 
 logger = logging.getLogger(__name__)
 
+# 区间格式：seqid:start-end，可选 :strand
+REGION_PATTERN = re.compile(r'^([^:\s]+):(\d+)-(\d+)(?::([+-]))?$')
+# 单次批量请求允许的最大区间数
+MAX_BATCH_REGIONS = 20000
+# FASTA 每行碱基数
+FASTA_LINE_WIDTH = 60
+
+
+def parse_region(region):
+    """解析 "seqid:start-end[:strand]"，格式不合法时返回 None"""
+    match = REGION_PATTERN.match(region.strip())
+    if not match:
+        return None
+    return match.group(1), int(match.group(2)), int(match.group(3)), match.group(4) or '+'
+
+
+def _slice_sequence(fa, genome_id, seqid, start, end, strand):
+    """在已打开的 Fasta 上截取单个区间（1-based，闭区间）"""
+    # 检查 seqid 是否存在
+    if seqid not in fa:
+        logger.warning(f"Sequence not found for seqid: {seqid} in genome: {genome_id}")
+        return None
+    
+    # 获取序列
+    sequence = fa[seqid]
+    
+    # 提取指定位置的序列（注意：生物序列通常从1开始计数）
+    # 确保位置有效
+    if start < 1 or end > len(sequence) or start > end:
+        logger.warning(f"Invalid position: start={start}, end={end}, sequence length={len(sequence)}")
+        return None
+    
+    # 提取序列（pyfaidx 支持直接通过切片提取，从0开始计数）
+    extracted_seq = sequence[start-1:end]
+    
+    # 如果是负链，需要反转互补
+    if strand == '-':
+        extracted_seq = extracted_seq.reverse.complement
+    
+    return str(extracted_seq)
+
+
+def iter_regions_from_genome_file(genome_id, regions, clamp=False):
+    """
+    逐个提取区间的生成器，共用一个缓存的 Fasta 句柄
+    :param regions: [(seqid, start, end, strand), ...]
+    :param clamp: 为真时把越界的坐标截到染色体范围内
+    :return: 依次产出 (实际提取的 region, sequence)，失败的区间 sequence 为 None；基因组文件不可用时不产出任何内容
+    """
+    fa = FastaPool.get(genome_id)
+    if fa is None:
+        return
+    for region in regions:
+        seqid, start, end, strand = region
+        try:
+            if clamp and seqid in fa:
+                start, end = max(1, start), min(end, len(fa[seqid]))
+                region = (seqid, start, end, strand)
+            yield region, _slice_sequence(fa, genome_id, seqid, start, end, strand)
+        except Exception as e:
+            logger.error(f"Error extracting {seqid}:{start}-{end} from {genome_id}: {e}")
+            yield region, None
+
+
+def extract_regions_from_genome_file(genome_id, regions):
+    """
+    批量从同一基因组文件中提取多个区间，共用一个缓存的 Fasta 句柄
+    :param genome_id: 基因组 ID
+    :param regions: [(seqid, start, end, strand), ...]
+    :return: 与 regions 一一对应的序列列表，失败的区间为 None；基因组文件不可用时返回 None
+    """
+    if FastaPool.get(genome_id) is None:
+        return None
+    return [sequence for _, sequence in iter_regions_from_genome_file(genome_id, regions)]
+
 
 def extract_sequence_from_genome_file(genome_id, seqid, start, end, strand):
     """
@@ -21,59 +99,8 @@ def extract_sequence_from_genome_file(genome_id, seqid, start, end, strand):
     :param strand: 链方向 (+/-)
     :return: 提取的序列
     """
-    try:
-        # 基因组文件路径（根据实际情况调整）
-        genome_dir = os.path.join(settings.BASE_DIR, 'data', 'genome', genome_id)
-        genome_file = os.path.join(genome_dir, f'{genome_id}.genome.fa.gz')
-        
-        # 尝试不同的文件扩展名
-        if not os.path.exists(genome_file):
-            # 尝试 .genome.fa.gz
-            genome_file_gz = os.path.join(genome_dir, f'{genome_id}.genome.fa.gz')
-            if os.path.exists(genome_file_gz):
-                genome_file = genome_file_gz
-            else:
-                # 尝试 .fa
-                genome_file_fa = os.path.join(genome_dir, f'{genome_id}.fa')
-                if os.path.exists(genome_file_fa):
-                    genome_file = genome_file_fa
-                else:
-                    logger.warning(f"Genome file not found: {genome_file}")
-                    return None
-        
-        # 使用 pyfaidx 加载 FASTA 文件
-        try:
-            fa = pyfaidx.Fasta(genome_file)
-        except Exception as e:
-            logger.error(f"Error loading FASTA file with pyfaidx: {e}")
-            return None
-        
-        # 检查 seqid 是否存在
-        if seqid not in fa:
-            logger.warning(f"Sequence not found for seqid: {seqid} in genome: {genome_id}")
-            return None
-        
-        # 获取序列
-        sequence = fa[seqid]
-        
-        # 提取指定位置的序列（注意：生物序列通常从1开始计数）
-        # 确保位置有效
-        if start < 1 or end > len(sequence) or start > end:
-            logger.warning(f"Invalid position: start={start}, end={end}, sequence length={len(sequence)}")
-            return None
-        
-        # 提取序列（pyfaidx 支持直接通过切片提取，从0开始计数）
-        extracted_seq = sequence[start-1:end]
-        
-        # 如果是负链，需要反转互补
-        if strand == '-':
-            extracted_seq = extracted_seq.reverse.complement
-        
-        return str(extracted_seq)
-        
-    except Exception as e:
-        logger.error(f"Error extracting sequence from file: {e}")
-        return None
+    sequences = extract_regions_from_genome_file(genome_id, [(seqid, start, end, strand)])
+    return sequences[0] if sequences else None
 
 @api_view(['POST'])
 def extract_seq_gff(request):
@@ -107,3 +134,141 @@ def extract_seq_gff(request):
             return Response({'error': 'Failed to extract sequence'}, status=status.HTTP_404_NOT_FOUND)
     else:
         return Response({'error': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+def parse_bed_regions(text):
+    """
+    解析区间列表，每行一个区间，返回 [(name, (seqid, start, end, strand)), ...]，坐标统一为 1-based 闭区间
+    - seqid:start-end[:strand]     1-based
+    - seqid start end [name] [score] [strand]   BED（0-based 半开区间），以制表符或空格分隔
+    不合法的行抛出 ValueError
+    """
+    regions = []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith(('#', 'track', 'browser')):
+            continue
+        parsed = parse_region(line)
+        if parsed:
+            seqid, start, end, strand = parsed
+            regions.append((f'{seqid}:{start}-{end}', parsed))
+            continue
+        fields = line.split()
+        if len(fields) < 3 or not fields[1].isdigit() or not fields[2].isdigit():
+            raise ValueError(f'Invalid region at line {line_no}: {line}')
+        seqid, start, end = fields[0], int(fields[1]) + 1, int(fields[2])
+        name = fields[3] if len(fields) > 3 else f'{seqid}:{start}-{end}'
+        strand = fields[5] if len(fields) > 5 and fields[5] in ('+', '-') else '+'
+        regions.append((name, (seqid, start, end, strand)))
+    return regions
+
+
+def gene_flank_regions(gene_ids, genome_id, upstream=0, downstream=0):
+    """
+    根据 gene_assembly 中 type=gene 的坐标生成区间，upstream/downstream 按链方向外扩
+    :return: [(geneid, (seqid, start, end, strand)), ...]，保持输入顺序，找不到的基因跳过
+    """
+    id_map = Id_map(gene_ids, genome_id)
+    db_ids = [info['db_id'] for info in id_map.values() if info.get('db_id')]
+    rows = gene_info.objects.filter(id_id__in=db_ids, type='gene').values_list(
+        'id_id', 'geneid_id', 'seqid', 'start', 'end', 'strand')
+    coords = {}
+    for id_id, geneid, seqid, start, end, strand in rows:
+        coords.setdefault(id_id, (geneid, seqid, start, end, strand))
+
+    regions = []
+    for db_id in dict.fromkeys(db_ids):
+        if db_id not in coords:
+            continue
+        geneid, seqid, start, end, strand = coords[db_id]
+        if strand == '-':
+            start, end = start - downstream, end + upstream
+        else:
+            start, end = start - upstream, end + downstream
+        regions.append((geneid, (seqid, start, end, strand)))
+    return regions
+
+
+def _fasta_records(genome_id, named_regions, clamp):
+    """逐条生成 FASTA 文本"""
+    names = [name for name, _ in named_regions]
+    regions = [region for _, region in named_regions]
+    for name, ((seqid, start, end, strand), sequence) in zip(names, iter_regions_from_genome_file(genome_id, regions, clamp)):
+        if sequence is None:
+            continue
+        lines = [sequence[i:i + FASTA_LINE_WIDTH] for i in range(0, len(sequence), FASTA_LINE_WIDTH)]
+        yield f'>{name} {seqid}:{start}-{end}({strand})\n' + '\n'.join(lines) + '\n'
+
+
+def _gzip_stream(chunks):
+    """把文本块实时压缩为 gzip 流"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        # BED 名称 / 基因ID 可能含非 ASCII 字符
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@api_view(['POST'])
+def extract_seq_gff_batch(request):
+    """
+    批量提取基因组区间序列，以流式 FASTA 返回
+    
+    请求参数:
+    - genome_id: 基因组名称（必需）
+    - regions: 区间列表（文本或列表），支持 seqid:start-end[:strand] 或 BED 行
+    - gene_ids: 基因ID列表（逗号/换行分隔），与 upstream/downstream 一起使用，二者选其一
+    - upstream / downstream: 按链方向外扩的碱基数（默认0）
+    - gzip: 为真时以 gzip 压缩流返回
+    """
+    uuid = request.headers.get('uuid')
+    if not uuid or uuid not in UuidManager.uuid_storage:
+        return Response({'error': 'uuid is required'}, status=status.HTTP_400_BAD_REQUEST)
+    genome_id = request.data.get('genome_id') or request.query_params.get('genome_id')
+    regions_input = request.data.get('regions') or ''
+    gene_ids = request.data.get('gene_ids') or ''
+    use_gzip = str(request.data.get('gzip', '')).lower() in ('1', 'true', 'yes')
+
+    if not genome_id or not (regions_input or gene_ids):
+        return Response({'error': 'genome_id and regions or gene_ids are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        if regions_input:
+            if isinstance(regions_input, list):
+                regions_input = '\n'.join(str(item) for item in regions_input)
+            named_regions = parse_bed_regions(regions_input)
+            clamp = False
+        else:
+            if isinstance(gene_ids, list):
+                if not all(isinstance(g, (str, int)) and not isinstance(g, bool) for g in gene_ids):
+                    raise ValueError('gene_ids must be a list of gene ID strings')
+                gene_ids = ','.join(str(g) for g in gene_ids)
+            upstream = int(request.data.get('upstream') or 0)
+            downstream = int(request.data.get('downstream') or 0)
+            if upstream < 0 or downstream < 0:
+                raise ValueError('upstream and downstream must be non-negative')
+            named_regions = gene_flank_regions(gene_ids, genome_id, upstream, downstream)
+            # 基因靠近染色体两端时，外扩部分截到染色体边界
+            clamp = True
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not named_regions:
+        return Response({'error': 'No valid regions found'}, status=status.HTTP_404_NOT_FOUND)
+    if len(named_regions) > MAX_BATCH_REGIONS:
+        return Response({'error': f'Too many regions (max {MAX_BATCH_REGIONS})'}, status=status.HTTP_400_BAD_REQUEST)
+    if FastaPool.get(genome_id) is None:
+        return Response({'error': 'Genome file not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    # ASGI 下同步生成器会被整体取完后才发送，按请求类型包装为异步迭代器
+    records = _fasta_records(genome_id, named_regions, clamp)
+    if use_gzip:
+        response = StreamingHttpResponse(streaming_content(request, _gzip_stream(records)),
+                                         content_type='application/gzip')
+        response['Content-Disposition'] = f'attachment; filename="{genome_id}_regions.fa.gz"'
+    else:
+        response = StreamingHttpResponse(streaming_content(request, records), content_type='text/x-fasta; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{genome_id}_regions.fa"'
+    return response
@@ -3,7 +3,8 @@ from rest_framework.decorators import api_view
 from rest_framework import status
 from CottonOGD.views.base import UuidManager
 from CottonOGD.views.location_ID import Id_map
-from CottonOGD.models import gene_annotation, gene_info,gene_seq,gene_go,gene_kegg
+from CottonOGD.server.gene_bundle import load_gene_bundle, first_gene_row, mrna_ids, transcript_seqs
+from CottonOGD.server.fast_json import wants_native, native_response
 import logging,json
 logger = logging.getLogger(__name__)
 
@@ -41,21 +42,24 @@ def geneid_summary(request):
     db_ids = list(set(db_ids))
     logger.info(f"get_gene_id_result db_ids: {db_ids}")
         
-    # 使用 db_id 过滤基因注释
-    gene_annotation_result = gene_annotation.objects.filter(id_id__in=db_ids).values()
-    gene_info_result = gene_info.objects.filter(id_id__in=db_ids).values()
-    # 获取GO和KEGG注释数据
-    gene_go_result = gene_go.objects.filter(id_id__in=db_ids).values()
-    gene_kegg_result = gene_kegg.objects.filter(id_id__in=db_ids).values()
+    # 注释、GFF、GO、KEGG 一次取齐（summary 不需要序列）
+    bundle = load_gene_bundle(db_ids, include_seq=False)
+    if wants_native(request):
+        return native_response({'geneid_result': bundle['annotation'],
+                                'gene_info_result': bundle['gff'],
+                                'search_map': genome_gene_id,
+                                'gene_go_result': bundle['go'],
+                                'gene_kegg_result': bundle['kegg'],
+                                })
     # 构建 JBrowse URL
-    geneid_result=json.dumps(list(gene_annotation_result))
-    gene_info_result=json.dumps(list(gene_info_result))
+    geneid_result=json.dumps(bundle['annotation'])
+    gene_info_result=json.dumps(bundle['gff'])
     search_map=json.dumps(genome_gene_id)
     return Response({'geneid_result': geneid_result,
                      'gene_info_result': gene_info_result,
                      'search_map': search_map,
-                     'gene_go_result': list(gene_go_result),
-                     'gene_kegg_result': list(gene_kegg_result),
+                     'gene_go_result': bundle['go'],
+                     'gene_kegg_result': bundle['kegg'],
                      }, status=status.HTTP_200_OK)
 
 
@@ -110,11 +114,9 @@ def geneid_result(request):
     if not db_ids:
         return Response({'error': 'No valid db_id found'}, status=status.HTTP_400_BAD_REQUEST)
 
-    gene_annotation_result = gene_annotation.objects.filter(id_id__in=db_ids).values()
-    gene_info_result = gene_info.objects.filter(id_id__in=db_ids).values()
-    genome_seq_result = gene_seq.objects.filter(id_id__in=db_ids).values()
-    gene_go_result = gene_go.objects.filter(id_id__in=db_ids).values()
-    gene_kegg_result = gene_kegg.objects.filter(id_id__in=db_ids).values()
+    # 每张表各一次查询，转录本序列在内存中按 (mrna_id, gene_type) 取
+    bundle = load_gene_bundle(db_ids)
+    gene_info_result = bundle['gff']
     
     # 初始化变量
     seqid = ''
@@ -126,7 +128,7 @@ def geneid_result(request):
     jbrowse_url = None
     if gene_info_result:
         # 取第一个基因信息来构建 URL
-        gene = gene_info_result.filter(type='gene').first()
+        gene = first_gene_row(gene_info_result)
         if gene:
             seqid = gene.get('seqid', '')
             start = gene.get('start', 0)
@@ -135,28 +137,9 @@ def geneid_result(request):
             genome_id = gene.get('genome_id', '')
             jbrowse_url = build_jbrowse_url(seqid, start, end, genome_id)
             
-    mran_id = []
-    for item in gene_info_result.filter(type='mRNA'):
-        mran_id.append(item.get('attributes', '').split(';')[0].split('=')[1])
+    mran_id = mrna_ids(gene_info_result)
     logger.info(f"get_gene_id_result mran_id: {mran_id}")
-    mrna_transcript_result=[]
-    for item in mran_id:
-        cdna_seq = genome_seq_result.filter(mrna_id=item, gene_type='cdna').first()
-        cds_seq = genome_seq_result.filter(mrna_id=item, gene_type='cds').first()
-        downstream_seq = genome_seq_result.filter(mrna_id=item, gene_type='downstream').first()
-        mrna_seq = genome_seq_result.filter(mrna_id=item, gene_type='mrna').first()
-        protein_seq = genome_seq_result.filter(mrna_id=item, gene_type='pro').first()
-        upstream_seq = genome_seq_result.filter(mrna_id=item, gene_type='upstream').first()
-        
-        mrna_transcript_result.append({  
-                'id': item,
-                'cdna_seq': cdna_seq.get('sequence', '') if cdna_seq else '',
-                'cds_seq': cds_seq.get('sequence', '') if cds_seq else '',
-                'downstream_seq': downstream_seq.get('sequence', '') if downstream_seq else '',
-                'mrna_seq': mrna_seq.get('sequence', '') if mrna_seq else '',
-                'protein_seq': protein_seq.get('sequence', '') if protein_seq else '',
-                'upstream_seq': upstream_seq.get('sequence', '') if upstream_seq else '',
-            })
+    mrna_transcript_result = [transcript_seqs(bundle, item) for item in mran_id]
      
     #logger.info(f"get_gene_id_result mrna_transcript_result: {mrna_transcript_result}")
 
@@ -169,13 +152,15 @@ def geneid_result(request):
         'genome_id': genome_id,
         'IDs': IDs,
         'db_id': db_id,
-        'gene_seq': genome_seq_result.filter(mrna_id=IDs, gene_type='genome').values_list('sequence', flat=True).first(),
-        'geneid_result': list(gene_annotation_result),
-        'gff_data': list(gene_info_result),
-        'gene_go_result': list(gene_go_result),
-        'gene_kegg_result': list(gene_kegg_result),
+        'gene_seq': bundle['seqs'].get((IDs, 'genome')),
+        'geneid_result': bundle['annotation'],
+        'gff_data': gene_info_result,
+        'gene_go_result': bundle['go'],
+        'gene_kegg_result': bundle['kegg'],
         'mrna_transcripts': mrna_transcript_result,    
         'jbrowse_url': jbrowse_url
                          }
     #logger.info(f"get_gene_id_result genes: {gene_info_result}")
+    if wants_native(request):
+        return native_response({'results': results})
     return Response({'results': json.dumps(results)}, status=status.HTTP_200_OK)
@@ -4,6 +4,10 @@ from rest_framework import status
 from CottonOGD.views.base import UuidManager
 from CottonOGD.models import Species_info, Family, GeneMaster, gene_info,Genome_Synteny, gene_seq, gene_annotation, gene_go, gene_kegg, gene_expression
 from CottonOGD.views.location_ID import clean_gene_id
+from CottonOGD.server.gene_interval import features_in_region
+from CottonOGD.server.gene_distribution import genome_summary, summarize
+from django.db.models import Q
+import numpy as np
 import logging
 import json
 import re
@@ -48,13 +52,9 @@ def search_by_genome_location(request):
     
     try:
         # 获取指定基因组内该区域的基因
-        gene_info_results = gene_info.objects.filter(
-            genome__name=genome_name,
-            seqid=chr_name,
-            start__lte=end,
-            end__gte=start,
-            type='gene',
-        ).values('geneid_id', 'seqid','start', 'end', 'strand', 'type','id_id')
+        # 复合索引 (genome, seqid, type, start) 上的有界范围扫描
+        genes = features_in_region(genome_name, chr_name, start, end,
+                                   ('geneid_id', 'seqid', 'start', 'end', 'strand', 'type', 'id_id'))
         
         # 获取对应的gene_master以获取db_ids
         '''
@@ -71,9 +71,9 @@ def search_by_genome_location(request):
         results = {
             'region': region,
             'genome': genome_name,
-            'genes': list(gene_info_results),
+            'genes': genes,
             #'gene_sequences': list(gene_seq_results),
-            'count': len(list(gene_info_results))
+            'count': len(genes)
         }
         
         return Response(results, status=status.HTTP_200_OK)
@@ -83,6 +83,15 @@ def search_by_genome_location(request):
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # ==================== 3. 基因的基因组分布 ====================
+def _gene_locations(queryset):
+    """只取绘制分布所需的列"""
+    return [
+        {'gene_id': geneid, 'chr': seqid, 'start': start, 'end': end, 'strand': strand}
+        for geneid, seqid, start, end, strand
+        in queryset.values_list('geneid_id', 'seqid', 'start', 'end', 'strand')
+    ]
+
+
 @api_view(['POST'])
 def gene_genomic_distribution(request):
     """
@@ -91,10 +100,12 @@ def gene_genomic_distribution(request):
     
     请求参数:
     - genome: 基因组名称（必需）
-    - gene_ids: 基因ID列表
+    - gene_ids: 基因ID列表，留空表示整个基因组
+    - include_locations: 整个基因组时是否返回逐基因位置（默认否）
     
     返回:
-    - distribution: 基因在各染色体上的分布统计
+    - chr_distribution: 基因在各染色体上的分布统计
+    - density: 各窗口宽度下每条染色体的基因密度
     - gene_locations: 每个基因的具体位置
     """
     '''
@@ -117,35 +128,30 @@ def gene_genomic_distribution(request):
         gene_ids = [clean_gene_id(g) for g in re.split(r'[\n|,|;]+', gene_ids_input) if g.strip()]
     logger.info(f"gene_genomic_distribution: gene_ids: {gene_ids}")
     try:
-        if gene_ids:
-            gene_masters = GeneMaster.objects.filter(geneid__in=gene_ids, genome__name=genome_name)
-            db_ids = [gm.id for gm in gene_masters]
-            gene_info_results = gene_info.objects.filter(id_id__in=db_ids, type='gene').values()
-        else:
-            # 获取该基因组所有基因
-            gene_info_results = gene_info.objects.filter(genome__name=genome_name, type='gene').values()
-        
-        # 统计染色体分布
-        chr_distribution = {}
-        gene_locations = []
-        
-        for gene in gene_info_results:
-            chr_name = gene.get('seqid', 'unknown')
-            if chr_name not in chr_distribution:
-                chr_distribution[chr_name] = 0
-            chr_distribution[chr_name] += 1
-            
-            gene_locations.append({
-                'gene_id': gene.get('geneid_id', ''),
-                'chr': chr_name,
-                'start': gene.get('start', 0),
-                'end': gene.get('end', 0),
-                'strand': gene.get('strand', '')
-            })
-        
+        if not gene_ids:
+            # 全基因组：读取导入时预计算的分布摘要，默认不返回逐基因位置
+            summary = genome_summary(genome_name)
+            gene_locations = []
+            if str(request.data.get('include_locations', '')).lower() in ('1', 'true'):
+                gene_locations = _gene_locations(
+                    gene_info.objects.filter(genome_id=genome_name, type='gene'))
+            results = {
+                'genome': genome_name,
+                'chr_distribution': summary['chr_distribution'],
+                'density': summary['density'],
+                'gene_locations': gene_locations,
+                'total_genes': summary['total_genes']
+            }
+            return Response(results, status=status.HTTP_200_OK)
+
+        db_ids = GeneMaster.objects.filter(geneid__in=gene_ids, genome_id=genome_name).values('id')
+        gene_locations = _gene_locations(gene_info.objects.filter(id_id__in=db_ids, type='gene'))
+        summary = summarize([g['chr'] for g in gene_locations], [g['start'] for g in gene_locations])
+
         results = {
             'genome': genome_name,
-            'chr_distribution': chr_distribution,
+            'chr_distribution': summary['chr_distribution'],
+            'density': summary['density'],
             'gene_locations': gene_locations,
             'total_genes': len(gene_locations)
         }
@@ -158,6 +164,32 @@ def gene_genomic_distribution(request):
 
 
 # ==================== 5. 基因组共线性 ====================
+SYNTENY_PAGE_SIZE = 1000
+SYNTENY_MAX_PAGE_SIZE = 5000
+# 单次按需获取序列的区块上限
+SYNTENY_MAX_SEQ_BLOCKS = 200
+# 列表中不返回 Ref_seq/Alt_seq，序列通过 genome_synteny_seq 按区块获取
+SYNTENY_FIELDS = (
+    'id', 'Ref_genome', 'Query_genome', 'Ref_genome_chr', 'Ref_genome_start', 'Ref_genome_end',
+    'Query_genome_chr', 'Query_genome_start', 'Query_genome_end',
+    'Variation_type', 'Parent_Variation', 'son_type', 'copygain',
+)
+
+
+def _synteny_bins(queryset, bin_size):
+    """按参考基因组起点分窗口统计区块数与总长度"""
+    rows = np.array(list(queryset.values_list('Ref_genome_start', 'Ref_genome_end')), dtype=np.int64).reshape(-1, 2)
+    bins = rows[:, 0] // bin_size
+    counts = np.bincount(bins)
+    lengths = np.bincount(bins, weights=rows[:, 1] - rows[:, 0] + 1, minlength=len(counts))
+    nonzero = np.flatnonzero(counts)
+    return [
+        {'start': int(i) * bin_size, 'end': (int(i) + 1) * bin_size - 1,
+         'count': int(counts[i]), 'total_length': int(lengths[i])}
+        for i in nonzero
+    ]
+
+
 @api_view(['POST'])
 def genome_synteny(request):
     """
@@ -168,11 +200,16 @@ def genome_synteny(request):
     - reference_genome: 参考基因组（如 "Zhonghuang 13" 或 "Williams 82"）
     - query_genome: 查询基因组
     - chromosome: 染色体名称（如 "chr1"）
+    - Variation_type: 变异子类型
+    - cursor: 上一页返回的 next_cursor（键集分页，按参考起点排序）
+    - page_size: 每页区块数（默认 1000，最大 5000）
+    - bin_size: 指定时返回按窗口聚合的统计，用于缩小视图
     
     返回:
-    - synteny_blocks: 共线性区块信息
-    - reference_genes: 参考基因组基因
-    - query_genes: 查询基因组基因
+    - reference_genes: 当前页的共线性区块（不含序列）
+    - ref_gene_count: 区块总数
+    - next_cursor: 下一页游标，最后一页为 None
+    - bins: 指定 bin_size 时每个窗口的区块数与总长度
     """
     '''
     uuid = request.headers.get('uuid')
@@ -186,26 +223,44 @@ def genome_synteny(request):
     
     if not ref_genome or not query_genome or not chromosome or not Variation_type:
         return Response({'error': 'reference_genome, query_genome, chromosome, and Variation_type are required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        page_size = min(int(request.data.get('page_size') or SYNTENY_PAGE_SIZE), SYNTENY_MAX_PAGE_SIZE)
+        bin_size = int(request.data.get('bin_size') or 0)
+        cursor = str(request.data.get('cursor') or '')
+        after = tuple(int(x) for x in cursor.split(':')) if cursor else None
+        if page_size <= 0 or bin_size < 0 or (after is not None and len(after) != 2):
+            raise ValueError
+    except (TypeError, ValueError):
+        return Response({'error': 'Invalid page_size, bin_size or cursor'}, status=status.HTTP_400_BAD_REQUEST)
     ref_genome_id = Species_info.objects.get(name=ref_genome).id
     query_genome_id = Species_info.objects.get(name=query_genome).id
     logger.info(f"genome_synteny: ref_genome_id: {ref_genome_id}, query_genome_id: {query_genome_id}, chromosome: {chromosome}, Variation_type: {Variation_type}")
     try:
-        # 获取参考基因组的基因信息
-        ref_genes = Genome_Synteny.objects.filter(
+        # 复合索引 (Ref_genome, Query_genome, Ref_genome_chr, son_type, Ref_genome_start)
+        blocks = Genome_Synteny.objects.filter(
             Ref_genome=ref_genome_id,
             Query_genome=query_genome_id,
             Ref_genome_chr=chromosome,
             son_type=Variation_type,
-        ).values()
-        logger.info(f"genome_synteny: ref_genes count: {ref_genes.count()}")
-        ref_genes_list = list(ref_genes)
+        )
         results = {
             'reference_genome': ref_genome,
             'query_genome': query_genome,
             'chromosome': chromosome,
-            'reference_genes': ref_genes_list,
-            'ref_gene_count': len(ref_genes_list),
+            'ref_gene_count': blocks.count(),
         }
+        if bin_size:
+            results['bin_size'] = bin_size
+            results['bins'] = _synteny_bins(blocks, bin_size)
+            return Response(results, status=status.HTTP_200_OK)
+
+        page = blocks
+        if after is not None:
+            page = page.filter(Q(Ref_genome_start__gt=after[0]) | Q(Ref_genome_start=after[0], id__gt=after[1]))
+        ref_genes_list = list(page.order_by('Ref_genome_start', 'id').values(*SYNTENY_FIELDS)[:page_size])
+        last = ref_genes_list[-1] if len(ref_genes_list) == page_size else None
+        results['reference_genes'] = ref_genes_list
+        results['next_cursor'] = f"{last['Ref_genome_start']}:{last['id']}" if last else None
         
         return Response(results, status=status.HTTP_200_OK)
     
@@ -213,3 +268,36 @@ def genome_synteny(request):
         logger.error(f"Error in genome_synteny: {e}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+@api_view(['POST'])
+def genome_synteny_seq(request):
+    """
+    按需获取共线性区块的 Ref_seq/Alt_seq
+    
+    请求参数:
+    - ids: 区块 id 列表（逗号分隔或数组，最多 200 个）
+    
+    返回:
+    - sequences: {id: {'Ref_seq': ..., 'Alt_seq': ...}}
+    """
+    ids_input = request.data.get('ids', '')
+    if isinstance(ids_input, str):
+        ids_input = re.split(r'[\n|,|;]+', ids_input)
+    try:
+        ids = [int(i) for i in ids_input if str(i).strip()]
+    except ValueError:
+        return Response({'error': 'ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    if not ids:
+        return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids) > SYNTENY_MAX_SEQ_BLOCKS:
+        return Response({'error': f'At most {SYNTENY_MAX_SEQ_BLOCKS} blocks per request'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        sequences = {
+            row['id']: {'Ref_seq': row['Ref_seq'], 'Alt_seq': row['Alt_seq']}
+            for row in Genome_Synteny.objects.filter(id__in=ids).values('id', 'Ref_seq', 'Alt_seq')
+        }
+        return Response({'sequences': sequences}, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error(f"Error in genome_synteny_seq: {e}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
@@ -0,0 +1,204 @@
+import base64
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_http_methods
+from rest_framework.decorators import api_view
+
+from CottonOGD.server import annotation_charts
+from CottonOGD.server.kegg_hierarchy import KeggHierarchyStore
+from CottonOGD.server.kegg_maps import KeggMapStore, KO_PATTERN, HIGHLIGHT_COLOR, ko_numbers, normalize_map_id
+
+logger = logging.getLogger(__name__)
+
+KEGG_MAP_KEY = 'kegg_map:{map_id}:{genome}:{gene_set}:{color}:{version}'
+# 批量模式单次最多通路数与默认缩略图宽度
+KEGG_MAP_BATCH_MAX = 20
+KEGG_MAP_THUMB_WIDTH = 320
+
+
+def gene_ko_hits(genome_id, gene_list):
+    """输入基因的 KO 注释，返回 {KO: [基因ID]}；gene_kegg 中的通路编号（ko00010）不参与着色"""
+    if not gene_list:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT gm.geneid, gk.kegg_id
+            FROM genemaster gm
+            JOIN gene_kegg gk ON gk.id_id = gm.id
+            WHERE gm.genome_id = %s
+              AND gm.geneid IN %s
+              AND (gk.genome_id = gm.genome_id OR gk.genome_id IS NULL)
+        """, [genome_id, tuple(gene_list)])
+        rows = cursor.fetchall()
+    ko_genes = defaultdict(list)
+    for geneid, kegg_id in rows:
+        if kegg_id and KO_PATTERN.match(kegg_id) and geneid not in ko_genes[kegg_id]:
+            ko_genes[kegg_id].append(geneid)
+    return dict(ko_genes)
+
+
+def _parse_color(value):
+    """#RRGGBB -> (r, g, b)，为空时使用默认高亮色，格式错误时抛出 ValueError"""
+    if not value:
+        return HIGHLIGHT_COLOR
+    value = value.strip().lstrip('#')
+    if len(value) != 6:
+        raise ValueError(f'Invalid color: {value}')
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def _parse_gene_list(gene_input):
+    if isinstance(gene_input, (list, tuple)):
+        gene_input = ','.join(gene_input)
+    return list(dict.fromkeys(gene.strip() for gene in (gene_input or '').replace(',', '\n').split() if gene.strip()))
+
+
+def _png_bytes(image):
+    with BytesIO() as buffer:
+        # 通路图为大块纯色，低压缩级别体积相差不大，编码快数倍
+        image.save(buffer, format='PNG', compress_level=3)
+        return buffer.getvalue()
+
+
+def _hit_boxes(pathway_map, mask, ko_genes):
+    """命中方框的原图坐标、KO 与基因，前端用于点击/悬停"""
+    boxes = []
+    for i in np.flatnonzero(mask):
+        kos = [ko for ko in pathway_map.box_kos(i) if ko in ko_genes]
+        x1, y1, x2, y2 = (int(v) for v in pathway_map.boxes[i])
+        boxes.append({
+            'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+            'kos': kos,
+            'genes': sorted({gene for ko in kos for gene in ko_genes[ko]}),
+        })
+    return boxes
+
+
+@require_http_methods(['GET'])
+def kegg_pathway_map(request):
+    """
+    KEGG 通路图 - 输入基因的 KO 所在方框高亮，直接返回 PNG
+    pathway 为 ko00010 / map00010 / 00010，color 为高亮色（#RRGGBB）
+    """
+    genome_id = request.GET.get('genome_id', 'G.kirkii_ISU_ISU_v3.0')
+    gene_list = _parse_gene_list(request.GET.get('gene_id', ''))
+    map_id = normalize_map_id(request.GET.get('pathway', ''))
+    try:
+        color = _parse_color(request.GET.get('color', ''))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'error': str(e)}, status=400)
+    if not map_id:
+        return JsonResponse({'status': 'error', 'error': 'Missing or invalid pathway parameter'}, status=400)
+    if not gene_list:
+        return JsonResponse({'status': 'error', 'error': 'Missing gene_id parameter'}, status=400)
+
+    version = KeggMapStore.version(map_id)
+    if version is None:
+        return JsonResponse({'status': 'error', 'error': f'Pathway map not available: {map_id}'}, status=404)
+    gene_set = annotation_charts.gene_set_digest(gene_list)
+    color_key = '%02x%02x%02x' % color
+    etag = f'"{map_id}-{gene_set}-{color_key}-{version[0]}-{version[1]}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponse(status=304)
+
+    key = KEGG_MAP_KEY.format(map_id=map_id, genome=genome_id, gene_set=gene_set, color=color_key,
+                              version=f'{version[0]}-{version[1]}')
+    image = cache.get(key)
+    if image is None:
+        try:
+            pathway_map = KeggMapStore.get(map_id)
+            ko_genes = gene_ko_hits(genome_id, gene_list)
+            mask = pathway_map.hit_mask(ko_numbers(ko_genes))
+            image = _png_bytes(pathway_map.render(mask, color))
+        except Exception as e:
+            logger.error(f"KEGG pathway map error: {e}")
+            return JsonResponse({'status': 'error', 'error': str(e)}, status=500)
+        cache.set(key, image, annotation_charts.ttl())
+
+    response = HttpResponse(image, content_type='image/png')
+    response['Cache-Control'] = f'private, max-age={annotation_charts.ttl()}'
+    response['ETag'] = etag
+    return response
+
+
+@api_view(['POST'])
+def kegg_pathway_maps(request):
+    """
+    多通路缩略图 - 一次查询输入基因的 KO，对最多 KEGG_MAP_BATCH_MAX 张通路图分别着色并缩放，
+    返回每张图的 base64 PNG 与命中方框（原图坐标）。
+    pathways 为空时按命中 KO 数从本地已有的通路图中选取。
+    """
+    data = request.data
+    genome_id = data.get('genome_id', 'G.kirkii_ISU_ISU_v3.0')
+    gene_list = _parse_gene_list(data.get('gene_id', ''))
+    pathways = data.get('pathways') or []
+    if isinstance(pathways, str):
+        pathways = pathways.replace(',', '\n').split()
+    try:
+        color = _parse_color(data.get('color', ''))
+        thumb_width = int(data.get('thumb_width') or KEGG_MAP_THUMB_WIDTH)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'error': f'Invalid parameter: {e}'})
+    if not gene_list:
+        return JsonResponse({'status': 'error', 'error': 'Missing gene_id parameter'})
+
+    try:
+        ko_genes = gene_ko_hits(genome_id, gene_list)
+        hit_kos = ko_numbers(ko_genes)
+
+        map_ids = list(dict.fromkeys(filter(None, (normalize_map_id(p) for p in pathways))))
+        if not map_ids:
+            # 通路 -> KO 关系取自内存中的 KEGG 层级，不必逐张解析通路图
+            hierarchy = KeggHierarchyStore.get()
+            counts = {map_id: len(ko_genes.keys() & set(hierarchy.pathway_kos.get(map_id[2:], ())))
+                      for map_id in KeggMapStore.available()}
+            map_ids = sorted((m for m, n in counts.items() if n), key=lambda m: (-counts[m], m))
+        map_ids = map_ids[:KEGG_MAP_BATCH_MAX]
+
+        def render(map_id):
+            pathway_map = KeggMapStore.get(map_id)
+            if pathway_map is None:
+                return None
+            mask = pathway_map.hit_mask(hit_kos)
+            width, height = pathway_map.scaled_size(max(50, thumb_width))
+            image = pathway_map.render(mask, color, width)
+            return {
+                'pathway_id': map_id,
+                'title': pathway_map.title,
+                'width': pathway_map.width,
+                'height': pathway_map.height,
+                'thumb_width': width,
+                'thumb_height': height,
+                'box_count': len(pathway_map),
+                'hit_box_count': int(mask.sum()),
+                'hit_kos': sorted(pathway_map.kos & ko_genes.keys()),
+                'boxes': _hit_boxes(pathway_map, mask, ko_genes),
+                'image': f'data:image/png;base64,{base64.b64encode(_png_bytes(image)).decode()}',
+            }
+
+        maps = []
+        if map_ids:
+            with ThreadPoolExecutor(max_workers=min(len(map_ids), getattr(settings, 'KEGG_MAP_WORKERS', 4))) as pool:
+                maps = list(pool.map(render, map_ids))
+        missing = [map_id for map_id, item in zip(map_ids, maps) if item is None]
+
+        return JsonResponse({
+            'status': 'success',
+            'data': {
+                'maps': [item for item in maps if item is not None],
+                'missing_maps': missing,
+                'ko_genes': ko_genes,
+                'input_gene_count': len(gene_list),
+                'ko_gene_count': len({gene for genes in ko_genes.values() for gene in genes}),
+            }
+        })
+    except Exception as e:
+        logger.error(f"KEGG pathway maps error: {e}")
+        return JsonResponse({'status': 'error', 'error': str(e)})
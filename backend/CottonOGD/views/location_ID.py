@@ -1,9 +1,8 @@
 from ast import alias
-from django.db.models import Q
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from CottonOGD.views.base import UuidManager
-from CottonOGD.models import GeneMaster
+from CottonOGD.server.gene_index import GeneIndex
 import re, logging
 logger = logging.getLogger(__name__)
 
@@ -49,23 +48,25 @@ def Id_map(gene_id: str, genome_id: str):
     normalized_ids = {}
     search_ids=[]
     logger.info(f"gene_ids: {gene_ids}")
-    for gid in gene_ids:
+    pairs = []
+    for i, gid in enumerate(gene_ids):
         # 如果 genome_ids 为空，跳过
         if not genome_ids:
             continue
         # 如果基因 ID 数量大于基因组 ID 数量，重复使用第一个基因组 ID
-        genome = genome_ids[0] if len(gene_ids) > len(genome_ids) else genome_ids[gene_ids.index(gid)]
+        genome = genome_ids[0] if len(gene_ids) > len(genome_ids) else genome_ids[i]
         nid = clean_gene_id(gid)
-        if nid not in norm_map:
+        if nid not in normalized_ids:
             norm_map.append(nid)
             search_ids.append(f"{genome}_{nid}")
             normalized_ids[nid] = {'normalized_id': nid, 'genome_id': genome,'search_id':f"{genome}_{nid}"}
+        pairs.append((genome, nid))
         id_map[gid] = {'geneid':nid,'genome_id':genome,'search_id':f"{genome}_{nid}"}
     #logger.info(f"search_ids: {search_ids}")
     #logger.info(f"norm_map: {norm_map}")
-    #map_ids=GeneMaster.objects.filter(alias__in=search_ids).values('alias','id')
-    map_ids=GeneMaster.objects.filter(Q(geneid__in=norm_map) | Q(genome_id__in=genome_ids)).values('alias','id')
-    map_ids={item['alias']:item['id'] for item in map_ids}
+    # 只查本次输入涉及的 (genome, geneid)，不再把整个基因组的 genemaster 拉进内存
+    found = GeneIndex.lookup(pairs)
+    map_ids = {f"{genome}_{nid}": db_id for (genome, nid), db_id in found.items()}
     genome_gene_id = attach_db_id(id_map, map_ids)
     return genome_gene_id
     #logger.info(f"id_map: {id_map}")
@@ -17,6 +17,35 @@ import os
 BASE_DIR = Path(__file__).resolve().parent.parent
 TEMP_DIR = os.path.join(BASE_DIR, 'temp')
 GO_OBO_FILE = os.path.join(BASE_DIR, 'data', 'go_ontology', 'go-basic.obo')
+# GO DAG 闭包版本中 go_relationship 指纹（行数/最大 id）的重新查询间隔(秒)
+GO_DAG_DB_CHECK_INTERVAL = 60
+# KEGG 层级（分类/通路/KO/EC）版本戳，由 Script/script/updata_KEGG_KO.py 导入后写入
+KEGG_VERSION_FILE = os.path.join(BASE_DIR, 'data', 'go_ontology', 'kegg.version')
+# 每个worker缓存的已打开基因组FASTA句柄数量
+FASTA_POOL_SIZE = 8
+# 绘图进程池的进程数与单个绘图任务的超时(秒)
+RENDER_POOL_SIZE = 2
+RENDER_JOB_TIMEOUT = 60
+# 热图 PNG / 表达矩阵的缓存时间(秒)，超过 HEATMAP_CACHE_MAX_BYTES 的图片不缓存
+HEATMAP_CACHE_TTL = 3600
+HEATMAP_CACHE_MAX_BYTES = 2 * 1024 * 1024
+EXPRESSION_MATRIX_TTL = 3600
+# EFP 图（按基因组、基因、颜色）的缓存时间(秒)
+EFP_CACHE_TTL = 3600
+# 多基因 EFP 并行着色/编码的线程数
+EFP_BATCH_WORKERS = 4
+# BLAST：每个 blast 进程的 -num_threads，以及每个工作进程内同时运行的 blast 进程数（默认可用核数 / 每进程线程数）
+BLAST_THREADS_PER_JOB = 2
+BLAST_MAX_CONCURRENT_JOBS = max(1, (len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity')
+                                    else os.cpu_count() or 2) // BLAST_THREADS_PER_JOB)
+# GO/KEGG 富集背景在进程内缓存的总大小上限(字节)
+ANNOTATION_STORE_MAX_BYTES = 512 * 1024 * 1024
+# GO/KEGG 注释图（按基因组、基因集摘要、图表类型、格式）的缓存时间(秒)
+ANNOTATION_CHART_TTL = 3600
+# KEGG 通路图（<ko编号>.png + <ko编号>.xml KGML）目录、进程内缓存上限(字节)与批量着色线程数
+KEGG_MAP_DIR = os.path.join(BASE_DIR, 'data', 'kegg_maps')
+KEGG_MAP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+KEGG_MAP_WORKERS = 4
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
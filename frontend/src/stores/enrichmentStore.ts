@@ -60,8 +60,9 @@ export interface SyntenyGene {
   Ref_genome_chr: string;
   Ref_genome_start: number;
   Ref_genome_end: number;
-  Ref_seq: string;
-  Alt_seq: string;
+  // 列表不含序列，按区块通过 genome_synteny_seq 获取后填入
+  Ref_seq?: string;
+  Alt_seq?: string;
   Query_genome_chr: string;
   Query_genome_start: number;
   Query_genome_end: number;
@@ -77,6 +78,7 @@ export interface GenomeSyntenyResult {
   chromosome: string;
   reference_genes: SyntenyGene[];
   ref_gene_count: number;
+  next_cursor: string | null;
 }
 
 export interface GeneLocation {
@@ -219,7 +221,27 @@ Gh_D01G0005`;
   // ========== Genome Synteny ==========
   const syntenyResult = ref<GenomeSyntenyResult | null>(null);
   const syntenyLoading = ref(false);
+  const syntenyLoadingMore = ref(false);
   const syntenyError = ref<string | null>(null);
+  // 正在获取序列的区块 id
+  const syntenySeqLoading = ref<number[]>([]);
+  // 当前查询条件，翻页时沿用
+  let syntenyQuery: Record<string, string> = {};
+
+  const SYNTENY_PAGE_SIZE = 1000;
+  const SYNTENY_MAX_SEQ_BLOCKS = 200;
+
+  const fetchSyntenyPage = async (cursor?: string) => {
+    const formData = new FormData();
+    Object.entries(syntenyQuery).forEach(([key, value]) => formData.append(key, value));
+    formData.append('page_size', String(SYNTENY_PAGE_SIZE));
+    if (cursor) {
+      formData.append('cursor', cursor);
+    }
+    return await httpInstance.post('/CottonOGD_api/genome_synteny/', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' }
+    }) as any;
+  };
 
   const searchGenomeSynteny = async (
     referenceGenome: string,
@@ -230,17 +252,15 @@ Gh_D01G0005`;
     syntenyLoading.value = true;
     syntenyError.value = null;
     syntenyResult.value = null;
+    syntenyQuery = {
+      reference_genome: referenceGenome,
+      query_genome: queryGenome,
+      chromosome,
+      Variation_type: variationType,
+    };
 
     try {
-      const formData = new FormData();
-      formData.append('reference_genome', referenceGenome);
-      formData.append('query_genome', queryGenome);
-      formData.append('chromosome', chromosome);
-      formData.append('Variation_type', variationType);
-
-      const response = await httpInstance.post('/CottonOGD_api/genome_synteny/', formData, {
-        headers: { 'Content-Type': 'multipart/form-data' }
-      }) as any;
+      const response = await fetchSyntenyPage();
 
       if (response && response.reference_genes) {
         syntenyResult.value = response as GenomeSyntenyResult;
@@ -255,6 +275,54 @@ Gh_D01G0005`;
     }
   };
 
+  // 按 next_cursor 追加下一页
+  const loadMoreSynteny = async () => {
+    const result = syntenyResult.value;
+    if (!result || !result.next_cursor || syntenyLoadingMore.value) return;
+    syntenyLoadingMore.value = true;
+    try {
+      const response = await fetchSyntenyPage(result.next_cursor);
+      if (response && response.reference_genes) {
+        result.reference_genes.push(...response.reference_genes);
+        result.next_cursor = response.next_cursor;
+      }
+    } catch (e: any) {
+      syntenyError.value = e.message || 'Genome synteny search failed';
+      console.error('Genome synteny load more failed:', e);
+    } finally {
+      syntenyLoadingMore.value = false;
+    }
+  };
+
+  // 按区块获取 Ref_seq/Alt_seq 并填入已加载的行
+  const fetchSyntenySequences = async (ids: number[]) => {
+    const result = syntenyResult.value;
+    if (!result) return;
+    const pending = ids.filter(id => !syntenySeqLoading.value.includes(id));
+    if (!pending.length) return;
+    syntenySeqLoading.value.push(...pending);
+    try {
+      for (let i = 0; i < pending.length; i += SYNTENY_MAX_SEQ_BLOCKS) {
+        const response = await httpInstance.post('/CottonOGD_api/genome_synteny_seq/', {
+          ids: pending.slice(i, i + SYNTENY_MAX_SEQ_BLOCKS)
+        }) as any;
+        const sequences = response?.sequences || {};
+        result.reference_genes.forEach(row => {
+          const seq = sequences[row.id];
+          if (seq) {
+            row.Ref_seq = seq.Ref_seq ?? '';
+            row.Alt_seq = seq.Alt_seq ?? '';
+          }
+        });
+      }
+    } catch (e: any) {
+      syntenyError.value = e.message || 'Failed to load synteny sequences';
+      console.error('Genome synteny sequence fetch failed:', e);
+    } finally {
+      syntenySeqLoading.value = syntenySeqLoading.value.filter(id => !pending.includes(id));
+    }
+  };
+
   const clearSynteny = () => {
     syntenyResult.value = null;
     syntenyError.value = null;
@@ -274,6 +342,8 @@ Gh_D01G0005`;
       const formData = new FormData();
       formData.append('genome', genome);
       formData.append('gene_ids', geneIds);
+      // 整个基因组时后端默认只返回分布摘要，表格与下载需要逐基因位置
+      formData.append('include_locations', 'true');
 
       const response = await httpInstance.post('/CottonOGD_api/gene_genomic_distribution/', formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
@@ -338,8 +408,12 @@ Gh_D01G0005`;
     clearRegionSearch,
     syntenyResult,
     syntenyLoading,
+    syntenyLoadingMore,
     syntenyError,
+    syntenySeqLoading,
     searchGenomeSynteny,
+    loadMoreSynteny,
+    fetchSyntenySequences,
     clearSynteny,
     geneLocationResult,
     geneLocationLoading,